@@ -0,0 +1,202 @@
+"""
+TP03 - Exercice 1.1: Test de charge de l'envoi d'emails
+Module: Web Marketing & CRM
+
+Lance le serveur Brevo simulé (mock_brevo_server.py) dans un processus
+séparé, puis pilote send_campaign sur 1k / 10k / 100k destinataires
+synthétiques et enregistre débit et latences de queue (p50/p95/p99).
+
+Avec --baseline, les résultats sont comparés à un run précédent: une
+baisse de débit ou une hausse du p99 au-delà de --tolerance fait échouer
+le script (code de sortie 1), pour repérer les régressions avant la prod.
+
+Usage:
+    python bench_email_sender.py --sizes 1000,10000 --concurrency 32
+    python bench_email_sender.py --output bench.json --baseline bench_ref.json
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import requests
+
+from email_automation import send_campaign
+from subscriber_reader import SubscriberStream
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def write_subscribers(path, count):
+    """Génère un fichier d'inscrits synthétiques."""
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('email,prenom,date_inscription\n')
+        for i in range(count):
+            f.write(f'user{i}@bench.example.com,Prenom{i % 997},2025-01-{i % 28 + 1:02d}\n')
+
+
+def start_server_process(args):
+    """
+    Démarre le serveur simulé dans un sous-processus (pour qu'il ne partage
+    pas le GIL avec le client mesuré).
+
+    Returns:
+        tuple: (subprocess.Popen, URL de l'API simulée)
+    """
+    command = [
+        sys.executable, os.path.join(SCRIPT_DIR, 'mock_brevo_server.py'),
+        '--port', '0',
+        '--latency-ms', str(args.latency_ms),
+        '--latency-dist', args.latency_dist,
+        '--latency-spread', str(args.latency_spread),
+        '--error-rate', str(args.error_rate),
+        '--throttle-rate', str(args.throttle_rate),
+        '--rate-cap', str(args.rate_cap),
+        '--seed', '42'
+    ]
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, text=True)
+    ready_line = process.stdout.readline().strip()
+    if not ready_line:
+        process.kill()
+        raise RuntimeError("Le serveur simulé n'a pas démarré")
+    return process, ready_line.rsplit(' ', 1)[-1]
+
+
+def run_size(size, api_url, args, work_dir):
+    """Exécute une campagne de `size` destinataires et renvoie ses mesures."""
+    csv_file = os.path.join(work_dir, f'inscrits_{size}.csv')
+    write_subscribers(csv_file, size)
+    stats_url = api_url.split('/v3/')[0] + '/stats'
+    requests.post(stats_url + '/reset', timeout=5)
+
+    stats = send_campaign(
+        SubscriberStream(csv_file),
+        os.path.join(work_dir, f'email_logs_{size}.txt'),
+        max_in_flight=args.concurrency,
+        api_url=api_url,
+        verbose=False,
+        rate_limit=args.rate_limit,
+        burst=args.burst,
+        batch_size=args.batch_size,
+        stats_interval=0,
+        prometheus_file=None
+    )
+    server_stats = requests.get(stats_url, timeout=5).json()
+
+    return {
+        'size': size,
+        'total': stats['total'],
+        'success': stats['success'],
+        'errors': stats['errors'],
+        'duration_s': round(stats['duration'], 3),
+        'throughput': round(stats['throughput'], 1),
+        'latency_p50_ms': stats['latency_p50_ms'],
+        'latency_p95_ms': stats['latency_p95_ms'],
+        'latency_p99_ms': stats['latency_p99_ms'],
+        'retries': stats['retries'],
+        'stages': stats['metrics']['stages'],
+        'server': server_stats
+    }
+
+
+def compare_to_baseline(results, baseline, tolerance):
+    """
+    Compare les résultats à une référence.
+
+    Returns:
+        list: Messages de régression (vide si aucune)
+    """
+    reference = {r['size']: r for r in baseline.get('results', [])}
+    regressions = []
+    for result in results:
+        ref = reference.get(result['size'])
+        if ref is None:
+            continue
+        if result['throughput'] < ref['throughput'] * (1 - tolerance):
+            regressions.append(f"{result['size']}: débit {result['throughput']}/s "
+                               f"< référence {ref['throughput']}/s")
+        if ref['latency_p99_ms'] and result['latency_p99_ms'] > ref['latency_p99_ms'] * (1 + tolerance):
+            regressions.append(f"{result['size']}: p99 {result['latency_p99_ms']}ms "
+                               f"> référence {ref['latency_p99_ms']}ms")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Test de charge de l'envoi d'emails")
+    parser.add_argument('--sizes', default='1000,10000,100000',
+                        help="Nombres de destinataires, séparés par des virgules")
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--batch-size', type=int, default=1)
+    parser.add_argument('--rate-limit', type=float, default=0.0)
+    parser.add_argument('--burst', type=int, default=10)
+    parser.add_argument('--api-url', default=None,
+                        help="Serveur déjà démarré (sinon un serveur simulé est lancé)")
+    parser.add_argument('--latency-ms', type=float, default=20.0)
+    parser.add_argument('--latency-dist', default='lognormal')
+    parser.add_argument('--latency-spread', type=float, default=0.5)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--throttle-rate', type=float, default=0.0)
+    parser.add_argument('--rate-cap', type=float, default=0.0)
+    parser.add_argument('--output', default=None, help="Fichier JSON des résultats")
+    parser.add_argument('--baseline', default=None, help="Résultats de référence (JSON)")
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help="Écart toléré par rapport à la référence (0.2 = 20%%)")
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.sizes.split(',') if size.strip()]
+    server_process = None
+    api_url = args.api_url
+    if api_url is None:
+        server_process, api_url = start_server_process(args)
+
+    print("=" * 70)
+    print("TEST DE CHARGE - ENVOI D'EMAILS")
+    print("=" * 70)
+    print(f"Serveur: {api_url} - concurrence: {args.concurrency} - lots: {args.batch_size}")
+    print()
+    print(f"{'Destinataires':>13} {'Durée':>9} {'Débit/s':>10} {'p50 ms':>9} {'p95 ms':>9} "
+          f"{'p99 ms':>9} {'Échecs':>7}")
+
+    results = []
+    try:
+        with tempfile.TemporaryDirectory() as work_dir:
+            for size in sizes:
+                result = run_size(size, api_url, args, work_dir)
+                results.append(result)
+                print(f"{result['size']:>13} {result['duration_s']:>8.2f}s {result['throughput']:>10.1f} "
+                      f"{result['latency_p50_ms']:>9.1f} {result['latency_p95_ms']:>9.1f} "
+                      f"{result['latency_p99_ms']:>9.1f} {result['errors']:>7}")
+    finally:
+        if server_process is not None:
+            server_process.terminate()
+            server_process.wait()
+
+    report = {
+        'timestamp': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'config': {key: value for key, value in vars(args).items()
+                   if key not in ('output', 'baseline')},
+        'results': results
+    }
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"\nRésultats enregistrés: {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            regressions = compare_to_baseline(results, json.load(f), args.tolerance)
+        if regressions:
+            print("\nRÉGRESSIONS DÉTECTÉES:")
+            for message in regressions:
+                print(f"  - {message}")
+            return 1
+        print("\nAucune régression par rapport à la référence.")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,160 @@
+"""
+TP03 - Exercice 1.1: Micro-benchmark du rendu des emails
+Module: Web Marketing & CRM
+
+Compare, sur N rendus (100 000 par défaut):
+- la version d'origine de create_email_payload (f-string reconstruite à
+  chaque appel), sérialisée en JSON comme le ferait requests
+- create_email_payload (template précompilé) + sérialisation JSON, chemin
+  des envois groupés et de BREVO_PREENCODED_PAYLOADS=0
+- create_email_payload_bytes (fragments JSON pré-encodés), chemin par
+  défaut des envois individuels
+
+Usage:
+    python bench_templates.py [--renders 100000]
+"""
+
+import argparse
+import json
+import time
+
+from email_automation import (
+    SENDER_EMAIL, SENDER_NAME, create_email_payload, create_email_payload_bytes
+)
+
+
+def legacy_create_email_payload(email, prenom, date_inscription):
+    """Version d'origine (f-string reconstruite à chaque appel), servant de référence."""
+    html_content = f"""
+    <!DOCTYPE html>
+    <html>
+    <head>
+        <style>
+            body {{
+                font-family: Arial, sans-serif;
+                line-height: 1.6;
+                color: #333;
+            }}
+            .container {{
+                max-width: 600px;
+                margin: 0 auto;
+                padding: 20px;
+                background-color: #f4f4f4;
+            }}
+            .content {{
+                background-color: white;
+                padding: 30px;
+                border-radius: 10px;
+                box-shadow: 0 2px 5px rgba(0,0,0,0.1);
+            }}
+            h1 {{
+                color: #4CAF50;
+                border-bottom: 3px solid #4CAF50;
+                padding-bottom: 10px;
+            }}
+            .highlight {{
+                color: #4CAF50;
+                font-weight: bold;
+            }}
+            .footer {{
+                margin-top: 20px;
+                padding-top: 20px;
+                border-top: 1px solid #ddd;
+                font-size: 12px;
+                color: #666;
+            }}
+        </style>
+    </head>
+    <body>
+        <div class="container">
+            <div class="content">
+                <h1> Bienvenue {prenom} !</h1>
+                <p>Bonjour <span class="highlight">{prenom}</span>,</p>
+                <p>Nous sommes ravis de vous accueillir dans notre communauté !</p>
+                <p>Votre inscription a été effectuée le <strong>{date_inscription}</strong>.</p>
+                <p>Voici ce que vous pouvez faire maintenant :</p>
+                <ul>
+                    <li> Découvrir nos services</li>
+                    <li> Personnaliser votre profil</li>
+                    <li> Rejoindre notre communauté</li>
+                    <li> Commencer votre aventure</li>
+                </ul>
+                <p>Si vous avez des questions, n'hésitez pas à nous contacter !</p>
+                <div class="footer">
+                    <p>Cordialement,<br>L'équipe Startup</p>
+                    <p><em>Cet email a été envoyé automatiquement via l'API Brevo - TP03 Web Marketing & CRM</em></p>
+                </div>
+            </div>
+        </div>
+    </body>
+    </html>
+    """
+    
+    payload = {
+        'sender': {
+            'email': SENDER_EMAIL,
+            'name': SENDER_NAME
+        },
+        'to': [
+            {
+                'email': email,
+                'name': prenom
+            }
+        ],
+        'subject': f' Bienvenue {prenom} dans notre communauté !',
+        'htmlContent': html_content,
+        'textContent': f"Bonjour {prenom}, bienvenue dans notre communauté ! Votre inscription a été effectuée le {date_inscription}."
+    }
+    
+    return payload
+
+
+def normalize(payload):
+    """Compare les payloads en ignorant l'indentation du HTML."""
+    payload = dict(payload)
+    payload['htmlContent'] = ' '.join(payload['htmlContent'].split())
+    return payload
+
+
+def run(label, func, recipients):
+    start = time.perf_counter()
+    for email, prenom, date_inscription in recipients:
+        func(email, prenom, date_inscription)
+    duration = time.perf_counter() - start
+    print(f"  {label:<45} {duration:7.3f}s  {len(recipients) / duration:>10,.0f} rendus/s")
+    return duration
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Micro-benchmark du rendu des emails")
+    parser.add_argument('--renders', type=int, default=100_000, help="Nombre de rendus")
+    args = parser.parse_args()
+    
+    recipients = [
+        (f'user{i}@email.com', f'Prénom{i % 500}', f'2025-01-{i % 28 + 1:02d}')
+        for i in range(args.renders)
+    ]
+    
+    # Vérification d'équivalence avant de mesurer
+    sample = recipients[0]
+    reference = legacy_create_email_payload(*sample)
+    assert normalize(create_email_payload(*sample)) == normalize(reference)
+    assert normalize(json.loads(create_email_payload_bytes(*sample))) == normalize(reference)
+    
+    print("=" * 70)
+    print(f"BENCHMARK DU RENDU DES EMAILS - {args.renders:,} rendus")
+    print("=" * 70)
+    baseline = run("f-string d'origine + json.dumps",
+                   lambda *r: json.dumps(legacy_create_email_payload(*r)), recipients)
+    templated = run("template précompilé + json.dumps",
+                    lambda *r: json.dumps(create_email_payload(*r)), recipients)
+    preencoded = run("template JSON pré-encodé (bytes, par défaut)", create_email_payload_bytes,
+                     recipients)
+    print("-" * 70)
+    print(f"  Accélération template:    x{baseline / templated:.2f}")
+    print(f"  Accélération pré-encodé:  x{baseline / preencoded:.2f}")
+    print("=" * 70)
+
+
+if __name__ == '__main__':
+    main()
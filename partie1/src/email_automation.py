@@ -8,27 +8,87 @@ Ce script automatise l'envoi d'emails de bienvenue via l'API Brevo.
 """
 
 import requests
-import csv
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import NewConnectionError
+import argparse
 import json
 from datetime import datetime
 import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+from rate_limiter import TokenBucket, RetryPolicy, SendCounters, parse_retry_after
+from email_templates import load_template, compile_text_template, compile_json_template
+from email_logger import BufferedLogWriter, format_text_line
+from send_checkpoint import SendCheckpoint, DELIVERED, DUPLICATE, UNCERTAIN
+from subscriber_reader import SubscriberStream
+from send_metrics import PROMETHEUS_INTERVAL, SendMetrics, MetricsReporter
 
 # ============================================================================
 # CONFIGURATION
 # ============================================================================
 
-# Clé API Brevo - À remplacer par votre propre clé
+# Clé API Brevo - lue depuis la variable d'environnement BREVO_API_KEY
 # Pour obtenir votre clé: https://app.brevo.com/settings/keys/api
 # IMPORTANT: Ne jamais commit de vraie clé API dans Git !
-# Utilisez des variables d'environnement en production
-API_KEY = 'votre_clé_api_brevo'  # Remplacez par votre clé API
+API_KEY_PLACEHOLDER = 'votre_clé_api_brevo'
+API_KEY = os.getenv('BREVO_API_KEY', API_KEY_PLACEHOLDER)
 
 # URL de l'API Brevo pour l'envoi d'emails
-API_URL = 'https://api.brevo.com/v3/smtp/email'
+# (surchargeable via BREVO_API_URL pour tester contre un serveur local)
+API_URL = os.getenv('BREVO_API_URL', 'https://api.brevo.com/v3/smtp/email')
+
+# Nombre maximal de requêtes HTTP simultanées (1 = envoi séquentiel)
+MAX_IN_FLIGHT = int(os.getenv('MAX_IN_FLIGHT', '1'))
+
+# Limite de débit côté client (requêtes/s, 0 = pas de limite) et rafale autorisée
+RATE_LIMIT = float(os.getenv('BREVO_RATE_LIMIT', '0'))
+RATE_BURST = int(os.getenv('BREVO_RATE_BURST', '10'))
+
+# Relances sur 429/5xx et erreurs de connexion (backoff exponentiel + jitter)
+MAX_RETRIES = int(os.getenv('BREVO_MAX_RETRIES', '3'))
+
+# Nombre de destinataires par appel API via messageVersions (1 = un appel par email)
+BATCH_SIZE = int(os.getenv('BREVO_BATCH_SIZE', '1'))
+# Plafond volontairement inférieur aux 2000 destinataires par requête acceptés
+# par Brevo: corps de requête plus petits (moins de délais de lecture
+# dépassés), et un lot en échec ou au résultat incertain touche moins
+# d'adresses
+MAX_BATCH_SIZE = 1000
 
 # Configuration de l'expéditeur
-SENDER_EMAIL = 'hello@startup.com'
-SENDER_NAME = 'Startup Team'
+SENDER_EMAIL = os.getenv('SENDER_EMAIL', 'hello@startup.com')
+SENDER_NAME = os.getenv('SENDER_NAME', 'Startup Team')
+SENDER = {
+    'email': SENDER_EMAIL,
+    'name': SENDER_NAME
+}
+
+# Template HTML (partie1/templates/<id>_v<version>.html) et textes associés
+TEMPLATE_ID = 'welcome'
+TEMPLATE_VERSION = 1
+SUBJECT_TEMPLATE = ' Bienvenue {{prenom}} dans notre communauté !'
+TEXT_TEMPLATE = ("Bonjour {{prenom}}, bienvenue dans notre communauté ! "
+                 "Votre inscription a été effectuée le {{date_inscription}}.")
+
+# Envoi de corps JSON pré-encodés (fragments constants sérialisés une seule
+# fois), activé par défaut: c'est le seul chemin plus rapide que l'ancien
+# f-string dans bench_templates.py; 0 = dict sérialisé par requests
+PREENCODED_PAYLOADS = os.getenv('BREVO_PREENCODED_PAYLOADS', '1') == '1'
+
+# Format du journal d'envoi: 'text' (lisible) ou 'jsonl' (JSON Lines)
+LOG_FORMAT = os.getenv('EMAIL_LOG_FORMAT', 'text')
+
+# Points de reprise: adresses déjà livrées, par campagne (SQLite local)
+CHECKPOINT_DB = os.getenv('EMAIL_CHECKPOINT_DB', 'email_checkpoint.db')
+CAMPAIGN_ID = os.getenv('EMAIL_CAMPAIGN_ID', f'{TEMPLATE_ID}_v{TEMPLATE_VERSION}')
+# Compteur incrémenté pour chaque destinataire sauté par le registre
+SKIP_COUNTERS = {DELIVERED: 'skipped', DUPLICATE: 'duplicates', UNCERTAIN: 'skipped_uncertain'}
+
+# Ligne de statistiques périodique (s, 0 = désactivée) et export Prometheus
+STATS_INTERVAL = float(os.getenv('EMAIL_STATS_INTERVAL', '0'))
+PROMETHEUS_FILE = os.getenv('EMAIL_PROMETHEUS_FILE') or None
 
 # ============================================================================
 # FONCTIONS
@@ -38,6 +98,9 @@ def create_email_payload(email, prenom, date_inscription):
     """
     Crée le payload JSON pour l'envoi d'un email personnalisé.
     
+    Le HTML provient du template précompilé TEMPLATE_ID/TEMPLATE_VERSION
+    (analysé une seule fois), seules les valeurs du destinataire sont insérées.
+    
     Args:
         email (str): Email du destinataire
         prenom (str): Prénom du destinataire
@@ -46,119 +109,228 @@ def create_email_payload(email, prenom, date_inscription):
     Returns:
         dict: Payload formaté pour l'API Brevo
     """
-    html_content = f"""
-    <!DOCTYPE html>
-    <html>
-    <head>
-        <style>
-            body {{
-                font-family: Arial, sans-serif;
-                line-height: 1.6;
-                color: #333;
-            }}
-            .container {{
-                max-width: 600px;
-                margin: 0 auto;
-                padding: 20px;
-                background-color: #f4f4f4;
-            }}
-            .content {{
-                background-color: white;
-                padding: 30px;
-                border-radius: 10px;
-                box-shadow: 0 2px 5px rgba(0,0,0,0.1);
-            }}
-            h1 {{
-                color: #4CAF50;
-                border-bottom: 3px solid #4CAF50;
-                padding-bottom: 10px;
-            }}
-            .highlight {{
-                color: #4CAF50;
-                font-weight: bold;
-            }}
-            .footer {{
-                margin-top: 20px;
-                padding-top: 20px;
-                border-top: 1px solid #ddd;
-                font-size: 12px;
-                color: #666;
-            }}
-        </style>
-    </head>
-    <body>
-        <div class="container">
-            <div class="content">
-                <h1> Bienvenue {prenom} !</h1>
-                <p>Bonjour <span class="highlight">{prenom}</span>,</p>
-                <p>Nous sommes ravis de vous accueillir dans notre communauté !</p>
-                <p>Votre inscription a été effectuée le <strong>{date_inscription}</strong>.</p>
-                <p>Voici ce que vous pouvez faire maintenant :</p>
-                <ul>
-                    <li> Découvrir nos services</li>
-                    <li> Personnaliser votre profil</li>
-                    <li> Rejoindre notre communauté</li>
-                    <li> Commencer votre aventure</li>
-                </ul>
-                <p>Si vous avez des questions, n'hésitez pas à nous contacter !</p>
-                <div class="footer">
-                    <p>Cordialement,<br>L'équipe Startup</p>
-                    <p><em>Cet email a été envoyé automatiquement via l'API Brevo - TP03 Web Marketing & CRM</em></p>
-                </div>
-            </div>
-        </div>
-    </body>
-    </html>
-    """
+    values = {'prenom': prenom, 'date_inscription': date_inscription}
     
     payload = {
-        'sender': {
-            'email': SENDER_EMAIL,
-            'name': SENDER_NAME
-        },
+        'sender': dict(SENDER),
         'to': [
             {
                 'email': email,
                 'name': prenom
             }
         ],
-        'subject': f' Bienvenue {prenom} dans notre communauté !',
-        'htmlContent': html_content,
-        'textContent': f"Bonjour {prenom}, bienvenue dans notre communauté ! Votre inscription a été effectuée le {date_inscription}."
+        'subject': compile_text_template(SUBJECT_TEMPLATE, 'subject', TEMPLATE_VERSION).render(values),
+        'htmlContent': load_template(TEMPLATE_ID, TEMPLATE_VERSION).render(values),
+        'textContent': compile_text_template(TEXT_TEMPLATE, 'text', TEMPLATE_VERSION).render(values)
     }
     
     return payload
 
 
-def send_email(payload):
+def create_email_payload_bytes(email, prenom, date_inscription):
+    """
+    Variante de create_email_payload qui produit directement le corps JSON
+    encodé: tous les fragments constants sont pré-encodés en bytes, seules
+    les valeurs du destinataire sont échappées à chaque appel.
+    
+    Returns:
+        bytes: Corps de la requête pour l'API Brevo
+    """
+    template = compile_json_template(
+        lambda: create_email_payload('{{email}}', '{{prenom}}', '{{date_inscription}}'),
+        TEMPLATE_ID, TEMPLATE_VERSION
+    )
+    return template.render_json({
+        'email': email,
+        'prenom': prenom,
+        'date_inscription': date_inscription
+    })
+
+
+def create_batch_payload(recipients):
+    """
+    Crée le payload d'un envoi groupé (messageVersions): le contenu HTML est
+    sérialisé une seule fois par lot, les valeurs propres à chaque destinataire
+    passent par les paramètres {{params.prenom}} / {{params.date_inscription}}.
+    
+    Args:
+        recipients (list): Tuples (email, prenom, date_inscription)
+    
+    Returns:
+        dict: Payload formaté pour l'API Brevo
+    """
+    payload = create_email_payload(None, '{{params.prenom}}', '{{params.date_inscription}}')
+    del payload['to']
+    payload['messageVersions'] = [
+        {
+            'to': [
+                {
+                    'email': email,
+                    'name': prenom
+                }
+            ],
+            'params': {
+                'prenom': prenom,
+                'date_inscription': date_inscription
+            }
+        }
+        for email, prenom, date_inscription in recipients
+    ]
+    return payload
+
+
+def split_batch_response(status_code, response_data, batch_len):
+    """
+    Répartit la réponse d'un envoi groupé entre ses destinataires.
+    
+    En cas de succès, Brevo renvoie un messageId par version, dans l'ordre
+    de messageVersions; en cas d'échec, tout le lot partage la même erreur.
+    
+    Returns:
+        list: Un tuple (status_code, response_data) par destinataire
+    """
+    if status_code != 201:
+        return [(status_code, response_data)] * batch_len
+    
+    message_ids = response_data.get('messageIds') or []
+    return [
+        (status_code, {'messageId': message_ids[i] if i < len(message_ids) else 'N/A'})
+        for i in range(batch_len)
+    ]
+
+
+def create_session(pool_size=MAX_IN_FLIGHT):
+    """
+    Crée une session HTTP partagée (keep-alive + pool de connexions).
+    
+    Args:
+        pool_size (int): Nombre de connexions conservées dans le pool
+    
+    Returns:
+        requests.Session: Session prête à être partagée entre threads
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(1, pool_size))
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+def connection_not_established(error):
+    """
+    Indique si une erreur de requests est survenue avant l'envoi du POST.
+    
+    Seuls un ConnectTimeout et l'échec d'ouverture d'une nouvelle connexion
+    (NewConnectionError dans la chaîne des causes) le garantissent; une
+    connexion coupée après l'envoi (RemoteDisconnected, reset...) est aussi
+    une ConnectionError, mais Brevo a pu accepter la requête.
+    
+    Args:
+        error (requests.exceptions.RequestException): Erreur levée par post()
+    
+    Returns:
+        bool: True si la requête peut être relancée sans risque de doublon
+    """
+    if isinstance(error, requests.exceptions.ConnectTimeout):
+        return True
+    pending, seen = [error], set()
+    while pending:
+        current = pending.pop()
+        if current is None or id(current) in seen:
+            continue
+        seen.add(id(current))
+        if isinstance(current, NewConnectionError):
+            return True
+        # requests enveloppe un MaxRetryError (args[0]) dont la cause est dans .reason
+        pending.extend(arg for arg in current.args if isinstance(arg, BaseException))
+        pending.extend((getattr(current, 'reason', None), current.__cause__, current.__context__))
+    return False
+
+
+def send_email(payload, session=None, api_url=None, limiter=None,
+               retry_policy=None, counters=None, metrics=None):
     """
     Envoie un email via l'API Brevo.
     
+    Les réponses 429/5xx et les connexions impossibles à établir sont
+    relancées avec un backoff exponentiel (jitter) qui respecte l'en-tête
+    Retry-After.
+    
+    Le POST n'étant pas idempotent, une erreur survenue après l'envoi de la
+    requête (délai de lecture dépassé, connexion coupée, réponse tronquée) n'est jamais
+    relancée: Brevo a pu accepter l'email, le renvoyer risquerait un
+    doublon. La réponse est alors marquée {'uncertain': True}.
+    
     Args:
-        payload (dict): Payload de l'email
+        payload (dict | bytes): Payload de l'email, ou corps JSON déjà encodé
+        session (requests.Session): Session partagée (optionnelle)
+        api_url (str): URL de l'API (par défaut API_URL)
+        limiter (TokenBucket): Limiteur de débit partagé (optionnel)
+        retry_policy (RetryPolicy): Politique de relance (par défaut MAX_RETRIES)
+        counters (SendCounters): Compteurs de relances/attentes (optionnels)
+        metrics (SendMetrics): Latence par requête HTTP et jauge en cours (optionnelles)
     
     Returns:
-        tuple: (status_code, response_data)
+        tuple: (status_code, response_data) du dernier essai
     """
     headers = {
         'accept': 'application/json',
         'api-key': API_KEY,
         'content-type': 'application/json'
     }
+    retry_policy = retry_policy or RetryPolicy(max_retries=MAX_RETRIES)
+    body = {'data': payload} if isinstance(payload, bytes) else {'json': payload}
+    attempt = 0
     
-    try:
-        response = requests.post(
-            API_URL,
-            headers=headers,
-            json=payload,
-            timeout=10
-        )
-        return response.status_code, response.json() if response.text else {}
-    except requests.exceptions.RequestException as e:
-        return None, {'error': str(e)}
+    while True:
+        if limiter is not None:
+            waited = limiter.acquire()
+            if counters is not None:
+                counters.add_throttle(waited)
+        
+        retry_after = None
+        if metrics is not None:
+            metrics.request_started()
+        request_start = time.perf_counter()
+        try:
+            response = (session or requests).post(
+                api_url or API_URL,
+                headers=headers,
+                timeout=10,
+                **body
+            )
+            status_code = response.status_code
+            try:
+                response_data = response.json() if response.text else {}
+            except ValueError:
+                # Réponse non JSON (page d'erreur d'un proxy, etc.)
+                response_data = {'message': response.text[:200]}
+            retry_after = parse_retry_after(response.headers.get('Retry-After'))
+        except requests.exceptions.RequestException as e:
+            if connection_not_established(e):
+                # Connexion jamais établie: rien n'a été envoyé, relance possible
+                status_code, response_data = None, {'error': str(e)}
+            else:
+                # ReadTimeout, connexion coupée après l'envoi, etc.: la requête
+                # a pu être acceptée, pas de relance
+                status_code, response_data = None, {'error': str(e), 'uncertain': True}
+        if metrics is not None:
+            metrics.request_finished(status_code, time.perf_counter() - request_start)
+        
+        if response_data.get('uncertain') or not retry_policy.should_retry(attempt, status_code):
+            return status_code, response_data
+        
+        delay = retry_policy.compute_delay(attempt, retry_after)
+        if limiter is not None and status_code == 429:
+            # La limite du fournisseur est commune: on suspend tous les threads
+            limiter.pause(delay)
+        if counters is not None:
+            counters.add_retry(status_code, delay)
+        time.sleep(delay)
+        attempt += 1
 
 
-def log_result(email, prenom, status_code, response_data, log_file='email_logs.txt'):
+def log_result(email, prenom, status_code, response_data, log_file='email_logs.txt', logger=None):
     """
     Enregistre les résultats d'envoi dans un fichier log.
     
@@ -168,104 +340,424 @@ def log_result(email, prenom, status_code, response_data, log_file='email_logs.t
         status_code (int): Code de statut HTTP
         response_data (dict): Réponse de l'API
         log_file (str): Nom du fichier de log
+        logger (BufferedLogWriter): Journal bufferisé; si fourni, la ligne
+            passe par sa file au lieu d'ouvrir log_file
     """
     timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
     
+    if logger is not None:
+        logger.log(email, prenom, status_code, response_data, timestamp)
+        return
+    
     with open(log_file, 'a', encoding='utf-8') as f:
-        if status_code == 201:
-            f.write(f"[{timestamp}]  SUCCÈS - Email envoyé à {prenom} ({email}) - MessageID: {response_data.get('messageId', 'N/A')}\n")
+        f.write(format_text_line(timestamp, email, prenom, status_code, response_data))
+
+
+def build_payload(recipients):
+    """
+    Construit le payload d'un appel API: envoi groupé (messageVersions) pour
+    plusieurs destinataires, sinon payload individuel (pré-encodé si activé).
+    
+    Args:
+        recipients (list): Tuples (email, prenom, date_inscription)
+    
+    Returns:
+        dict | bytes: Payload pour send_email
+    """
+    if len(recipients) > 1:
+        return create_batch_payload(recipients)
+    if PREENCODED_PAYLOADS:
+        return create_email_payload_bytes(*recipients[0])
+    return create_email_payload(*recipients[0])
+
+
+def deliver_batch(recipients, session=None, api_url=None, limiter=None, counters=None,
+                  dry_run=False, metrics=None):
+    """
+    Envoie un lot de destinataires en un seul appel API.
+    
+    Exécutée dans les threads d'envoi: aucune écriture de log ni de
+    compteur de résultats ici, tout est centralisé dans le thread principal.
+    
+    Args:
+        recipients (list): Tuples (email, prenom, date_inscription)
+        dry_run (bool): Construit les payloads sans rien envoyer
+        metrics (SendMetrics): Temps des étapes 'payload' et 'send' (optionnel)
+    
+    Returns:
+        tuple: (liste d'un tuple (status_code, response_data) par
+                destinataire, latence de l'appel API en secondes, sans la
+                construction du payload; 0 en dry_run)
+    """
+    start_time = time.perf_counter()
+    payload = build_payload(recipients)
+    built_time = time.perf_counter()
+    if metrics is not None:
+        metrics.add_stage('payload', built_time - start_time)
+    
+    if dry_run:
+        results = [(201, {'messageId': 'dry-run'})] * len(recipients)
+        latency = 0.0
+    else:
+        status_code, response_data = send_email(payload, session=session, api_url=api_url,
+                                                limiter=limiter, counters=counters,
+                                                metrics=metrics)
+        if len(recipients) > 1:
+            results = split_batch_response(status_code, response_data, len(recipients))
         else:
-            error_msg = response_data.get('message', response_data.get('error', 'Erreur inconnue'))
-            f.write(f"[{timestamp}]  ÉCHEC - {prenom} ({email}) - Code: {status_code} - Erreur: {error_msg}\n")
+            results = [(status_code, response_data)]
+        latency = time.perf_counter() - built_time
+        if metrics is not None:
+            metrics.add_stage('send', latency)
+    
+    return results, latency
 
 
-def main():
+def checkpoint_result(checkpoint, email, status_code, response_data):
     """
-    Fonction principale qui orchestre l'envoi des emails.
+    Enregistre dans le registre de reprise une livraison confirmée ou un
+    envoi au résultat inconnu (les autres échecs restent renvoyables).
     """
-    print("=" * 70)
-    print("TP03 - EXERCICE 1.1: AUTOMATISATION D'ENVOI D'EMAILS")
-    print("=" * 70)
-    print()
+    if status_code == 201:
+        checkpoint.mark_delivered(email, response_data.get('messageId'))
+    elif status_code is None and response_data.get('uncertain'):
+        # Ni livré ni renvoyable: une reprise ne doit pas le renvoyer
+        checkpoint.mark_uncertain(email, response_data.get('error'))
+
+
+def record_result(email, prenom, status_code, response_data, stats, logger,
+                  verbose=True, checkpoint=None, metrics=None):
+    """
+    Enregistre le résultat d'un envoi dans le registre de reprise (avant le
+    log: un arrêt entre les deux ne perd pas une livraison confirmée), le
+    logge et l'affiche, puis met à jour les compteurs.
     
-    # Vérification de la clé API
-    if API_KEY == 'votre_clé_api_brevo':
-        print("  ATTENTION: Vous devez remplacer 'votre_clé_api_brevo' par votre vraie clé API Brevo!")
-        print(" Pour obtenir votre clé: https://app.brevo.com/settings/keys/api")
+    Args:
+        stats (dict): Compteurs 'total', 'success' et 'errors'
+        logger (BufferedLogWriter): Journal d'envoi
+        checkpoint (SendCheckpoint): Registre des livraisons (optionnel)
+        metrics (SendMetrics): Temps de l'étape 'log' (optionnel)
+    """
+    if checkpoint is not None:
+        checkpoint_result(checkpoint, email, status_code, response_data)
+    log_start = time.perf_counter()
+    log_result(email, prenom, status_code, response_data, logger=logger)
+    if metrics is not None:
+        metrics.add_stage('log', time.perf_counter() - log_start)
+        metrics.add_processed()
+    uncertain = status_code is None and response_data.get('uncertain')
+    stats['total'] += 1
+    if uncertain:
+        stats['uncertain'] += 1
+    
+    if verbose:
+        print(f" Envoi à: {prenom} ({email})...")
+    
+    if status_code == 201:
+        if verbose:
+            print(f"    Succès! Code: {status_code}")
+        stats['success'] += 1
+    elif status_code is None:
+        if verbose:
+            label = "Résultat incertain (non renvoyé)" if uncertain else "Erreur de connexion"
+            print(f"    {label}: {response_data.get('error', 'Inconnue')}")
+        stats['errors'] += 1
+    else:
+        if verbose:
+            error_msg = response_data.get('message', response_data.get('error', 'Erreur inconnue'))
+            print(f"    Échec! Code: {status_code} - {error_msg}")
+        stats['errors'] += 1
+    
+    if verbose:
         print()
-        response = input("Voulez-vous continuer quand même (mode test) ? (o/n): ")
-        if response.lower() != 'o':
-            print(" Arrêt du programme.")
-            return
-        print("\n⚠️  Mode test activé - Les emails ne seront PAS réellement envoyés.\n")
+
+
+def send_campaign(rows, log_file='email_logs.txt', max_in_flight=MAX_IN_FLIGHT,
+                  api_url=None, verbose=True, rate_limit=RATE_LIMIT, burst=RATE_BURST,
+                  batch_size=BATCH_SIZE, log_format=LOG_FORMAT, checkpoint=None,
+                  dry_run=False, metrics=None, stats_interval=STATS_INTERVAL,
+                  prometheus_file=PROMETHEUS_FILE):
+    """
+    Envoie les emails de bienvenue avec au plus `max_in_flight` requêtes
+    simultanées, via un pool de threads et une session HTTP partagée.
     
-    # Lecture du fichier CSV
-    csv_file = 'inscrits.csv'
+    Les lignes sont lues au fur et à mesure (jamais plus de `max_in_flight`
+    envois en attente), et les résultats sont loggés dans le thread principal
+    pour garder des lignes de log intactes. Le journal est écrit par un
+    BufferedLogWriter (un seul descripteur, écritures par lots).
     
-    if not os.path.exists(csv_file):
-        print(f" Erreur: Le fichier '{csv_file}' n'existe pas!")
-        return
+    Args:
+        rows (iterable): Lignes avec 'email', 'prenom' et 'date_inscription';
+            sa méthode close(), si elle existe, est appelée à la fin
+        log_file (str): Nom du fichier de log
+        max_in_flight (int): Nombre maximal de requêtes en cours
+        api_url (str): URL de l'API (par défaut API_URL)
+        verbose (bool): Affiche le détail de chaque envoi
+        rate_limit (float): Requêtes/s autorisées (0 = pas de limite)
+        burst (int): Rafale maximale du token bucket
+        batch_size (int): Destinataires par appel API (messageVersions)
+        log_format (str): Format du journal, 'text' ou 'jsonl'
+        checkpoint (SendCheckpoint): Si fourni, les adresses déjà livrées
+            et les doublons du fichier sont sautés, les succès enregistrés
+        dry_run (bool): Construit les payloads sans envoyer (coût CPU seul);
+            le registre de reprise n'est alors pas mis à jour
+        metrics (SendMetrics): Métriques à alimenter (créées si absentes)
+        stats_interval (float): Période (s) de la ligne de statistiques sur
+            stderr, 0 = désactivée
+        prometheus_file (str): Fichier texte Prometheus mis à jour pendant l'envoi
     
-    print(f" Lecture du fichier: {csv_file}")
-    print()
+    Returns:
+        dict: Compteurs 'total', 'success', 'errors', 'uncertain' (erreurs
+              après envoi de la requête, non relancées), 'skipped' (déjà
+              livrés), 'skipped_uncertain' (incertains d'un run précédent),
+              'duplicates', 'duration' (s), 'throughput' (emails/s), latences
+              'latency_p50_ms', 'latency_p95_ms', 'latency_p99_ms' des appels
+              API, 'retries', 'throttled_waits', 'rate_limited' et
+              'sleep_time' (s) de la couche de relance, et 'metrics' (temps par
+              étape, histogrammes par classe de statut, jauge en cours)
+    """
+    max_in_flight = max(1, max_in_flight)
+    batch_size = min(max(1, batch_size), MAX_BATCH_SIZE)
+    limiter = TokenBucket(rate_limit, burst) if rate_limit > 0 else None
+    counters = SendCounters()
+    stats = {'total': 0, 'success': 0, 'errors': 0, 'uncertain': 0, 'skipped': 0,
+             'skipped_uncertain': 0, 'duplicates': 0}
+    metrics = metrics or SendMetrics()
+    start_time = time.perf_counter()
+    in_flight = {}
     
-    # Initialisation du fichier de log
-    log_file = 'email_logs.txt'
-    with open(log_file, 'a', encoding='utf-8') as f:
-        f.write(f"\n{'=' * 70}\n")
-        f.write(f"Nouvelle session - {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
-        f.write(f"{'=' * 70}\n")
+    def drain(futures):
+        for future in futures:
+            batch = in_flight[future]
+            results, latency = future.result()
+            metrics.call_latency.record(latency)
+            for (email, prenom, _), (status_code, response_data) in zip(batch, results):
+                record_result(email, prenom, status_code, response_data, stats, logger,
+                              verbose, None if dry_run else checkpoint, metrics)
+            if checkpoint is not None and not dry_run:
+                # Un commit par appel API: une reprise ne renvoie aucun email confirmé
+                checkpoint.flush()
+            # Retiré seulement une fois traité: un lot interrompu reste à sauver
+            del in_flight[future]
     
-    # Compteurs de statistiques
-    total_emails = 0
-    success_count = 0
-    error_count = 0
+    def settle(futures):
+        # Après une erreur, les appels déjà partis aboutissent quand même: on
+        # les attend et on les inscrit au registre (sans log) pour qu'une
+        # reprise ne renvoie pas ces emails
+        for future in futures:
+            batch = in_flight.pop(future)
+            try:
+                results, _ = future.result()
+            except Exception:
+                continue
+            for (email, _, _), (status_code, response_data) in zip(batch, results):
+                checkpoint_result(checkpoint, email, status_code, response_data)
+        checkpoint.flush()
     
-    # Traitement des inscrits
     try:
-        with open(csv_file, 'r', encoding='utf-8') as f:
-            reader = csv.DictReader(f)
-            
-            for row in reader:
-                total_emails += 1
-                email = row['email']
-                prenom = row['prenom']
-                date_inscription = row['date_inscription']
-                
-                print(f" Envoi à: {prenom} ({email})...")
-                
-                # Créer le payload
-                payload = create_email_payload(email, prenom, date_inscription)
-                
-                # Envoyer l'email
-                status_code, response_data = send_email(payload)
-                
-                # Logger le résultat
-                log_result(email, prenom, status_code, response_data, log_file)
-                
-                # Afficher le résultat
-                if status_code == 201:
-                    print(f"    Succès! Code: {status_code}")
-                    success_count += 1
-                elif status_code is None:
-                    print(f"    Erreur de connexion: {response_data.get('error', 'Inconnue')}")
-                    error_count += 1
-                else:
-                    error_msg = response_data.get('message', response_data.get('error', 'Erreur inconnue'))
-                    print(f"    Échec! Code: {status_code} - {error_msg}")
-                    error_count += 1
-                
-                print()
-                
+        with BufferedLogWriter(log_file, log_format) as logger, \
+                MetricsReporter(metrics, stats_interval, prometheus_file), \
+                create_session(max_in_flight) as session, \
+                ThreadPoolExecutor(max_workers=max_in_flight) as executor:
+            logger.start_session()
+        
+            def submit(batch):
+                future = executor.submit(deliver_batch, batch, session, api_url, limiter, counters,
+                                         dry_run, metrics)
+                in_flight[future] = batch
+                if len(in_flight) >= max_in_flight:
+                    done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                    drain(done)
+        
+            try:
+                batch = []
+                for row in rows:
+                    email = row['email']
+                    if checkpoint is not None:
+                        reason = checkpoint.check(email)
+                        if reason is not None:
+                            stats[SKIP_COUNTERS[reason]] += 1
+                            continue
+                    batch.append((email, row['prenom'], row['date_inscription']))
+                    if len(batch) >= batch_size:
+                        submit(batch)
+                        batch = []
+                if batch:
+                    submit(batch)
+        
+                # Résultats restants, dans l'ordre de soumission
+                drain(list(in_flight))
+            except BaseException:
+                if checkpoint is not None and not dry_run:
+                    settle(list(in_flight))
+                raise
+    finally:
+        # Arrête la lecture en amont (threads d'un SubscriberStream), même si
+        # l'envoi échoue avant d'avoir consommé le flux
+        close = getattr(rows, 'close', None)
+        if close is not None:
+            close()
+    
+    stats['duration'] = time.perf_counter() - start_time
+    stats['throughput'] = stats['total'] / stats['duration'] if stats['duration'] > 0 else 0.0
+    for q in (50, 95, 99):
+        stats[f'latency_p{q}_ms'] = round(metrics.call_latency.percentile(q) * 1000, 3)
+    stats.update(counters.as_dict())
+    stats['metrics'] = metrics.summary()
+    return stats
+
+
+def parse_args(argv=None):
+    """
+    Analyse les arguments de la ligne de commande.
+    
+    Les valeurs par défaut viennent de la configuration (variables
+    d'environnement), la clé API n'est lue que depuis BREVO_API_KEY.
+    """
+    parser = argparse.ArgumentParser(
+        description="Envoi automatisé des emails de bienvenue via l'API Brevo"
+    )
+    parser.add_argument('--input', default='inscrits.csv',
+                        help="Fichier CSV des inscrits (défaut: inscrits.csv)")
+    parser.add_argument('--log-file', default='email_logs.txt',
+                        help="Fichier de log des envois (défaut: email_logs.txt)")
+    parser.add_argument('--log-format', choices=('text', 'jsonl'), default=LOG_FORMAT,
+                        help="Format du log: texte lisible ou JSON Lines")
+    parser.add_argument('--reject-file', default=None,
+                        help="Fichier des lignes rejetées (défaut: <input>_rejets.csv)")
+    parser.add_argument('--concurrency', type=int, default=MAX_IN_FLIGHT,
+                        help="Nombre maximal de requêtes simultanées")
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE,
+                        help=f"Destinataires par appel API (1 à {MAX_BATCH_SIZE})")
+    parser.add_argument('--rate-limit', type=float, default=RATE_LIMIT,
+                        help="Requêtes/s autorisées (0 = pas de limite)")
+    parser.add_argument('--burst', type=int, default=RATE_BURST,
+                        help="Rafale maximale du limiteur de débit")
+    parser.add_argument('--api-url', default=API_URL, help="URL de l'API d'envoi")
+    parser.add_argument('--campaign-id', default=CAMPAIGN_ID,
+                        help="Identifiant de campagne pour la reprise")
+    parser.add_argument('--checkpoint-db', default=CHECKPOINT_DB,
+                        help="Base SQLite des adresses déjà livrées")
+    parser.add_argument('--no-checkpoint', action='store_true',
+                        help="Désactive la reprise (tous les inscrits sont envoyés)")
+    parser.add_argument('--dry-run', action='store_true',
+                        help="Construit les payloads sans rien envoyer (mesure du coût CPU)")
+    parser.add_argument('--stats-interval', type=float, default=STATS_INTERVAL,
+                        help="Période (s) de la ligne de statistiques sur stderr (0 = aucune)")
+    parser.add_argument('--prometheus-file', default=PROMETHEUS_FILE,
+                        help=f"Fichier texte Prometheus réécrit toutes les {PROMETHEUS_INTERVAL:g} s "
+                             f"pendant l'envoi, même avec --stats-interval 0")
+    parser.add_argument('--verbose', action='store_true',
+                        help="Affiche le résultat de chaque envoi")
+    parser.add_argument('--json', action='store_true',
+                        help="N'affiche que le résumé, au format JSON, sur la sortie standard")
+    return parser.parse_args(argv)
+
+
+def run(args, out=print):
+    """
+    Exécute une campagne d'envoi à partir des arguments de la CLI.
+    
+    Args:
+        args (argparse.Namespace): Arguments (voir parse_args)
+        out (callable): Fonction d'affichage des messages (les erreurs vont
+            toujours sur stderr, même avec --json)
+    
+    Returns:
+        dict: Résumé de la campagne (voir send_campaign), complété par
+              'rejected'; None en cas d'erreur
+    """
+    csv_file = args.input
+    
+    if not os.path.exists(csv_file):
+        print(f" Erreur: Le fichier '{csv_file}' n'existe pas!", file=sys.stderr)
+        return None
+    
+    out(f" Lecture du fichier: {csv_file}")
+    out()
+    
+    # Traitement des inscrits: lecture/validation en flux (les lignes invalides
+    # vont dans le fichier de rejets), reprise sur les adresses déjà livrées
+    reject_file = args.reject_file or os.path.splitext(csv_file)[0] + '_rejets.csv'
+    checkpoint = None
+    try:
+        if not args.no_checkpoint:
+            checkpoint = SendCheckpoint(args.checkpoint_db, args.campaign_id)
+            if checkpoint.delivered_count:
+                out(f" Reprise de la campagne '{args.campaign_id}': "
+                    f"{checkpoint.delivered_count} adresses déjà livrées seront ignorées")
+                out()
+        subscribers = SubscriberStream(csv_file, reject_file)
+        stats = send_campaign(
+            subscribers, args.log_file,
+            max_in_flight=args.concurrency,
+            api_url=args.api_url,
+            verbose=args.verbose,
+            rate_limit=args.rate_limit,
+            burst=args.burst,
+            batch_size=args.batch_size,
+            log_format=args.log_format,
+            checkpoint=checkpoint,
+            dry_run=args.dry_run,
+            stats_interval=args.stats_interval,
+            prometheus_file=args.prometheus_file
+        )
     except FileNotFoundError:
-        print(f" Erreur: Impossible d'ouvrir le fichier '{csv_file}'")
-        return
+        print(f" Erreur: Impossible d'ouvrir le fichier '{csv_file}'", file=sys.stderr)
+        return None
     except KeyError as e:
-        print(f" Erreur: Colonne manquante dans le CSV: {e}")
-        return
+        print(f" Erreur: Colonne manquante dans le CSV: {e}", file=sys.stderr)
+        return None
     except Exception as e:
-        print(f" Erreur inattendue: {e}")
-        return
+        print(f" Erreur inattendue: {e}", file=sys.stderr)
+        return None
+    finally:
+        if checkpoint is not None:
+            checkpoint.close()
+    
+    stats['rejected'] = subscribers.rejected_count
+    stats['reject_file'] = reject_file
+    stats['dry_run'] = args.dry_run
+    return stats
+
+
+def main(argv=None):
+    """
+    Fonction principale qui orchestre l'envoi des emails.
+    
+    Returns:
+        int: Code de sortie (0 = tout envoyé, 1 = au moins un échec,
+             2 = erreur de configuration ou d'entrée)
+    """
+    args = parse_args(argv)
+    out = (lambda *a, **k: None) if args.json else print
+    
+    out("=" * 70)
+    out("TP03 - EXERCICE 1.1: AUTOMATISATION D'ENVOI D'EMAILS")
+    out("=" * 70)
+    out()
+    
+    # Vérification de la clé API (jamais d'invite interactive: exécution planifiable)
+    if args.dry_run:
+        out(" Mode dry-run: les payloads sont construits mais aucun email n'est envoyé.")
+        out()
+    elif API_KEY == API_KEY_PLACEHOLDER:
+        print(" Erreur: la variable d'environnement BREVO_API_KEY n'est pas définie.", file=sys.stderr)
+        print(" Pour obtenir votre clé: https://app.brevo.com/settings/keys/api", file=sys.stderr)
+        print(" (utilisez --dry-run pour tester sans clé)", file=sys.stderr)
+        return 2
+    
+    stats = run(args, out)
+    if stats is None:
+        return 2
+    
+    if args.json:
+        print(json.dumps(stats, ensure_ascii=False))
+        return 1 if stats['errors'] else 0
+    
+    total_emails = stats['total']
+    success_count = stats['success']
+    error_count = stats['errors']
     
     # Affichage du résumé
     print("=" * 70)
@@ -274,9 +766,25 @@ def main():
     print(f"Total d'emails traités: {total_emails}")
     print(f" Succès: {success_count}")
     print(f" Échecs: {error_count}")
+    print(f" Lignes rejetées: {stats['rejected']} (voir {stats['reject_file']})")
+    print(f" Déjà livrés (ignorés): {stats['skipped']} - Doublons: {stats['duplicates']}")
+    if stats['uncertain'] or stats['skipped_uncertain']:
+        print(f" Incertains (délai de lecture dépassé, non renvoyés): {stats['uncertain']} - "
+              f"ignorés car incertains lors d'un run précédent: {stats['skipped_uncertain']}")
     print(f" Taux de réussite: {(success_count/total_emails*100) if total_emails > 0 else 0:.1f}%")
-    print(f"\n Les détails sont disponibles dans: {log_file}")
+    print(f" Durée: {stats['duration']:.2f}s - Débit: {stats['throughput']:.1f} emails/s")
+    print(f" Latence API: p50 {stats['latency_p50_ms']:.1f}ms - p95 {stats['latency_p95_ms']:.1f}ms"
+          f" - p99 {stats['latency_p99_ms']:.1f}ms")
+    print(f" Relances: {stats['retries']} (dont {stats['rate_limited']} sur 429) - "
+          f"Attentes limiteur: {stats['throttled_waits']} - Temps d'attente cumulé: {stats['sleep_time']:.1f}s")
+    stages = stats['metrics']['stages']
+    print(" Temps par étape: " + " - ".join(
+        f"{stage} {values['total_s']:.2f}s ({values['mean_ms']:.2f}ms/appel)"
+        for stage, values in stages.items()
+    ))
+    print(f"\n Les détails sont disponibles dans: {args.log_file}")
     print("=" * 70)
+    return 1 if error_count else 0
 
 
 # ============================================================================
@@ -284,4 +792,4 @@ def main():
 # ============================================================================
 
 if __name__ == '__main__':
-    main()
+    sys.exit(main())
@@ -0,0 +1,200 @@
+"""
+TP03 - Exercice 1.1: Journal d'envoi bufferisé
+Module: Web Marketing & CRM
+
+Au lieu d'ouvrir/fermer email_logs.txt pour chaque destinataire, le
+BufferedLogWriter garde un seul descripteur ouvert et écrit depuis un thread
+dédié, par lots: vidage quand le lot atteint `batch_size` lignes, quand
+`flush_interval` secondes se sont écoulées, et à la fermeture.
+
+Deux formats sont disponibles:
+- 'text': format texte lisible historique (une ligne par destinataire)
+- 'jsonl': un objet JSON par ligne, pour l'analyse automatique
+"""
+
+import atexit
+import json
+import queue
+import threading
+import time
+from datetime import datetime
+
+LOG_FORMATS = ('text', 'jsonl')
+
+# Marqueur de fin pour le thread d'écriture
+_STOP = object()
+
+
+def format_text_line(timestamp, email, prenom, status_code, response_data):
+    """
+    Formate une ligne de log texte (format historique d'email_logs.txt).
+
+    Returns:
+        str: Ligne terminée par un retour à la ligne
+    """
+    if status_code == 201:
+        return f"[{timestamp}]  SUCCÈS - Email envoyé à {prenom} ({email}) - MessageID: {response_data.get('messageId', 'N/A')}\n"
+    error_msg = response_data.get('message', response_data.get('error', 'Erreur inconnue'))
+    return f"[{timestamp}]  ÉCHEC - {prenom} ({email}) - Code: {status_code} - Erreur: {error_msg}\n"
+
+
+def format_json_line(timestamp, email, prenom, status_code, response_data):
+    """
+    Formate une ligne de log JSON Lines.
+
+    Returns:
+        str: Objet JSON terminé par un retour à la ligne
+    """
+    record = {
+        'timestamp': timestamp,
+        'status': 'success' if status_code == 201 else 'failure',
+        'email': email,
+        'prenom': prenom,
+        'status_code': status_code
+    }
+    if status_code == 201:
+        record['message_id'] = response_data.get('messageId')
+    else:
+        record['error'] = response_data.get('message', response_data.get('error', 'Erreur inconnue'))
+    return json.dumps(record, ensure_ascii=False) + '\n'
+
+
+def format_session_header(fmt, started_at):
+    """Formate l'en-tête écrit au début de chaque session d'envoi."""
+    if fmt == 'jsonl':
+        return json.dumps({'timestamp': started_at, 'event': 'session_start'}) + '\n'
+    return f"\n{'=' * 70}\nNouvelle session - {started_at}\n{'=' * 70}\n"
+
+
+class BufferedLogWriter:
+    """
+    Écrivain de log asynchrone et bufferisé.
+
+    Args:
+        path (str): Fichier de log (ouvert une seule fois, en ajout)
+        fmt (str): 'text' ou 'jsonl'
+        batch_size (int): Nombre de lignes déclenchant un vidage
+        flush_interval (float): Délai maximal (s) avant vidage
+        queue_size (int): Taille maximale de la file (0 = illimitée);
+            quand elle est pleine, log() bloque pour ne pas exploser la mémoire
+
+    Si le thread d'écriture meurt (ex: disque plein), log() et close()
+    relancent son exception au lieu d'attendre indéfiniment sur la file.
+    """
+
+    def __init__(self, path, fmt='text', batch_size=500, flush_interval=1.0, queue_size=10000):
+        if fmt not in LOG_FORMATS:
+            raise ValueError(f"Format de log inconnu: {fmt} (attendu: {', '.join(LOG_FORMATS)})")
+        self.path = path
+        self.fmt = fmt
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self._format_line = format_json_line if fmt == 'jsonl' else format_text_line
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._file = open(path, 'a', encoding='utf-8')
+        self._closed = False
+        self._error = None
+        self._thread = threading.Thread(target=self._run, name='email-log-writer', daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def log(self, email, prenom, status_code, response_data, timestamp=None):
+        """Met en file le résultat d'un envoi (le formatage se fait dans le thread d'écriture)."""
+        if timestamp is None:
+            timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        self._enqueue((timestamp, email, prenom, status_code, response_data))
+
+    def start_session(self):
+        """Écrit l'en-tête de session (bannière texte ou événement JSON)."""
+        self._enqueue(format_session_header(self.fmt, datetime.now().strftime('%Y-%m-%d %H:%M:%S')))
+
+    def _enqueue(self, item):
+        # put() borné dans le temps: une file pleine dont le lecteur est mort
+        # ne doit pas bloquer l'expéditeur
+        while True:
+            self._raise_if_failed()
+            try:
+                self._queue.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def _raise_if_failed(self):
+        if self._thread.is_alive():
+            return
+        if self._error is not None:
+            raise self._error
+        raise RuntimeError("Le thread d'écriture du log est arrêté (journal fermé)")
+
+    def _run(self):
+        try:
+            self._consume()
+        except Exception as e:
+            self._error = e
+
+    def _consume(self):
+        buffer = []
+        last_flush = time.monotonic()
+        while True:
+            timeout = max(0.0, self.flush_interval - (time.monotonic() - last_flush))
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+
+            if item is _STOP:
+                break
+            if isinstance(item, str):
+                buffer.append(item)
+            elif item is not None:
+                buffer.append(self._format_line(*item))
+
+            if buffer and (len(buffer) >= self.batch_size
+                           or time.monotonic() - last_flush >= self.flush_interval):
+                self._write(buffer)
+                buffer = []
+                last_flush = time.monotonic()
+            elif not buffer:
+                last_flush = time.monotonic()
+
+        # Vidage final: ce qui reste dans le buffer et dans la file
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if isinstance(item, str):
+                buffer.append(item)
+            elif item is not _STOP:
+                buffer.append(self._format_line(*item))
+        self._write(buffer)
+
+    def _write(self, lines):
+        if lines:
+            self._file.write(''.join(lines))
+            self._file.flush()
+
+    def close(self):
+        """Vide les lignes en attente et ferme le fichier (idempotent)."""
+        if self._closed:
+            return
+        self._closed = True
+        atexit.unregister(self.close)
+        try:
+            while self._thread.is_alive():
+                try:
+                    self._queue.put(_STOP, timeout=0.1)
+                    break
+                except queue.Full:
+                    continue
+            self._thread.join()
+        finally:
+            self._file.close()
+        if self._error is not None:
+            raise self._error
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
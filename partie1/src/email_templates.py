@@ -0,0 +1,186 @@
+"""
+TP03 - Exercice 1.1: Templates d'emails précompilés
+Module: Web Marketing & CRM
+
+Un template est analysé une seule fois: le texte est découpé en fragments
+littéraux et en emplacements nommés ({{prenom}}, {{date_inscription}}, ...).
+Le rendu d'un destinataire se limite alors à remplir ces emplacements et à
+faire un seul ''.join, au lieu de reconstruire tout le document HTML/CSS.
+
+Les templates compilés sont mis en cache par (identifiant, version).
+"""
+
+import json
+import os
+import re
+import threading
+
+# Dossier des templates: partie1/templates/<id>_v<version>.html
+TEMPLATES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'templates')
+
+# Emplacement nommé: {{ nom }}
+PLACEHOLDER_PATTERN = re.compile(r'\{\{\s*(\w+)\s*\}\}')
+
+_cache = {}
+_cache_lock = threading.RLock()
+
+
+class CompiledTemplate:
+    """
+    Template analysé une fois, rendu ensuite sans re-parsing.
+
+    Args:
+        source (str): Texte du template avec des emplacements {{nom}}
+        template_id (str): Identifiant du template
+        version (int): Version du template
+    """
+
+    __slots__ = ('template_id', 'version', 'fields', '_parts', '_parts_bytes', '_slots')
+
+    def __init__(self, source, template_id='inline', version=1):
+        self.template_id = template_id
+        self.version = version
+
+        parts = []
+        slots = []
+        position = 0
+        for match in PLACEHOLDER_PATTERN.finditer(source):
+            parts.append(source[position:match.start()])
+            slots.append((len(parts), match.group(1)))
+            parts.append(None)
+            position = match.end()
+        parts.append(source[position:])
+
+        self._parts = parts
+        self._parts_bytes = [p.encode('utf-8') if p is not None else None for p in parts]
+        self._slots = tuple(slots)
+        self.fields = frozenset(name for _, name in slots)
+
+    def render(self, values):
+        """
+        Rend le template.
+
+        Args:
+            values (dict): Valeur (str) de chaque emplacement
+
+        Returns:
+            str: Texte rendu
+        """
+        parts = self._parts.copy()
+        for index, name in self._slots:
+            parts[index] = values[name]
+        return ''.join(parts)
+
+    def render_bytes(self, values):
+        """
+        Rend le template directement en UTF-8: les fragments littéraux sont
+        encodés une fois pour toutes, seules les valeurs le sont à chaque appel.
+
+        Args:
+            values (dict): Valeur (bytes) de chaque emplacement
+
+        Returns:
+            bytes: Texte rendu encodé en UTF-8
+        """
+        parts = self._parts_bytes.copy()
+        for index, name in self._slots:
+            parts[index] = values[name]
+        return b''.join(parts)
+
+    def render_json(self, values):
+        """
+        Rend un template JSON (voir compile_json_template) en bytes, en
+        échappant les valeurs pour qu'elles soient valides dans une chaîne JSON.
+
+        Args:
+            values (dict): Valeur (str) de chaque emplacement
+
+        Returns:
+            bytes: Document JSON encodé en UTF-8
+        """
+        parts = self._parts_bytes.copy()
+        escaped = {}
+        for index, name in self._slots:
+            value = escaped.get(name)
+            if value is None:
+                value = escaped[name] = json_escape(values[name]).encode('utf-8')
+            parts[index] = value
+        return b''.join(parts)
+
+
+def json_escape(value):
+    """Échappe une valeur pour l'intérieur d'une chaîne JSON (sans les guillemets)."""
+    return json.dumps(value, ensure_ascii=False)[1:-1]
+
+
+def _cached(key, factory):
+    """Retourne le template du cache, en le compilant au premier appel."""
+    with _cache_lock:
+        template = _cache.get(key)
+        if template is None:
+            template = _cache[key] = factory()
+    return template
+
+
+def load_template(template_id, version=1, templates_dir=TEMPLATES_DIR):
+    """
+    Charge et compile le template `<template_id>_v<version>.html` (une seule
+    fois par processus).
+
+    Returns:
+        CompiledTemplate: Template compilé
+    """
+    template = _cache.get(('file', template_id, version))
+    if template is not None:
+        return template
+
+    def factory():
+        path = os.path.join(templates_dir, f'{template_id}_v{version}.html')
+        with open(path, 'r', encoding='utf-8') as f:
+            return CompiledTemplate(f.read(), template_id, version)
+
+    return _cached(('file', template_id, version), factory)
+
+
+def compile_text_template(source, template_id, version=1):
+    """
+    Compile (une seule fois) un template fourni sous forme de chaîne.
+
+    Returns:
+        CompiledTemplate: Template compilé
+    """
+    template = _cache.get(('text', template_id, version))
+    if template is not None:
+        return template
+    return _cached(('text', template_id, version),
+                   lambda: CompiledTemplate(source, template_id, version))
+
+
+def compile_json_template(build_document, template_id, version=1):
+    """
+    Compile (une seule fois) un document JSON dont les chaînes contiennent
+    des emplacements {{nom}}.
+
+    Le document est sérialisé une seule fois; comme l'échappement JSON se fait
+    caractère par caractère, les emplacements survivent tels quels et les
+    fragments constants (HTML, expéditeur, ...) sont pré-encodés en bytes.
+
+    Args:
+        build_document (callable): Construit le payload (avec emplacements);
+            appelé uniquement à la première compilation
+
+    Returns:
+        CompiledTemplate: Template à rendre avec render_json()
+    """
+    template = _cache.get(('json', template_id, version))
+    if template is not None:
+        return template
+    return _cached(('json', template_id, version),
+                   lambda: CompiledTemplate(json.dumps(build_document(), ensure_ascii=False),
+                                            template_id, version))
+
+
+def clear_cache():
+    """Vide le cache (ex: après modification d'un template sur disque)."""
+    with _cache_lock:
+        _cache.clear()
@@ -0,0 +1,249 @@
+"""
+TP03 - Exercice 1.1: Serveur Brevo simulé pour les tests de charge
+Module: Web Marketing & CRM
+
+Serveur HTTP local qui imite POST /v3/smtp/email:
+- latence configurable (fixe, uniforme, log-normale ou exponentielle)
+- taux d'erreurs 5xx et taux de 429 injectés aléatoirement
+- plafond de débit (requêtes/s): au-delà, réponse 429 avec Retry-After
+- envois simples (messageId) et groupés via messageVersions (messageIds)
+
+GET /stats renvoie les compteurs du serveur, POST /stats/reset les remet à zéro.
+
+Usage:
+    python mock_brevo_server.py --port 8025 --latency-ms 20 --error-rate 0.01
+    BREVO_API_URL=http://127.0.0.1:8025/v3/smtp/email python email_automation.py ...
+"""
+
+import argparse
+import itertools
+import json
+import math
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from rate_limiter import TokenBucket
+
+LATENCY_DISTRIBUTIONS = ('fixed', 'uniform', 'lognormal', 'exponential')
+
+
+class MockConfig:
+    """
+    Comportement du serveur simulé.
+
+    Args:
+        latency_ms (float): Latence moyenne (médiane pour 'lognormal')
+        latency_dist (str): Distribution de la latence
+        latency_spread (float): Demi-largeur (ms) pour 'uniform', sigma pour 'lognormal'
+        error_rate (float): Part des requêtes en erreur 500
+        throttle_rate (float): Part des requêtes en 429 (hors plafond)
+        rate_cap (float): Requêtes/s acceptées (0 = pas de plafond)
+        retry_after (float): Valeur de Retry-After (s) des 429 aléatoires
+        seed (int): Graine du générateur aléatoire (None = non déterministe)
+    """
+
+    def __init__(self, latency_ms=20.0, latency_dist='fixed', latency_spread=0.5,
+                 error_rate=0.0, throttle_rate=0.0, rate_cap=0.0, retry_after=1.0, seed=None):
+        if latency_dist not in LATENCY_DISTRIBUTIONS:
+            raise ValueError(f"Distribution inconnue: {latency_dist}")
+        self.latency_ms = latency_ms
+        self.latency_dist = latency_dist
+        self.latency_spread = latency_spread
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.rate_cap = rate_cap
+        self.retry_after = retry_after
+        self.random = random.Random(seed)
+        self.bucket = TokenBucket(rate_cap, burst=max(1, int(rate_cap))) if rate_cap > 0 else None
+
+    def draw_latency(self):
+        """Tire une latence (s) selon la distribution configurée."""
+        mean = self.latency_ms / 1000
+        if self.latency_dist == 'uniform':
+            spread = self.latency_spread / 1000
+            return max(0.0, self.random.uniform(mean - spread, mean + spread))
+        if self.latency_dist == 'lognormal':
+            return mean * math.exp(self.random.gauss(0, self.latency_spread))
+        if self.latency_dist == 'exponential':
+            return self.random.expovariate(1 / mean) if mean > 0 else 0.0
+        return mean
+
+
+class MockStats:
+    """Compteurs du serveur (thread-safe)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.requests = 0
+            self.recipients = 0
+            self.by_status = {}
+
+    def add(self, status, recipients):
+        with self._lock:
+            self.requests += 1
+            self.by_status[status] = self.by_status.get(status, 0) + 1
+            if status == 201:
+                self.recipients += recipients
+
+    def as_dict(self):
+        with self._lock:
+            return {
+                'requests': self.requests,
+                'recipients_accepted': self.recipients,
+                'by_status': {str(k): v for k, v in sorted(self.by_status.items())}
+            }
+
+
+class MockBrevoHandler(BaseHTTPRequestHandler):
+    """Gestionnaire HTTP du serveur simulé (keep-alive HTTP/1.1)."""
+
+    protocol_version = 'HTTP/1.1'
+    # En-têtes et corps partent en deux écritures: avec Nagle, l'ACK retardé
+    # du client ajouterait ~40 ms à chaque réponse en keep-alive
+    disable_nagle_algorithm = True
+    message_counter = itertools.count(1)
+
+    def log_message(self, format, *args):
+        # Pas de log par requête: il fausserait les mesures
+        pass
+
+    def _reply(self, status, body, headers=None):
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path == '/stats':
+            self._reply(200, self.server.stats.as_dict())
+        else:
+            self._reply(404, {'code': 'not_found', 'message': 'Unknown path'})
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        raw_body = self.rfile.read(length)
+        config = self.server.config
+
+        if self.path == '/stats/reset':
+            self.server.stats.reset()
+            self._reply(200, {'reset': True})
+            return
+        if not self.path.rstrip('/').endswith('/smtp/email'):
+            self._reply(404, {'code': 'not_found', 'message': 'Unknown path'})
+            return
+
+        try:
+            payload = json.loads(raw_body)
+        except ValueError:
+            self._reply(400, {'code': 'bad_request', 'message': 'Invalid JSON'})
+            self.server.stats.add(400, 0)
+            return
+
+        versions = payload.get('messageVersions')
+        recipients = len(versions) if versions else len(payload.get('to') or [])
+        if not self.headers.get('api-key'):
+            status, body, headers = 401, {'code': 'unauthorized', 'message': 'Key not found'}, None
+        elif not payload.get('sender') or not recipients:
+            status, body, headers = 400, {'code': 'missing_parameter',
+                                          'message': 'sender and to/messageVersions are required'}, None
+        else:
+            status, body, headers = self._simulate(config, versions)
+
+        time.sleep(config.draw_latency())
+        self.server.stats.add(status, recipients)
+        self._reply(status, body, headers)
+
+    def _simulate(self, config, versions):
+        if config.bucket is not None:
+            allowed, wait = config.bucket.try_acquire()
+            if not allowed:
+                return 429, {'code': 'too_many_requests', 'message': 'Rate limit exceeded'}, \
+                    {'Retry-After': f'{wait:.3f}'}
+        draw = config.random.random()
+        if draw < config.throttle_rate:
+            return 429, {'code': 'too_many_requests', 'message': 'Too many requests'}, \
+                {'Retry-After': str(config.retry_after)}
+        if draw < config.throttle_rate + config.error_rate:
+            return 500, {'code': 'internal_error', 'message': 'Simulated server error'}, None
+
+        if versions:
+            ids = [f'<mock.{next(self.message_counter)}@smtp-relay.mock>' for _ in versions]
+            return 201, {'messageIds': ids}, None
+        return 201, {'messageId': f'<mock.{next(self.message_counter)}@smtp-relay.mock>'}, None
+
+
+class MockBrevoServer(ThreadingHTTPServer):
+    """Serveur HTTP multi-threads portant la configuration et les compteurs."""
+
+    daemon_threads = True
+    request_queue_size = 1024
+
+    def __init__(self, address, config):
+        super().__init__(address, MockBrevoHandler)
+        self.config = config
+        self.stats = MockStats()
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}/v3/smtp/email'
+
+
+def start_mock_server(host='127.0.0.1', port=0, config=None):
+    """
+    Démarre le serveur simulé dans un thread (port 0 = port libre choisi par l'OS).
+
+    Returns:
+        MockBrevoServer: Serveur démarré (url dans server.url, arrêt via shutdown())
+    """
+    server = MockBrevoServer((host, port), config or MockConfig())
+    threading.Thread(target=server.serve_forever, name='mock-brevo', daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serveur Brevo simulé pour les tests de charge")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8025, help="Port d'écoute (0 = port libre)")
+    parser.add_argument('--latency-ms', type=float, default=20.0, help="Latence moyenne (ms)")
+    parser.add_argument('--latency-dist', choices=LATENCY_DISTRIBUTIONS, default='fixed')
+    parser.add_argument('--latency-spread', type=float, default=0.5,
+                        help="Demi-largeur (ms) pour uniform, sigma pour lognormal")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Part de réponses 500")
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help="Part de réponses 429")
+    parser.add_argument('--rate-cap', type=float, default=0.0,
+                        help="Requêtes/s acceptées avant 429 (0 = pas de plafond)")
+    parser.add_argument('--retry-after', type=float, default=1.0,
+                        help="Retry-After (s) des 429 aléatoires")
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+
+    config = MockConfig(
+        latency_ms=args.latency_ms, latency_dist=args.latency_dist,
+        latency_spread=args.latency_spread, error_rate=args.error_rate,
+        throttle_rate=args.throttle_rate, rate_cap=args.rate_cap,
+        retry_after=args.retry_after, seed=args.seed
+    )
+    server = MockBrevoServer((args.host, args.port), config)
+    # Première ligne lue par bench_email_sender.py pour connaître l'URL
+    print(f"Serveur Brevo simulé prêt: {server.url}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,190 @@
+"""
+TP03 - Exercice 1.1: Limitation de débit et relances pour l'API Brevo
+Module: Web Marketing & CRM
+
+Ce module fournit:
+- un token bucket partagé entre les threads d'envoi (requêtes/s + rafale)
+- une politique de relance avec backoff exponentiel et jitter, qui respecte
+  l'en-tête Retry-After renvoyé sur les 429/5xx
+- des compteurs (relances, attentes, temps passé à dormir) pour régler
+  la fenêtre d'envoi
+"""
+
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+# Codes HTTP pour lesquels un nouvel essai a du sens
+RETRYABLE_STATUS = frozenset({429, 500, 502, 503, 504})
+
+
+class TokenBucket:
+    """
+    Token bucket thread-safe: `rate` jetons par seconde, au plus `burst`
+    jetons accumulés.
+
+    Chaque appel à acquire() réserve un jeton (le solde peut devenir négatif),
+    ce qui sert les threads dans leur ordre d'arrivée sans attente active.
+    """
+
+    def __init__(self, rate, burst=1):
+        if rate <= 0:
+            raise ValueError("rate doit être > 0")
+        self.rate = float(rate)
+        self.burst = max(1, int(burst))
+        self._tokens = float(self.burst)
+        self._last = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+        self._last = now
+
+    def reserve(self):
+        """
+        Réserve un jeton sans dormir.
+
+        Returns:
+            float: Délai (s) à attendre avant de pouvoir envoyer
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self._tokens -= 1
+            delay = -self._tokens / self.rate if self._tokens < 0 else 0.0
+            return max(delay, self._paused_until - now)
+
+    def try_acquire(self):
+        """
+        Prend un jeton s'il y en a un de disponible, sans jamais attendre.
+
+        Returns:
+            tuple: (True, 0.0) si le jeton est pris, sinon (False, délai
+                   en secondes avant le prochain jeton)
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return True, 0.0
+            return False, (1 - self._tokens) / self.rate
+
+    def acquire(self):
+        """
+        Attend qu'un jeton soit disponible.
+
+        Returns:
+            float: Temps passé à dormir (s)
+        """
+        delay = self.reserve()
+        if delay > 0:
+            time.sleep(delay)
+        return delay
+
+    def pause(self, seconds):
+        """
+        Suspend tous les envois pendant `seconds` (ex: Retry-After sur un 429),
+        puisque la limite du fournisseur est commune à tous les threads.
+        """
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+
+class RetryPolicy:
+    """
+    Politique de relance: backoff exponentiel plafonné avec "full jitter".
+
+    Args:
+        max_retries (int): Nombre maximal de relances après le premier essai
+        base_delay (float): Délai de base (s) du backoff
+        max_delay (float): Plafond (s) du backoff et du Retry-After
+    """
+
+    def __init__(self, max_retries=3, base_delay=0.5, max_delay=30.0):
+        self.max_retries = max(0, int(max_retries))
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def should_retry(self, attempt, status_code):
+        """Indique si l'essai numéro `attempt` (0 = premier) doit être relancé."""
+        if attempt >= self.max_retries:
+            return False
+        return status_code is None or status_code in RETRYABLE_STATUS
+
+    def compute_delay(self, attempt, retry_after=None):
+        """
+        Calcule le délai avant la relance suivante.
+
+        Args:
+            attempt (int): Numéro de l'essai qui vient d'échouer (0 = premier)
+            retry_after (float): Délai imposé par le serveur (s), si fourni
+
+        Returns:
+            float: Délai en secondes
+        """
+        if retry_after is not None:
+            # Le serveur impose un minimum; un peu de jitter évite que tous
+            # les threads repartent au même instant
+            return min(self.max_delay, retry_after) + random.uniform(0, self.base_delay)
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+
+class SendCounters:
+    """Compteurs thread-safe de la couche de limitation/relance."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.retries = 0
+        self.throttled_waits = 0
+        self.rate_limited = 0
+        self.sleep_time = 0.0
+
+    def add_throttle(self, seconds):
+        """Enregistre une attente imposée par le token bucket."""
+        if seconds > 0:
+            with self._lock:
+                self.throttled_waits += 1
+                self.sleep_time += seconds
+
+    def add_retry(self, status_code, seconds):
+        """Enregistre une relance et le temps de backoff associé."""
+        with self._lock:
+            self.retries += 1
+            self.sleep_time += seconds
+            if status_code == 429:
+                self.rate_limited += 1
+
+    def as_dict(self):
+        with self._lock:
+            return {
+                'retries': self.retries,
+                'throttled_waits': self.throttled_waits,
+                'rate_limited': self.rate_limited,
+                'sleep_time': round(self.sleep_time, 3)
+            }
+
+
+def parse_retry_after(value):
+    """
+    Convertit un en-tête Retry-After (secondes ou date HTTP) en secondes.
+
+    Returns:
+        float ou None si l'en-tête est absent ou invalide
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
@@ -0,0 +1,158 @@
+"""
+TP03 - Exercice 1.1: Points de reprise des campagnes d'envoi
+Module: Web Marketing & CRM
+
+Les adresses livrées sont enregistrées dans une base SQLite locale, par
+(campagne, email). Une relance après un arrêt brutal charge ces adresses en
+mémoire une seule fois (un SELECT) puis saute les destinataires déjà servis
+en O(1) par ligne. Les doublons d'un même fichier d'entrée sont aussi écartés.
+
+Un envoi dont le résultat est inconnu (délai de lecture dépassé: Brevo a pu
+l'accepter) est enregistré à part comme incertain et n'est pas renvoyé par
+une reprise; supprimer sa ligne de la table `uncertain` après vérification
+dans Brevo le remet dans la file.
+"""
+
+import sqlite3
+import threading
+from datetime import datetime
+
+# Nombre maximal de livraisons regroupées par transaction SQLite (les
+# appelants valident en plus après chaque appel API, via flush())
+COMMIT_EVERY = 100
+
+# Résultats de SendCheckpoint.check()
+DELIVERED = 'delivered'
+DUPLICATE = 'duplicate'
+UNCERTAIN = 'uncertain'
+
+
+def normalize_email(email):
+    """Clé de déduplication d'une adresse (espaces retirés, minuscules)."""
+    return email.strip().lower()
+
+
+class SendCheckpoint:
+    """
+    Registre durable des adresses déjà livrées pour une campagne.
+
+    Args:
+        path (str): Fichier SQLite
+        campaign_id (str): Identifiant de la campagne
+        commit_every (int): Livraisons au plus par transaction. send_campaign
+            appelle flush() dès qu'un appel API est enregistré: un arrêt
+            brutal ne fait renvoyer que le lot en cours d'enregistrement
+    """
+
+    def __init__(self, path, campaign_id, commit_every=COMMIT_EVERY):
+        self.path = path
+        self.campaign_id = campaign_id
+        self.commit_every = max(1, commit_every)
+        self._lock = threading.Lock()
+        self._pending = []
+
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS delivered (
+                campaign_id TEXT NOT NULL,
+                email TEXT NOT NULL,
+                message_id TEXT,
+                delivered_at TEXT NOT NULL,
+                PRIMARY KEY (campaign_id, email)
+            ) WITHOUT ROWID
+        """)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS uncertain (
+                campaign_id TEXT NOT NULL,
+                email TEXT NOT NULL,
+                error TEXT,
+                recorded_at TEXT NOT NULL,
+                PRIMARY KEY (campaign_id, email)
+            ) WITHOUT ROWID
+        """)
+        self._conn.commit()
+
+        cursor = self._conn.execute(
+            'SELECT email FROM delivered WHERE campaign_id = ?', (campaign_id,)
+        )
+        self._delivered = {row[0] for row in cursor}
+        cursor = self._conn.execute(
+            'SELECT email FROM uncertain WHERE campaign_id = ?', (campaign_id,)
+        )
+        self._uncertain = {row[0] for row in cursor}
+        self._seen = set()
+
+    @property
+    def delivered_count(self):
+        """Nombre d'adresses déjà livrées pour cette campagne."""
+        return len(self._delivered)
+
+    def check(self, email):
+        """
+        Indique si une adresse doit être envoyée, et la réserve si oui.
+
+        Returns:
+            None si l'email doit être envoyé, DELIVERED s'il l'a déjà été lors
+            d'une exécution précédente, UNCERTAIN si un envoi précédent a un
+            résultat inconnu, DUPLICATE s'il apparaît plusieurs fois dans
+            l'entrée courante
+        """
+        key = normalize_email(email)
+        if key in self._delivered:
+            return DELIVERED
+        if key in self._uncertain:
+            return UNCERTAIN
+        if key in self._seen:
+            return DUPLICATE
+        self._seen.add(key)
+        return None
+
+    def mark_delivered(self, email, message_id=None):
+        """Enregistre une livraison (écrite au plus tard au `commit_every`-ième ou au flush())."""
+        key = normalize_email(email)
+        with self._lock:
+            self._delivered.add(key)
+            self._pending.append((
+                self.campaign_id, key, message_id,
+                datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            ))
+            if len(self._pending) >= self.commit_every:
+                self._flush()
+
+    def mark_uncertain(self, email, error=None):
+        """Enregistre un envoi au résultat inconnu (écrit immédiatement, cas rare)."""
+        key = normalize_email(email)
+        with self._lock:
+            self._uncertain.add(key)
+            self._conn.execute(
+                'INSERT OR REPLACE INTO uncertain VALUES (?, ?, ?, ?)',
+                (self.campaign_id, key, error, datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+            )
+            self._conn.commit()
+
+    def _flush(self):
+        if self._pending:
+            self._conn.executemany(
+                'INSERT OR IGNORE INTO delivered VALUES (?, ?, ?, ?)', self._pending
+            )
+            self._conn.commit()
+            self._pending = []
+
+    def flush(self):
+        """Écrit immédiatement les livraisons en attente (fin d'un appel API)."""
+        with self._lock:
+            self._flush()
+
+    def close(self):
+        """Écrit les livraisons en attente et ferme la base."""
+        with self._lock:
+            self._flush()
+            self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
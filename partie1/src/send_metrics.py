@@ -0,0 +1,325 @@
+"""
+TP03 - Exercice 1.1: Instrumentation du pipeline d'envoi
+Module: Web Marketing & CRM
+
+Mesures collectées pendant une campagne:
+- temps passé par étape (construction du payload, appel API, log)
+- histogramme de latence type HDR (précision relative constante) par classe
+  de statut HTTP (2xx, 4xx, 5xx, erreur de connexion)
+- jauge des requêtes en cours, échantillonnée périodiquement
+
+Le MetricsReporter affiche une ligne de statistiques à intervalle régulier
+et peut écrire un fichier au format texte Prometheus (à sa propre cadence), pour voir si le goulot
+d'étranglement est le CPU, le réseau ou le log pendant une grosse campagne.
+"""
+
+import os
+import sys
+import threading
+import time
+
+# Étapes instrumentées
+STAGES = ('payload', 'send', 'log')
+
+# Classes de statut des histogrammes
+STATUS_CLASSES = ('2xx', '4xx', '5xx', 'error')
+
+# Période (s) de mise à jour du fichier Prometheus, indépendante de la
+# ligne de statistiques (désactivée par défaut)
+PROMETHEUS_INTERVAL = 5.0
+
+# Bornes (s) exportées pour les histogrammes Prometheus
+PROMETHEUS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def status_class(status_code):
+    """Classe d'un code de statut HTTP ('error' pour une erreur de connexion)."""
+    if status_code is None:
+        return 'error'
+    if 200 <= status_code < 300:
+        return '2xx'
+    if 400 <= status_code < 500:
+        return '4xx'
+    if status_code >= 500:
+        return '5xx'
+    return 'error'
+
+
+class LatencyHistogram:
+    """
+    Histogramme log-linéaire à la manière de HdrHistogram: chaque puissance
+    de 2 est découpée en 2**sub_bucket_bits sous-intervalles, soit une
+    erreur relative d'environ 1/2**sub_bucket_bits (3 % par défaut) sur toute
+    la plage, avec une mémoire fixe.
+
+    Les valeurs sont enregistrées en microsecondes.
+
+    Args:
+        sub_bucket_bits (int): Précision (bits de mantisse)
+        max_value_us (int): Valeur maximale (au-delà, elle est plafonnée)
+    """
+
+    def __init__(self, sub_bucket_bits=5, max_value_us=3_600_000_000):
+        self.sub_bucket_bits = sub_bucket_bits
+        self.sub_bucket_count = 1 << sub_bucket_bits
+        self.max_value_us = max_value_us
+        self.counts = [0] * (self._index(max_value_us) + 1)
+        self.total_count = 0
+        self.total_us = 0
+        self.min_us = None
+        self.max_us = 0
+        self._lock = threading.Lock()
+
+    def _index(self, value):
+        if value < self.sub_bucket_count:
+            return value
+        shift = value.bit_length() - 1 - self.sub_bucket_bits
+        return (shift + 1) * self.sub_bucket_count + (value >> shift) - self.sub_bucket_count
+
+    def _upper_bound(self, index):
+        """Plus grande valeur (µs) rangée dans l'intervalle `index`."""
+        if index < self.sub_bucket_count:
+            return index
+        shift = index // self.sub_bucket_count - 1
+        mantissa = index % self.sub_bucket_count + self.sub_bucket_count
+        return ((mantissa + 1) << shift) - 1
+
+    def record(self, seconds):
+        """Enregistre une latence exprimée en secondes."""
+        value = min(self.max_value_us, max(0, int(seconds * 1_000_000)))
+        index = self._index(value)
+        with self._lock:
+            self.counts[index] += 1
+            self.total_count += 1
+            self.total_us += value
+            if self.min_us is None or value < self.min_us:
+                self.min_us = value
+            if value > self.max_us:
+                self.max_us = value
+
+    def percentile(self, q):
+        """
+        Percentile `q` (0-100) en secondes (borne haute de l'intervalle,
+        plafonnée au maximum observé).
+        """
+        with self._lock:
+            if not self.total_count:
+                return 0.0
+            target = max(1, int(q / 100 * self.total_count + 0.5))
+            seen = 0
+            for index, count in enumerate(self.counts):
+                seen += count
+                if seen >= target:
+                    return min(self._upper_bound(index), self.max_us) / 1_000_000
+        return self.max_us / 1_000_000
+
+    def count_below(self, seconds):
+        """Nombre de valeurs <= `seconds` (à la précision de l'histogramme près)."""
+        limit = int(seconds * 1_000_000)
+        with self._lock:
+            return sum(
+                count for index, count in enumerate(self.counts)
+                if count and self._upper_bound(index) <= limit
+            )
+
+    def summary(self):
+        """Résumé (ms) de l'histogramme: count, mean, min, p50, p95, p99, max."""
+        mean = self.total_us / self.total_count / 1000 if self.total_count else 0.0
+        return {
+            'count': self.total_count,
+            'mean_ms': round(mean, 3),
+            'min_ms': round((self.min_us or 0) / 1000, 3),
+            'p50_ms': round(self.percentile(50) * 1000, 3),
+            'p95_ms': round(self.percentile(95) * 1000, 3),
+            'p99_ms': round(self.percentile(99) * 1000, 3),
+            'max_ms': round(self.max_us / 1000, 3)
+        }
+
+
+class SendMetrics:
+    """
+    Métriques d'une campagne, alimentées depuis les threads d'envoi et le
+    thread principal.
+
+    Attributes:
+        call_latency (LatencyHistogram): Latence des appels API de
+            deliver_batch, hors construction du payload (relances et
+            attentes du limiteur comprises)
+        http_latency (dict): Un histogramme par classe de statut, par requête HTTP
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started = time.monotonic()
+        self.stage_seconds = dict.fromkeys(STAGES, 0.0)
+        self.stage_calls = dict.fromkeys(STAGES, 0)
+        self.call_latency = LatencyHistogram()
+        self.http_latency = {cls: LatencyHistogram() for cls in STATUS_CLASSES}
+        self.processed = 0
+        self.in_flight = 0
+        self.in_flight_max = 0
+        self._in_flight_samples = 0
+        self._in_flight_sum = 0
+
+    def add_stage(self, stage, seconds):
+        """Ajoute le temps passé dans une étape."""
+        with self._lock:
+            self.stage_seconds[stage] += seconds
+            self.stage_calls[stage] += 1
+
+    def request_started(self):
+        with self._lock:
+            self.in_flight += 1
+            if self.in_flight > self.in_flight_max:
+                self.in_flight_max = self.in_flight
+
+    def request_finished(self, status_code, seconds):
+        """Enregistre la fin d'une requête HTTP et sa latence."""
+        with self._lock:
+            self.in_flight -= 1
+        self.http_latency[status_class(status_code)].record(seconds)
+
+    def add_processed(self, count=1):
+        with self._lock:
+            self.processed += count
+
+    def sample_in_flight(self):
+        """Échantillonne la jauge des requêtes en cours."""
+        with self._lock:
+            self._in_flight_samples += 1
+            self._in_flight_sum += self.in_flight
+            return self.in_flight
+
+    def stats_line(self):
+        """Ligne de statistiques courante (pour l'affichage périodique)."""
+        elapsed = max(1e-9, time.monotonic() - self.started)
+        calls = self.call_latency
+        stages = ' '.join(
+            f"{stage}={self.stage_seconds[stage] / self.stage_calls[stage] * 1000:.2f}ms"
+            if self.stage_calls[stage] else f"{stage}=-"
+            for stage in STAGES
+        )
+        return (f"[stats] traités={self.processed} débit={self.processed / elapsed:.1f}/s "
+                f"en_cours={self.in_flight} p50={calls.percentile(50) * 1000:.1f}ms "
+                f"p99={calls.percentile(99) * 1000:.1f}ms | {stages}")
+
+    def summary(self):
+        """Résumé sérialisable en JSON de toutes les mesures."""
+        with self._lock:
+            in_flight_avg = (self._in_flight_sum / self._in_flight_samples
+                             if self._in_flight_samples else 0.0)
+            stages = {
+                stage: {
+                    'calls': self.stage_calls[stage],
+                    'total_s': round(self.stage_seconds[stage], 3),
+                    'mean_ms': round(self.stage_seconds[stage] / self.stage_calls[stage] * 1000, 3)
+                    if self.stage_calls[stage] else 0.0
+                }
+                for stage in STAGES
+            }
+        return {
+            'stages': stages,
+            'api_calls': self.call_latency.summary(),
+            'http_status_classes': {
+                cls: hist.summary() for cls, hist in self.http_latency.items() if hist.total_count
+            },
+            'in_flight_max': self.in_flight_max,
+            'in_flight_avg': round(in_flight_avg, 2)
+        }
+
+    def to_prometheus(self):
+        """Exporte les métriques au format texte Prometheus."""
+        lines = [
+            '# HELP email_processed_total Destinataires traités',
+            '# TYPE email_processed_total counter',
+            f'email_processed_total {self.processed}',
+            '# HELP email_in_flight Requêtes HTTP en cours',
+            '# TYPE email_in_flight gauge',
+            f'email_in_flight {self.in_flight}',
+            '# HELP email_stage_seconds_total Temps passé par étape',
+            '# TYPE email_stage_seconds_total counter',
+        ]
+        lines += [f'email_stage_seconds_total{{stage="{stage}"}} {self.stage_seconds[stage]:.6f}'
+                  for stage in STAGES]
+        lines += [
+            '# HELP email_stage_calls_total Appels par étape',
+            '# TYPE email_stage_calls_total counter',
+        ]
+        lines += [f'email_stage_calls_total{{stage="{stage}"}} {self.stage_calls[stage]}'
+                  for stage in STAGES]
+        lines += [
+            '# HELP email_http_request_seconds Latence des requêtes HTTP par classe de statut',
+            '# TYPE email_http_request_seconds histogram',
+        ]
+        for cls, hist in self.http_latency.items():
+            for bound in PROMETHEUS_BUCKETS:
+                lines.append(f'email_http_request_seconds_bucket{{status_class="{cls}",le="{bound}"}} '
+                             f'{hist.count_below(bound)}')
+            lines.append(f'email_http_request_seconds_bucket{{status_class="{cls}",le="+Inf"}} '
+                         f'{hist.total_count}')
+            lines.append(f'email_http_request_seconds_sum{{status_class="{cls}"}} '
+                         f'{hist.total_us / 1_000_000:.6f}')
+            lines.append(f'email_http_request_seconds_count{{status_class="{cls}"}} {hist.total_count}')
+        return '\n'.join(lines) + '\n'
+
+
+class MetricsReporter:
+    """
+    Thread qui échantillonne la jauge en cours, affiche une ligne de
+    statistiques toutes les `interval` secondes et met à jour le fichier
+    Prometheus (écriture atomique) toutes les `prometheus_interval` secondes,
+    même sans ligne périodique.
+
+    Args:
+        metrics (SendMetrics): Métriques à publier
+        interval (float): Période d'affichage (s), 0 = pas de ligne périodique
+        prometheus_file (str): Fichier texte Prometheus (optionnel)
+        stream: Flux de sortie des lignes de statistiques
+        sample_interval (float): Période d'échantillonnage de la jauge (s)
+        prometheus_interval (float): Période d'écriture du fichier Prometheus (s)
+    """
+
+    def __init__(self, metrics, interval=10.0, prometheus_file=None, stream=sys.stderr,
+                 sample_interval=0.1, prometheus_interval=PROMETHEUS_INTERVAL):
+        self.metrics = metrics
+        self.interval = interval
+        self.prometheus_file = prometheus_file
+        self.prometheus_interval = prometheus_interval
+        self.stream = stream
+        self.sample_interval = sample_interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='send-metrics', daemon=True)
+
+    def _run(self):
+        last_report = last_export = time.monotonic()
+        while not self._stop.wait(self.sample_interval):
+            self.metrics.sample_in_flight()
+            now = time.monotonic()
+            if self.interval and now - last_report >= self.interval:
+                self.report()
+                last_report = now
+            if self.prometheus_file and now - last_export >= self.prometheus_interval:
+                self.write_prometheus()
+                last_export = now
+
+    def report(self):
+        """Affiche la ligne de statistiques."""
+        if self.interval:
+            print(self.metrics.stats_line(), file=self.stream, flush=True)
+
+    def write_prometheus(self):
+        if not self.prometheus_file:
+            return
+        tmp_file = f'{self.prometheus_file}.tmp'
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            f.write(self.metrics.to_prometheus())
+        os.replace(tmp_file, self.prometheus_file)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._stop.set()
+        self._thread.join()
+        self.write_prometheus()
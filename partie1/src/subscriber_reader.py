@@ -0,0 +1,249 @@
+"""
+TP03 - Exercice 1.1: Lecture en flux et validation des inscrits
+Module: Web Marketing & CRM
+
+Pipeline de lecture pour les gros fichiers d'inscrits:
+- un thread lit le CSV par blocs de `chunk_size` lignes
+- un thread valide et normalise chaque bloc (syntaxe email, date
+  d'inscription) et écrit les lignes rejetées dans un fichier de rejets
+- les lignes valides sont transmises à l'étape d'envoi par une file bornée
+
+Lecture, validation et envoi se chevauchent, et la mémoire reste constante
+quelle que soit la taille du fichier (au plus `queue_size` blocs en vol).
+"""
+
+import csv
+import queue
+import re
+import threading
+from datetime import datetime
+
+# Colonnes attendues dans le fichier d'inscrits
+REQUIRED_COLUMNS = ('email', 'prenom', 'date_inscription')
+
+# Syntaxe email volontairement simple (partie locale @ domaine avec un point)
+EMAIL_PATTERN = re.compile(r"^[A-Za-z0-9.!#$%&'*+/=?^_`{|}~-]+@[A-Za-z0-9-]+(\.[A-Za-z0-9-]+)+$")
+
+# Formats de date acceptés, normalisés en AAAA-MM-JJ
+DATE_FORMATS = ('%Y-%m-%d', '%d/%m/%Y', '%Y/%m/%d', '%d-%m-%Y')
+
+CHUNK_SIZE = 5000
+QUEUE_SIZE = 4
+
+# Marqueur de fin de flux
+_END = object()
+
+
+class MissingColumnsError(KeyError):
+    """Le fichier d'inscrits ne contient pas les colonnes attendues."""
+
+
+def normalize_date(value):
+    """
+    Normalise une date d'inscription au format AAAA-MM-JJ.
+
+    Returns:
+        str ou None si la date est invalide
+    """
+    value = value.strip()
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(value, fmt).strftime('%Y-%m-%d')
+        except ValueError:
+            continue
+    return None
+
+
+def validate_chunk(rows):
+    """
+    Valide et normalise un bloc de lignes.
+
+    Args:
+        rows (list): Lignes (dict) issues de csv.DictReader
+
+    Returns:
+        tuple: (lignes valides, lignes rejetées avec leur motif)
+    """
+    valid = []
+    rejected = []
+    match_email = EMAIL_PATTERN.match
+    # Les dates se répètent beaucoup (une par jour d'inscription): on ne les
+    # analyse qu'une fois par bloc
+    dates = {}
+
+    for row in rows:
+        email = (row.get('email') or '').strip().lower()
+        prenom = (row.get('prenom') or '').strip()
+        raw_date = row.get('date_inscription') or ''
+
+        if not match_email(email):
+            rejected.append((row, 'email invalide'))
+            continue
+        if not prenom:
+            rejected.append((row, 'prénom manquant'))
+            continue
+
+        date_inscription = dates.get(raw_date)
+        if date_inscription is None:
+            date_inscription = dates[raw_date] = normalize_date(raw_date) or ''
+        if not date_inscription:
+            rejected.append((row, 'date_inscription invalide'))
+            continue
+
+        valid.append({'email': email, 'prenom': prenom, 'date_inscription': date_inscription})
+
+    return valid, rejected
+
+
+class SubscriberStream:
+    """
+    Itérateur sur les inscrits valides d'un fichier CSV, alimenté par les
+    threads de lecture et de validation.
+
+    Les threads ne démarrent qu'au début de l'itération; close() (ou la
+    sortie d'un bloc with) les arrête, que le flux ait été consommé ou non.
+
+    Args:
+        csv_file (str): Fichier d'inscrits
+        reject_file (str): Fichier CSV des lignes rejetées (None = pas d'écriture)
+        chunk_size (int): Lignes par bloc
+        queue_size (int): Blocs au plus en attente entre deux étapes
+
+    Attributes:
+        read_count (int): Lignes lues
+        rejected_count (int): Lignes rejetées
+    """
+
+    def __init__(self, csv_file, reject_file=None, chunk_size=CHUNK_SIZE, queue_size=QUEUE_SIZE):
+        self.csv_file = csv_file
+        self.reject_file = reject_file
+        self.chunk_size = max(1, chunk_size)
+        self.read_count = 0
+        self.rejected_count = 0
+
+        # Vérification des colonnes avant de lancer les threads, pour que
+        # l'erreur remonte immédiatement à l'appelant
+        with open(csv_file, 'r', encoding='utf-8', newline='') as f:
+            header = next(csv.reader(f), [])
+        missing = [col for col in REQUIRED_COLUMNS if col not in header]
+        if missing:
+            raise MissingColumnsError(', '.join(missing))
+        self.fieldnames = header
+
+        self._raw_chunks = queue.Queue(maxsize=queue_size)
+        self._valid_chunks = queue.Queue(maxsize=queue_size)
+        self._stop = threading.Event()
+        self._error = None
+        self._threads = []
+        self._lock = threading.Lock()
+
+    def _start(self):
+        # Démarrage paresseux: un flux jamais itéré ne laisse aucun thread bloqué
+        with self._lock:
+            if self._threads or self._stop.is_set():
+                return
+            self._threads = [
+                threading.Thread(target=self._read, name='subscriber-reader', daemon=True),
+                threading.Thread(target=self._validate, name='subscriber-validator', daemon=True),
+            ]
+            for thread in self._threads:
+                thread.start()
+
+    def _put(self, target, item):
+        # put() interruptible si le consommateur abandonne le flux
+        while not self._stop.is_set():
+            try:
+                target.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _get(self, source):
+        # get() interruptible: renvoie _END si le flux est abandonné
+        while not self._stop.is_set():
+            try:
+                return source.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        return _END
+
+    def _read(self):
+        try:
+            with open(self.csv_file, 'r', encoding='utf-8', newline='') as f:
+                reader = csv.DictReader(f)
+                chunk = []
+                for row in reader:
+                    chunk.append(row)
+                    if len(chunk) >= self.chunk_size:
+                        self.read_count += len(chunk)
+                        if not self._put(self._raw_chunks, chunk):
+                            return
+                        chunk = []
+                if chunk:
+                    self.read_count += len(chunk)
+                    self._put(self._raw_chunks, chunk)
+        except Exception as e:
+            self._error = e
+        finally:
+            self._put(self._raw_chunks, _END)
+
+    def _validate(self):
+        reject_handle = None
+        try:
+            if self.reject_file:
+                reject_handle = open(self.reject_file, 'w', encoding='utf-8', newline='')
+                reject_writer = csv.writer(reject_handle)
+                reject_writer.writerow(list(self.fieldnames) + ['motif_rejet'])
+
+            while True:
+                chunk = self._get(self._raw_chunks)
+                if chunk is _END:
+                    break
+                valid, rejected = validate_chunk(chunk)
+                if rejected:
+                    self.rejected_count += len(rejected)
+                    if reject_handle is not None:
+                        reject_writer.writerows(
+                            [row.get(col, '') for col in self.fieldnames] + [reason]
+                            for row, reason in rejected
+                        )
+                if valid and not self._put(self._valid_chunks, valid):
+                    return
+        except Exception as e:
+            self._error = e
+        finally:
+            if reject_handle is not None:
+                reject_handle.close()
+            self._put(self._valid_chunks, _END)
+
+    def __iter__(self):
+        self._start()
+        try:
+            while True:
+                chunk = self._get(self._valid_chunks)
+                if chunk is _END:
+                    break
+                yield from chunk
+        finally:
+            self.close()
+        if self._error is not None:
+            raise self._error
+
+    def close(self):
+        """
+        Arrête les threads (ex: si l'envoi s'interrompt avant la fin du
+        fichier). Sans effet si déjà appelée ou si le flux n'a jamais démarré.
+        """
+        with self._lock:
+            self._stop.set()
+            threads = self._threads
+        for thread in threads:
+            if thread is not threading.current_thread():
+                thread.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,89 @@
+"""
+TP03 - Partie 2: Micro-benchmark de l'encodage des features
+Auteur: - Soukaina El Hadifi
+        - Mohamed-Saber El guelta
+
+Compare, sur N lignes user_behavior (1 000 000 par défaut):
+- le chemin du notebook: pd.get_dummies(drop_first=True) puis
+  StandardScaler.transform sur les colonnes numériques
+- FeatureEncoder.transform dans une matrice préallouée, avec et sans
+  standardisation
+
+et vérifie que les matrices obtenues sont identiques. Les colonnes
+catégorielles sont passées en chaînes, comme après pd.read_csv.
+
+Usage:
+    python bench_encoder.py [--rows 1000000] [--repeat 3] [--seed 42]
+"""
+
+import argparse
+import pickle
+import time
+
+import numpy as np
+import pandas as pd
+
+from feature_encoder import CATEGORICAL_COLUMNS, ENCODER_PATH, SCALER_PATH, FeatureEncoder
+from generate_ml_data import chunk_rng, generate_chunk
+
+
+def best_time(func, repeat):
+    """Meilleur temps sur `repeat` exécutions, et dernier résultat."""
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de l'encodage des features")
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--encoder', default=ENCODER_PATH)
+    parser.add_argument('--scaler', default=SCALER_PATH)
+    args = parser.parse_args()
+
+    df = generate_chunk(chunk_rng(args.seed, 0), args.rows)
+    df = df.astype({column: str for column in CATEGORICAL_COLUMNS})
+    X = df.drop(columns=['user_id', 'converted'])
+    encoder = FeatureEncoder.load(args.encoder)
+    with open(args.scaler, 'rb') as f:
+        scaler = pickle.load(f)
+    numeric_cols = list(scaler.feature_names_in_)
+
+    def notebook_path(scale):
+        encoded = pd.get_dummies(X, columns=CATEGORICAL_COLUMNS, drop_first=True)
+        if scale:
+            encoded[numeric_cols] = scaler.transform(encoded[numeric_cols])
+        return encoded
+
+    buffer = np.empty((len(df), len(encoder.feature_names)), dtype=np.float64, order='F')
+
+    print("=" * 70)
+    print(f"BENCHMARK ENCODAGE - {args.rows:,} lignes (meilleur de {args.repeat})")
+    print("=" * 70)
+
+    identical = True
+    for scale in (False, True):
+        label = 'avec standardisation' if scale else 'sans standardisation'
+        reference_time, reference = best_time(lambda: notebook_path(scale), args.repeat)
+        encoder_time, encoded = best_time(lambda: encoder.transform(df, scale=scale, out=buffer),
+                                          args.repeat)
+        same = (list(reference.columns) == encoder.feature_names
+                and np.array_equal(reference.to_numpy(np.float64), encoded))
+        identical = identical and same
+        print(f"\n{label}:")
+        print(f"  {'get_dummies' + (' + StandardScaler' if scale else ''):<38} {reference_time:>8.3f}s "
+              f"{args.rows / reference_time:>14,.0f} lignes/s")
+        print(f"  {'FeatureEncoder.transform (préalloué)':<38} {encoder_time:>8.3f}s "
+              f"{args.rows / encoder_time:>14,.0f} lignes/s")
+        print(f"  Gain: x{reference_time / encoder_time:.1f} - matrices identiques: {'oui' if same else 'NON'}")
+    return 0 if identical else 1
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
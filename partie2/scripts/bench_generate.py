@@ -0,0 +1,102 @@
+"""
+TP03 - Partie 2: Benchmark de passage à l'échelle de la génération du dataset ML
+Auteur: - Soukaina El Hadifi
+        - Mohamed-Saber El guelta
+
+Génère le même dataset partitionné (write_sharded_dataset) avec 1, 2, 4 et
+N processus (N = nombre de coeurs), mesure le débit (lignes/s), l'accélération
+et l'efficacité par rapport à 1 processus, et vérifie que les parts produites
+(SHA-256 du manifest) sont identiques quel que soit le nombre de workers.
+
+Usage:
+    python bench_generate.py [--rows 4000000] [--shards 16] [--workers 1,2,4,8]
+    python bench_generate.py --output bench_generate.json
+"""
+
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import time
+
+from generate_ml_data import CHUNK_SIZE, SEED, write_sharded_dataset
+
+
+def default_workers():
+    """1, 2, 4 puis le nombre de coeurs (sans doublon)."""
+    cores = os.cpu_count() or 1
+    return sorted({1, 2, 4, cores})
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de la génération partitionnée")
+    parser.add_argument('--rows', type=int, default=4_000_000)
+    parser.add_argument('--shards', type=int, default=16)
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+    parser.add_argument('--seed', type=int, default=SEED)
+    parser.add_argument('--workers', default=None,
+                        help="Nombres de processus, séparés par des virgules (défaut: 1,2,4,N)")
+    parser.add_argument('--output', default=None, help="Fichier JSON des résultats")
+    args = parser.parse_args()
+
+    worker_counts = ([int(n) for n in args.workers.split(',') if n.strip()]
+                     if args.workers else default_workers())
+
+    print("=" * 70)
+    print(f"BENCHMARK GÉNÉRATION - {args.rows:,} lignes, {args.shards} parts, "
+          f"{os.cpu_count()} coeurs")
+    print("=" * 70)
+    print(f"{'Workers':>7} {'Durée':>9} {'Lignes/s':>12} {'Accél.':>8} {'Effic.':>8}")
+
+    results = []
+    reference_parts = None
+    identical = True
+    work_dir = tempfile.mkdtemp(prefix='bench_generate_')
+    try:
+        for workers in worker_counts:
+            output_dir = os.path.join(work_dir, f'w{workers}')
+            start = time.perf_counter()
+            manifest = write_sharded_dataset(output_dir, args.rows, args.shards, workers,
+                                             args.chunk_size, args.seed)
+            duration = time.perf_counter() - start
+            # Libère le disque avant la mesure suivante
+            shutil.rmtree(output_dir)
+
+            parts = [part['sha256'] for part in manifest['parts']]
+            if reference_parts is None:
+                reference_parts = parts
+            identical = identical and parts == reference_parts
+
+            throughput = args.rows / duration
+            speedup = throughput / results[0]['throughput'] if results else 1.0
+            results.append({
+                'workers': workers,
+                'duration_s': round(duration, 3),
+                'throughput': round(throughput, 1),
+                'speedup': round(speedup, 2),
+                'efficiency': round(speedup / workers, 2)
+            })
+            print(f"{workers:>7} {duration:>8.2f}s {throughput:>12,.0f} x{speedup:>6.2f} "
+                  f"{speedup / workers * 100:>7.0f}%")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    print(f"\nParts identiques pour tous les nombres de workers: {'oui' if identical else 'NON'}")
+
+    if args.output:
+        report = {
+            'timestamp': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'cpu_count': os.cpu_count(),
+            'config': {key: value for key, value in vars(args).items() if key != 'output'},
+            'results': results,
+            'identical': identical
+        }
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"Résultats enregistrés: {args.output}")
+    return 0 if identical else 1
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
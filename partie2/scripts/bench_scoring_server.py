@@ -0,0 +1,204 @@
+"""
+TP03 - Partie 2: Test de charge du serveur de scoring
+Auteur: - Soukaina El Hadifi
+        - Mohamed-Saber El guelta
+
+Lance scoring_server.py dans un processus séparé (sauf --url), puis envoie
+des visiteurs tirés de user_behavior.csv depuis plusieurs threads clients
+(connexions keep-alive) et mesure latences (p50/p95/p99/max) et requêtes/s,
+ainsi que la taille moyenne des micro-lots et le taux de succès du cache
+côté serveur.
+
+--distinct fixe le nombre de visiteurs différents envoyés en boucle (0 =
+chaque requête est unique, donc jamais servie par le cache).
+
+Usage:
+    python bench_scoring_server.py --requests 20000 --concurrency 32
+    python bench_scoring_server.py --distinct 0 --max-wait-ms 5 --output bench_scoring.json
+"""
+
+import argparse
+import itertools
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+import requests
+
+from scoring_server import CACHE_SIZE, MAX_BATCH, MAX_WAIT_MS
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_PATH = os.path.join(SCRIPT_DIR, '..', 'data', 'user_behavior.csv')
+
+
+def start_server_process(args):
+    """
+    Démarre le serveur de scoring dans un sous-processus (pour qu'il ne
+    partage pas le GIL avec les clients mesurés).
+
+    Returns:
+        tuple: (subprocess.Popen, URL du serveur)
+    """
+    command = [
+        sys.executable, os.path.join(SCRIPT_DIR, 'scoring_server.py'),
+        '--port', '0',
+        '--max-batch', str(args.max_batch),
+        '--max-wait-ms', str(args.max_wait_ms),
+        '--cache-size', str(args.cache_size)
+    ]
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, text=True)
+    ready_line = process.stdout.readline().strip()
+    if not ready_line:
+        process.kill()
+        raise RuntimeError("Le serveur de scoring n'a pas démarré")
+    return process, ready_line.rsplit(' ', 1)[-1]
+
+
+def build_payloads(path, requests_count, distinct, seed):
+    """
+    Corps JSON des requêtes.
+
+    Args:
+        path: CSV user_behavior source
+        requests_count: Nombre de requêtes
+        distinct: Visiteurs différents envoyés en boucle (0 = tous uniques)
+        seed: Graine du tirage
+    """
+    visitors = pd.read_csv(path).drop(columns=['converted'], errors='ignore').to_dict('records')
+    rng = np.random.default_rng(seed)
+    if distinct > 0:
+        pool = [visitors[i] for i in rng.integers(0, len(visitors), min(distinct, len(visitors)))]
+        chosen = [pool[i] for i in rng.integers(0, len(pool), requests_count)]
+    else:
+        chosen = []
+        for i, index in enumerate(rng.integers(0, len(visitors), requests_count)):
+            visitor = dict(visitors[index])
+            # Décalage infime et unique: vecteur différent, donc jamais en cache
+            visitor['time_on_site'] = visitor['time_on_site'] + (i + 1) * 1e-6
+            chosen.append(visitor)
+    return [json.dumps(visitor).encode('utf-8') for visitor in chosen]
+
+
+def run_load(url, payloads, concurrency):
+    """
+    Envoie toutes les requêtes depuis `concurrency` threads.
+
+    Returns:
+        tuple: (latences en secondes, erreurs, durée totale)
+    """
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    next_index = itertools.count()
+
+    def client():
+        session = requests.Session()
+        local = []
+        local_errors = 0
+        while True:
+            index = next(next_index)
+            if index >= len(payloads):
+                break
+            start = time.perf_counter()
+            try:
+                response = session.post(url + '/score', data=payloads[index],
+                                        headers={'Content-Type': 'application/json'}, timeout=30)
+                ok = response.status_code == 200
+            except requests.RequestException:
+                ok = False
+            local.append(time.perf_counter() - start)
+            if not ok:
+                local_errors += 1
+        with lock:
+            latencies.extend(local)
+            errors[0] += local_errors
+
+    threads = [threading.Thread(target=client, daemon=True) for _ in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return np.array(latencies), errors[0], time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Test de charge du serveur de scoring")
+    parser.add_argument('--requests', type=int, default=10_000)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--distinct', type=int, default=1000,
+                        help="Visiteurs différents envoyés en boucle (0 = requêtes toutes uniques)")
+    parser.add_argument('--data', default=DATA_PATH, help="CSV user_behavior source")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--url', default=None,
+                        help="Serveur déjà démarré (sinon scoring_server.py est lancé)")
+    parser.add_argument('--max-batch', type=int, default=MAX_BATCH)
+    parser.add_argument('--max-wait-ms', type=float, default=MAX_WAIT_MS)
+    parser.add_argument('--cache-size', type=int, default=CACHE_SIZE)
+    parser.add_argument('--output', default=None, help="Fichier JSON des résultats")
+    args = parser.parse_args()
+
+    payloads = build_payloads(args.data, args.requests, args.distinct, args.seed)
+    server_process = None
+    url = args.url
+    if url is None:
+        server_process, url = start_server_process(args)
+
+    try:
+        # Échauffement hors mesure (connexions, premiers lots)
+        run_load(url, payloads[:args.concurrency * 4], args.concurrency)
+        requests.post(url + '/stats/reset', timeout=5)
+        latencies, errors, duration = run_load(url, payloads, args.concurrency)
+        server_stats = requests.get(url + '/stats', timeout=5).json()
+    finally:
+        if server_process is not None:
+            server_process.terminate()
+            server_process.wait()
+
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) * 1000
+    result = {
+        'requests': len(latencies),
+        'errors': errors,
+        'duration_s': round(duration, 3),
+        'throughput': round(len(latencies) / duration, 1),
+        'latency_p50_ms': round(p50, 3),
+        'latency_p95_ms': round(p95, 3),
+        'latency_p99_ms': round(p99, 3),
+        'latency_max_ms': round(latencies.max() * 1000, 3),
+        'server': server_stats
+    }
+
+    print("=" * 70)
+    print("TEST DE CHARGE - SERVEUR DE SCORING")
+    print("=" * 70)
+    print(f"Serveur: {url} - concurrence: {args.concurrency} - visiteurs distincts: "
+          f"{args.distinct or 'tous'}")
+    print(f"Requêtes: {result['requests']:,} ({errors} en erreur) en {duration:.2f}s "
+          f"-> {result['throughput']:,.0f} requêtes/s")
+    print(f"Latence: p50 {p50:.2f} ms - p95 {p95:.2f} ms - p99 {p99:.2f} ms - "
+          f"max {result['latency_max_ms']:.2f} ms")
+    batcher = server_stats['batcher']
+    cache = server_stats['cache']
+    print(f"Micro-lots: {batcher['batches']:,} lots, {batcher['avg_batch']:.1f} lignes en moyenne "
+          f"(max {batcher['largest_batch']}), predict {batcher['avg_predict_ms']:.2f} ms/lot")
+    print(f"Cache: {cache['hit_rate'] * 100:.1f}% de succès ({cache['entries']:,} entrées)")
+
+    if args.output:
+        report = {
+            'timestamp': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'config': {key: value for key, value in vars(args).items() if key != 'output'},
+            'result': result
+        }
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"\nRésultats enregistrés: {args.output}")
+    return 1 if errors else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
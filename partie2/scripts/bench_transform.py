@@ -0,0 +1,100 @@
+"""
+TP03 - Partie 2: Micro-benchmark de la transformation ETL
+Auteur: - Soukaina El Hadifi 
+        - Mohamed-Saber El guelta
+
+Compare, sur N enregistrements bruts (1 000 000 par défaut):
+- transform_data appelé ligne par ligne (un dict à la fois)
+- transform_batch sur un bloc en colonnes (pandas / NumPy), seul puis
+  suivi de frame_rows (tuples envoyés au chargement) ou frame_to_records
+
+et vérifie que les deux donnent exactement les mêmes enregistrements
+(jours sans visite et conversions > visites compris), y compris pour un
+bloc dont aucun jour n'a de visite.
+
+Usage:
+    python bench_transform.py [--rows 1000000] [--seed 42]
+"""
+
+import argparse
+import logging
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+from etl_pipeline import frame_rows, frame_to_records, logger, raw_frame, transform_batch, transform_data
+
+
+def generate_raw(rows, seed):
+    """Génère un bloc de données brutes Matomo (une ligne par jour)."""
+    rng = np.random.default_rng(seed)
+    visits = rng.integers(0, 5000, rows)
+    # ~2 % de jours sans visite, et quelques conversions > visites
+    visits[rng.random(rows) < 0.02] = 0
+    return pd.DataFrame({
+        'nb_visits': visits,
+        'nb_visits_converted': rng.integers(0, 600, rows),
+        'nb_actions': rng.integers(0, 15000, rows),
+        'bounce_count': rng.integers(0, 1000, rows),
+        'sum_visit_length': rng.integers(0, 200000, rows)
+    })
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de la transformation ETL")
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    # Les logs par enregistrement fausseraient la mesure
+    logger.setLevel(logging.ERROR)
+
+    raw = generate_raw(args.rows, args.seed)
+    start_day = datetime(2020, 1, 1)
+    dates = [start_day + timedelta(hours=i) for i in range(args.rows)]
+    raw_dicts = raw.to_dict('records')
+
+    print("=" * 70)
+    print(f"BENCHMARK TRANSFORMATION - {args.rows:,} enregistrements")
+    print("=" * 70)
+
+    start = time.perf_counter()
+    scalar = [transform_data(row, date=day, site_id=1) for row, day in zip(raw_dicts, dates)]
+    scalar_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    batch = transform_batch(raw, dates=dates, site_id=1)
+    batch_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    rows = list(frame_rows(batch))
+    rows_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    records = frame_to_records(batch)
+    records_time = time.perf_counter() - start
+
+    identical = records == scalar and len(rows) == len(scalar)
+
+    # Bloc où Matomo n'a renvoyé que des jours vides ([] -> {})
+    empty_days = dates[:3]
+    empty_batch = frame_to_records(transform_batch(raw_frame([{}] * len(empty_days)),
+                                                   dates=empty_days, site_id=1))
+    empty_identical = empty_batch == [transform_data({}, date=day, site_id=1) for day in empty_days]
+    identical = identical and empty_identical
+    print(f"{'transform_data (par ligne)':<34} {scalar_time:>8.3f}s {args.rows / scalar_time:>14,.0f} lignes/s")
+    print(f"{'transform_batch':<34} {batch_time:>8.3f}s {args.rows / batch_time:>14,.0f} lignes/s")
+    for label, extra_time in (('transform_batch + frame_rows', rows_time),
+                              ('transform_batch + frame_to_records', records_time)):
+        print(f"{label:<34} {batch_time + extra_time:>8.3f}s "
+              f"{args.rows / (batch_time + extra_time):>14,.0f} lignes/s")
+    print(f"\nGain (transform seul): x{scalar_time / batch_time:.1f}")
+    print(f"Résultats identiques: {'oui' if identical else 'NON'} "
+          f"(bloc sans visite: {'oui' if empty_identical else 'NON'})")
+    return 0 if identical else 1
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,434 @@
+"""
+TP03 - Partie 2: Format compact du Random Forest de conversion
+Auteur: - Soukaina El Hadifi
+        - Mohamed-Saber El guelta
+
+Exporte rf_conversion_model.pkl (RandomForestClassifier sklearn) vers un
+fichier unique projetable en mémoire (.forest), et le score en NumPy pur:
+- les arbres sont aplatis en tableaux concaténés (variable testée, seuil,
+  fils gauche/droit, probabilités des feuilles déjà normalisées), précédés
+  d'un en-tête JSON (ordre des features, classes, paramètres du scaler)
+- chargement par np.memmap: pas de pickle (rien n'est exécuté à la lecture,
+  fichier validé: bornes des indices et des variables), quasi instantané, et
+  les processus workers partagent la même copie en cache de pages
+- prédiction par lots: les lignes descendent les arbres en max_depth étapes
+  vectorisées (les feuilles bouclent sur elles-mêmes), tous les arbres
+  ensemble pour les petits lots, arbre par arbre pour les gros; même
+  comparaison x <= seuil (exacte en float32) et même accumulation arbre par
+  arbre que sklearn
+- valeurs manquantes (NaN): chaque noeud garde le sens choisi par sklearn
+  (missing_go_to_left); les lignes concernées sont parcourues à part, le
+  chemin sans NaN reste inchangé
+
+Format: MAGIC (8 octets) | longueur de l'en-tête (uint64 LE) | en-tête JSON |
+tableaux bruts, chacun aligné sur 64 octets (offsets dans l'en-tête).
+
+Usage:
+    python compact_forest.py --check ../data/user_behavior.csv
+    python compact_forest.py --model ../data/rf_conversion_model.pkl --output ../data/rf_conversion_model.forest
+"""
+
+import argparse
+import json
+import os
+import pickle
+import struct
+import time
+
+import numpy as np
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.path.join(SCRIPT_DIR, '..', 'data')
+MODEL_PATH = os.path.join(DATA_DIR, 'rf_conversion_model.pkl')
+SCALER_PATH = os.path.join(DATA_DIR, 'scaler.pkl')
+FOREST_PATH = os.path.join(DATA_DIR, 'rf_conversion_model.forest')
+
+MAGIC = b'RFNPY\x00\x00\x01'
+FORMAT_VERSION = 2
+ALIGNMENT = 64
+# Lignes par lot de prédiction (borne les tampons intermédiaires)
+BATCH_ROWS = 8192
+# Jusqu'à ce nombre de lignes, tous les arbres sont parcourus ensemble (peu
+# d'appels NumPy: petits lots du serveur); au-delà, arbre par arbre
+ALL_TREES_MAX_ROWS = 2048
+# Écart maximal toléré avec predict_proba de sklearn (vérification --check)
+TOLERANCE = 1e-9
+
+# Tableaux du fichier et leur type
+ARRAYS = {
+    'roots': np.int64,
+    'feature': np.int64,
+    'threshold': np.float32,
+    'children': np.int64,
+    'missing_left': np.uint8,
+    'value': np.float64
+}
+
+
+def is_forest_file(path):
+    """True si `path` commence par la signature du format compact."""
+    try:
+        with open(path, 'rb') as f:
+            return f.read(len(MAGIC)) == MAGIC
+    except OSError:
+        return False
+
+
+def float32_threshold(threshold):
+    """
+    Seuils float64 de sklearn ramenés au plus grand float32 inférieur ou égal:
+    pour x float32, x <= seuil32 équivaut exactement à x <= seuil64.
+    """
+    rounded = threshold.astype(np.float32)
+    above = rounded.astype(np.float64) > threshold
+    rounded[above] = np.nextafter(rounded[above], np.float32(-np.inf))
+    return rounded
+
+
+def flatten_forest(model):
+    """
+    Aplatis les arbres d'un RandomForestClassifier.
+
+    children[n] = (fils droit, fils gauche): le noeud suivant est
+    children[n, x <= seuil], une seule lecture par étape. NaN <= seuil étant
+    faux, missing_left[n] indique si une valeur NaN va à gauche (sens
+    appris ou choisi par sklearn; à droite pour un sklearn sans cet attribut).
+
+    Returns:
+        tuple: (dict nom -> ndarray, profondeur maximale)
+    """
+    n_classes = len(model.classes_)
+    roots, features, thresholds, children, missing, values = [], [], [], [], [], []
+    offset = 0
+    max_depth = 0
+    for estimator in model.estimators_:
+        tree = estimator.tree_
+        nodes = np.arange(tree.node_count)
+        leaf = tree.children_left < 0
+        roots.append(offset)
+        # Feuille: boucle sur elle-même (variable 0, seuil quelconque)
+        features.append(np.where(leaf, 0, tree.feature))
+        thresholds.append(float32_threshold(np.where(leaf, 0.0, tree.threshold)))
+        children.append(np.column_stack([
+            np.where(leaf, nodes, tree.children_right),
+            np.where(leaf, nodes, tree.children_left)
+        ]) + offset)
+        missing_left = getattr(tree, 'missing_go_to_left', None)
+        missing.append(np.zeros(tree.node_count) if missing_left is None
+                       else np.where(leaf, 0, np.asarray(missing_left)))
+        # Même normalisation que DecisionTreeClassifier.predict_proba
+        value = tree.value[:, 0, :n_classes].astype(np.float64)
+        normalizer = value.sum(axis=1, keepdims=True)
+        normalizer[normalizer == 0.0] = 1.0
+        values.append(value / normalizer)
+        max_depth = max(max_depth, int(tree.max_depth))
+        offset += tree.node_count
+
+    arrays = {
+        'roots': np.array(roots),
+        'feature': np.concatenate(features),
+        'threshold': np.concatenate(thresholds),
+        'children': np.concatenate(children),
+        'missing_left': np.concatenate(missing),
+        'value': np.concatenate(values)
+    }
+    return {name: np.ascontiguousarray(array, dtype=ARRAYS[name]) for name, array in arrays.items()}, max_depth
+
+
+def export_forest(model, path=FOREST_PATH, scaler=None):
+    """
+    Écrit le modèle au format compact.
+
+    Args:
+        model: RandomForestClassifier entraîné sur un DataFrame
+        path: Fichier de sortie
+        scaler: StandardScaler du notebook (paramètres recopiés dans l'en-tête)
+
+    Returns:
+        dict: En-tête écrit
+    """
+    if not hasattr(model, 'estimators_') or not hasattr(model, 'feature_names_in_'):
+        raise ValueError("Modèle attendu: RandomForestClassifier entraîné sur un DataFrame")
+    arrays, max_depth = flatten_forest(model)
+
+    header = {
+        'version': FORMAT_VERSION,
+        'feature_names': list(model.feature_names_in_),
+        'classes': [int(c) if isinstance(c, (np.integer, int)) else str(c) for c in model.classes_],
+        'n_trees': len(model.estimators_),
+        'n_nodes': int(len(arrays['feature'])),
+        'max_depth': max_depth,
+        'scaler': None,
+        'arrays': {}
+    }
+    if scaler is not None:
+        header['scaler'] = {
+            'columns': list(getattr(scaler, 'feature_names_in_', [])),
+            'mean': scaler.mean_.tolist() if scaler.with_mean else None,
+            'scale': scaler.scale_.tolist() if scaler.scale_ is not None else None
+        }
+
+    # Les offsets dépendent de la taille de l'en-tête: deux passes
+    def layout(start):
+        specs = {}
+        position = start
+        for name, array in arrays.items():
+            position = -(-position // ALIGNMENT) * ALIGNMENT
+            specs[name] = {'dtype': array.dtype.str, 'shape': list(array.shape), 'offset': position}
+            position += array.nbytes
+        return specs
+
+    header['arrays'] = layout(0)
+    encoded = json.dumps(header).encode('utf-8')
+    data_start = len(MAGIC) + 8 + len(encoded) + 256
+    header['arrays'] = layout(data_start)
+    encoded = json.dumps(header).encode('utf-8')
+    if len(encoded) > data_start - len(MAGIC) - 8:
+        raise ValueError("En-tête plus grand que la place réservée")
+    # Complété par des espaces (ignorés par json.loads) jusqu'au premier tableau
+    encoded = encoded.ljust(data_start - len(MAGIC) - 8)
+
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(MAGIC)
+        f.write(struct.pack('<Q', len(encoded)))
+        f.write(encoded)
+        for name, array in arrays.items():
+            f.write(b'\0' * (header['arrays'][name]['offset'] - f.tell()))
+            f.write(array.tobytes())
+    os.replace(tmp_path, path)
+    return header
+
+
+class CompactForest:
+    """
+    Random Forest chargé depuis le format compact, prédiction en NumPy pur.
+
+    Expose feature_names_in_, classes_ et predict_proba comme le modèle sklearn,
+    pour être utilisé à sa place (conversion_scoring.ConversionScorer).
+
+    Args:
+        path (str): Fichier .forest
+        batch_rows (int): Lignes par lot de prédiction
+
+    Raises:
+        ValueError: Fichier invalide ou incohérent
+    """
+
+    def __init__(self, path=FOREST_PATH, batch_rows=BATCH_ROWS):
+        self.path = path
+        self.batch_rows = max(1, batch_rows)
+        with open(path, 'rb') as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"{path}: signature invalide (fichier .forest attendu)")
+            (header_size,) = struct.unpack('<Q', f.read(8))
+            try:
+                header = json.loads(f.read(header_size).decode('utf-8'))
+            except ValueError as e:
+                raise ValueError(f"{path}: en-tête illisible ({e})") from None
+        if header.get('version') != FORMAT_VERSION:
+            raise ValueError(f"{path}: version non supportée ({header.get('version')})")
+
+        self.header = header
+        try:
+            self.feature_names_in_ = np.array(header['feature_names'], dtype=object)
+            self.classes_ = np.array(header['classes'])
+            self.n_features_in_ = len(header['feature_names'])
+            self.n_trees = int(header['n_trees'])
+            self.max_depth = int(header['max_depth'])
+            self.scaler = header.get('scaler')
+
+            # Une seule projection du fichier, les tableaux en sont des vues
+            self._buffer = np.memmap(path, dtype=np.uint8, mode='r')
+            for name, dtype in ARRAYS.items():
+                spec = header['arrays'][name]
+                # Types numériques attendus uniquement (jamais d'objets Python)
+                if np.dtype(spec['dtype']) != np.dtype(dtype).newbyteorder('<'):
+                    raise ValueError(f"{path}: tableau '{name}' de type inattendu")
+                shape = [int(size) for size in spec['shape']]
+                offset = int(spec['offset'])
+                end = offset + int(np.prod(shape)) * np.dtype(dtype).itemsize
+                if offset % ALIGNMENT or end > len(self._buffer):
+                    raise ValueError(f"{path}: tableau '{name}' hors du fichier")
+                setattr(self, name, self._buffer[offset:end].view(np.dtype(spec['dtype'])).reshape(shape))
+        except (KeyError, TypeError) as e:
+            raise ValueError(f"{path}: en-tête incomplet ({e})") from None
+        self._validate()
+
+    def _validate(self):
+        n_nodes = self.header['n_nodes']
+        n_classes = len(self.classes_)
+        if self.roots.shape != (self.n_trees,) or self.value.shape != (n_nodes, n_classes):
+            raise ValueError(f"{self.path}: dimensions incohérentes")
+        if self.children.shape != (n_nodes, 2) or self.missing_left.shape != (n_nodes,):
+            raise ValueError(f"{self.path}: dimensions incohérentes")
+        for name in ('roots', 'children'):
+            array = getattr(self, name)
+            if len(array) and (array.min() < 0 or array.max() >= n_nodes):
+                raise ValueError(f"{self.path}: indices de noeuds hors bornes ('{name}')")
+        if n_nodes and (self.feature.min() < 0 or self.feature.max() >= self.n_features_in_):
+            raise ValueError(f"{self.path}: variable hors bornes")
+
+    def _predict_all_trees(self, X, missing=False):
+        # Lignes x arbres descendus ensemble: max_depth étapes au total
+        rows = len(X)
+        flat = X.reshape(-1)
+        base = np.repeat(np.arange(rows, dtype=np.int64) * self.n_features_in_, self.n_trees)
+        node = np.tile(self.roots, rows)
+        children = self.children.reshape(-1)
+        for _ in range(self.max_depth):
+            x = flat[self.feature[node] + base]
+            go_left = x <= self.threshold[node]
+            if missing:
+                go_left |= np.isnan(x) & self.missing_left[node].astype(bool)
+            node = children[2 * node + go_left]
+
+        values = self.value[node].reshape(rows, self.n_trees, self.value.shape[1])
+        # Accumulation arbre par arbre, dans l'ordre de sklearn
+        proba = np.zeros((rows, values.shape[2]), dtype=np.float64)
+        for tree in range(self.n_trees):
+            proba += values[:, tree]
+        proba /= self.n_trees
+        return proba
+
+    def _predict_per_tree(self, X):
+        # Un arbre à la fois sur tout le lot, dans des tampons réutilisés
+        # (indices validés au chargement: mode='clip' évite contrôle et copie)
+        rows = len(X)
+        flat = X.reshape(-1)
+        base = np.arange(rows, dtype=np.int64) * self.n_features_in_
+        children = self.children.reshape(-1)
+        node = np.empty(rows, dtype=np.int64)
+        index = np.empty(rows, dtype=np.int64)
+        x = np.empty(rows, dtype=np.float32)
+        threshold = np.empty(rows, dtype=np.float32)
+        go_left = np.empty(rows, dtype=bool)
+        leaf_values = np.empty((rows, self.value.shape[1]), dtype=np.float64)
+        proba = np.zeros((rows, self.value.shape[1]), dtype=np.float64)
+        for root in self.roots:
+            node.fill(root)
+            for _ in range(self.max_depth):
+                np.take(self.feature, node, out=index, mode='clip')
+                index += base
+                np.take(flat, index, out=x, mode='clip')
+                np.take(self.threshold, node, out=threshold, mode='clip')
+                np.less_equal(x, threshold, out=go_left)
+                node *= 2
+                node += go_left
+                np.take(children, node, out=node, mode='clip')
+            np.take(self.value, node, axis=0, out=leaf_values, mode='clip')
+            proba += leaf_values
+        proba /= self.n_trees
+        return proba
+
+    def _predict_complete(self, X):
+        if len(X) <= ALL_TREES_MAX_ROWS:
+            return self._predict_all_trees(X)
+        return self._predict_per_tree(X)
+
+    def _predict_batch(self, X):
+        nan_rows = np.isnan(X).any(axis=1)
+        if not nan_rows.any():
+            return self._predict_complete(X)
+        # Lignes avec NaN: parcours qui consulte missing_left (plus lent)
+        proba = np.empty((len(X), self.value.shape[1]), dtype=np.float64)
+        proba[~nan_rows] = self._predict_complete(X[~nan_rows])
+        proba[nan_rows] = self._predict_all_trees(X[nan_rows], missing=True)
+        return proba
+
+    def predict_proba(self, X):
+        """
+        Probabilités par classe (colonnes dans l'ordre de classes_).
+
+        Args:
+            X: DataFrame ou matrice (lignes, features) dans l'ordre feature_names_in_
+        """
+        X = np.ascontiguousarray(np.asarray(X, dtype=np.float32))
+        if X.ndim != 2 or X.shape[1] != self.n_features_in_:
+            raise ValueError(f"{self.n_features_in_} features attendues, reçu {X.shape}")
+        if len(X) <= self.batch_rows:
+            return self._predict_batch(X)
+        return np.vstack([self._predict_batch(X[start:start + self.batch_rows])
+                          for start in range(0, len(X), self.batch_rows)])
+
+    def predict(self, X):
+        return self.classes_[np.argmax(self.predict_proba(X), axis=1)]
+
+
+def check_against_sklearn(model, forest, data_path):
+    """
+    Compare les deux modèles sur un fichier user_behavior, puis sur une copie
+    où ~10 % des valeurs sont remplacées par NaN (sens des valeurs manquantes).
+
+    Returns:
+        dict: Écarts maximaux (sans et avec NaN), temps de prédiction
+    """
+    import pandas as pd
+    from feature_encoder import FeatureEncoder
+
+    df = pd.read_csv(data_path)
+    encoder = FeatureEncoder.from_feature_names(list(model.feature_names_in_))
+    X = pd.DataFrame(encoder.transform(df), columns=encoder.feature_names)
+
+    start = time.perf_counter()
+    reference = model.predict_proba(X)
+    sklearn_time = time.perf_counter() - start
+    start = time.perf_counter()
+    compact = forest.predict_proba(X)
+    compact_time = time.perf_counter() - start
+
+    missing = X.copy()
+    missing[np.random.default_rng(0).random(missing.shape) < 0.1] = np.nan
+    missing_diff = np.abs(model.predict_proba(missing) - forest.predict_proba(missing)).max()
+    return {
+        'rows': len(df),
+        'max_abs_diff': float(np.abs(reference - compact).max()),
+        'max_abs_diff_missing': float(missing_diff),
+        'sklearn_s': sklearn_time,
+        'compact_s': compact_time
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export du Random Forest au format compact")
+    parser.add_argument('--model', default=MODEL_PATH)
+    parser.add_argument('--scaler', default=SCALER_PATH)
+    parser.add_argument('--output', default=FOREST_PATH)
+    parser.add_argument('--check', default=None, metavar='CSV',
+                        help="Vérifie les probabilités contre sklearn sur ce fichier user_behavior")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    with open(args.model, 'rb') as f:
+        model = pickle.load(f)
+    pickle_load_time = time.perf_counter() - start
+    scaler = None
+    if args.scaler and os.path.exists(args.scaler):
+        with open(args.scaler, 'rb') as f:
+            scaler = pickle.load(f)
+
+    header = export_forest(model, args.output, scaler)
+    start = time.perf_counter()
+    forest = CompactForest(args.output)
+    compact_load_time = time.perf_counter() - start
+
+    print(f"Modèle exporté: {args.output}")
+    print(f"  - {header['n_trees']} arbres, {header['n_nodes']:,} noeuds, profondeur max {header['max_depth']}")
+    print(f"  - taille: {os.path.getsize(args.output) / 1024:,.0f} Ko "
+          f"(pickle: {os.path.getsize(args.model) / 1024:,.0f} Ko)")
+    print(f"  - chargement: {compact_load_time * 1000:.1f} ms (pickle: {pickle_load_time * 1000:.1f} ms)")
+
+    if args.check:
+        result = check_against_sklearn(model, forest, args.check)
+        print(f"\nVérification sur {result['rows']:,} lignes ({args.check}):")
+        print(f"  - écart maximal avec sklearn: {result['max_abs_diff']:.3g} (tolérance {TOLERANCE:g}), "
+              f"avec NaN: {result['max_abs_diff_missing']:.3g}")
+        print(f"  - predict_proba: sklearn {result['sklearn_s']:.3f}s, compact {result['compact_s']:.3f}s")
+        if max(result['max_abs_diff'], result['max_abs_diff_missing']) > TOLERANCE:
+            print("  ÉCART HORS TOLÉRANCE")
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,350 @@
+"""
+TP03 - Partie 2: Scoring par lots avec le modèle de conversion
+Auteur: - Soukaina El Hadifi
+        - Mohamed-Saber El guelta
+
+Charge une seule fois les artefacts du notebook ml_conversion_prediction
+(rf_conversion_model.pkl et scaler.pkl) et score des fichiers au format
+user_behavior (CSV unique ou répertoire de parts avec manifest.json):
+- la matrice de features est construite par l'encodeur persisté
+  (feature_encoder.py, data/feature_encoder.json) dans l'ordre exact des
+  colonnes d'entraînement, et non par pd.get_dummies sur le bloc: un bloc où
+  manque la catégorie de référence ferait sinon glisser toutes les colonnes
+  indicatrices. Une catégorie inconnue à l'entraînement est encodée comme la
+  référence (toutes les indicatrices à 0)
+- le Random Forest a été entraîné sur les features NON standardisées (le
+  scaler ne servait qu'à la régression logistique): il n'est appliqué que
+  si scale_features=True
+- lecture par blocs, predict_proba vectorisé par bloc, blocs répartis sur un
+  pool de processus (modèle chargé une fois par processus) et résultats
+  écrits dans l'ordre d'entrée
+- rapport: lignes/s et pic mémoire (processus principal et workers)
+- --model accepte aussi le format compact (compact_forest.py): chargement
+  sans pickle ni sklearn, fichier projeté en mémoire et partagé entre workers
+
+Usage:
+    python conversion_scoring.py ../data/user_behavior.csv --output scores.csv
+    python conversion_scoring.py big_parts --workers 8 --chunk-size 200000 --output scores.csv
+    python conversion_scoring.py big_parts --model ../data/rf_conversion_model.forest --workers 8
+"""
+
+import argparse
+import json
+import os
+import pickle
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from compact_forest import CompactForest, is_forest_file
+from feature_encoder import ENCODER_PATH, FeatureEncoder
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.path.join(SCRIPT_DIR, '..', 'data')
+MODEL_PATH = os.path.join(DATA_DIR, 'rf_conversion_model.pkl')
+SCALER_PATH = os.path.join(DATA_DIR, 'scaler.pkl')
+MANIFEST_NAME = 'manifest.json'
+
+CHUNK_SIZE = 100_000
+THRESHOLD = 0.5
+
+# Identifiant recopié dans les scores (la cible 'converted' est ignorée)
+ID_COLUMN = 'user_id'
+
+
+class ConversionScorer:
+    """
+    Modèle de conversion prêt à scorer.
+
+    Args:
+        model_path (str): Modèle picklé (classifieur sklearn avec feature_names_in_)
+            ou fichier .forest exporté par compact_forest.py
+        scaler_path (str): StandardScaler picklé (ignoré pour un .forest, qui
+            contient ses paramètres)
+        scale_features (bool): Standardiser les colonnes du scaler avant
+            prédiction (False pour le Random Forest du notebook)
+        n_jobs (int): Threads sklearn pour predict_proba
+        encoder_path (str): Encodeur enregistré (feature_encoder.py); s'il
+            n'existe pas, il est reconstruit depuis feature_names_in_
+
+    Attributes:
+        feature_names (list): Colonnes d'entraînement, dans l'ordre
+        encoder (FeatureEncoder): Encodage one-hot + standardisation
+    """
+
+    def __init__(self, model_path=MODEL_PATH, scaler_path=SCALER_PATH, scale_features=False, n_jobs=1,
+                 encoder_path=ENCODER_PATH):
+        if is_forest_file(model_path):
+            # Format compact (compact_forest.py): ni pickle ni sklearn, scaler dans l'en-tête
+            self.model = CompactForest(model_path)
+            self.scaler = None
+        else:
+            with open(model_path, 'rb') as f:
+                self.model = pickle.load(f)
+            with open(scaler_path, 'rb') as f:
+                self.scaler = pickle.load(f)
+        self.scale_features = scale_features
+        if hasattr(self.model, 'n_jobs'):
+            self.model.n_jobs = n_jobs
+
+        if not hasattr(self.model, 'feature_names_in_'):
+            raise ValueError(f"{model_path}: le modèle n'a pas été entraîné sur un DataFrame "
+                             "(feature_names_in_ absent)")
+        self.feature_names = list(self.model.feature_names_in_)
+        self.positive_index = list(self.model.classes_).index(1)
+
+        if encoder_path and os.path.exists(encoder_path):
+            self.encoder = FeatureEncoder.load(encoder_path)
+            if self.encoder.feature_names != self.feature_names:
+                raise ValueError(f"{encoder_path}: colonnes différentes de celles du modèle {model_path}")
+        else:
+            self.encoder = FeatureEncoder.from_feature_names(self.feature_names)
+        # Le scaler fourni avec le modèle fait foi pour la standardisation
+        if self.scaler is not None:
+            self.encoder.set_scaling_from_scaler(self.scaler)
+        elif self.model.scaler and self.model.scaler.get('mean') is not None:
+            params = self.model.scaler
+            self.encoder.set_scaling(params['columns'], params['mean'], params['scale'])
+        elif scale_features:
+            raise ValueError(f"{model_path}: pas de paramètres de standardisation dans le modèle")
+        self.input_columns = self.encoder.input_columns
+
+    def encode(self, df):
+        """
+        Construit la matrice de features dans l'ordre d'entraînement.
+
+        Args:
+            df (DataFrame): Lignes au format user_behavior
+
+        Returns:
+            DataFrame: float64, colonnes = feature_names
+
+        Raises:
+            ValueError: Si des colonnes d'entrée manquent
+        """
+        matrix = self.encoder.transform(df, scale=self.scale_features)
+        return pd.DataFrame(matrix, columns=self.feature_names, copy=False)
+
+    def encode_record(self, record):
+        """
+        Encode un seul visiteur (dict) en vecteur de features, sans passer
+        par un DataFrame (chemin rapide du serveur de scoring).
+
+        Returns:
+            ndarray: float64, ordre feature_names
+
+        Raises:
+            ValueError: Champ manquant ou valeur numérique invalide
+        """
+        return self.encoder.transform_record(record, scale=self.scale_features)
+
+    def predict_proba_matrix(self, matrix):
+        """
+        Probabilité de conversion pour une matrice déjà encodée (encode_record).
+
+        Pour une forêt, les arbres sont parcourus directement (même calcul,
+        même ordre d'accumulation que predict_proba): on évite la validation
+        et la répartition joblib, qui coûtent ~10 ms par appel quelle que soit
+        la taille du lot.
+        """
+        if isinstance(self.model, CompactForest):
+            return self.model.predict_proba(matrix)[:, self.positive_index]
+        estimators = getattr(self.model, 'estimators_', None)
+        if not estimators or not all(hasattr(tree, 'tree_') for tree in estimators):
+            features = pd.DataFrame(matrix, columns=self.feature_names, copy=False)
+            return self.model.predict_proba(features)[:, self.positive_index]
+
+        X = np.asarray(matrix, dtype=np.float32)
+        n_classes = len(self.model.classes_)
+        proba = np.zeros((len(X), n_classes), dtype=np.float64)
+        for tree in estimators:
+            values = tree.tree_.predict(X)[:, :n_classes]
+            normalizer = values.sum(axis=1, keepdims=True)
+            normalizer[normalizer == 0.0] = 1.0
+            proba += values / normalizer
+        proba /= len(estimators)
+        return proba[:, self.positive_index]
+
+    def predict_proba(self, df):
+        """Probabilité de conversion (classe 1) de chaque ligne."""
+        if len(df) == 0:
+            return np.empty(0, dtype=np.float64)
+        return self.model.predict_proba(self.encode(df))[:, self.positive_index]
+
+    def score(self, df, threshold=THRESHOLD):
+        """
+        Score un bloc.
+
+        Returns:
+            DataFrame: user_id (si présent), conversion_proba, predicted
+        """
+        proba = self.predict_proba(df)
+        result = pd.DataFrame({'conversion_proba': proba, 'predicted': (proba >= threshold).astype(np.int8)})
+        if ID_COLUMN in df.columns:
+            result.insert(0, ID_COLUMN, df[ID_COLUMN].to_numpy())
+        return result
+
+
+def iter_input_chunks(path, chunk_size=CHUNK_SIZE):
+    """
+    Lit un fichier user_behavior par blocs.
+
+    Args:
+        path: CSV, répertoire de parts ou manifest.json (generate_ml_data.py --shards)
+        chunk_size: Lignes par bloc
+
+    Yields:
+        DataFrame d'au plus chunk_size lignes
+    """
+    if os.path.isdir(path):
+        path = os.path.join(path, MANIFEST_NAME)
+    if os.path.basename(path) == MANIFEST_NAME:
+        with open(path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        files = [os.path.join(os.path.dirname(path), part['file']) for part in manifest['parts']]
+    else:
+        files = [path]
+    for file in files:
+        yield from pd.read_csv(file, chunksize=chunk_size)
+
+
+# Scorer du processus courant (un chargement par worker du pool)
+_worker_scorer = None
+
+
+def _init_worker(model_path, scaler_path, scale_features):
+    global _worker_scorer
+    _worker_scorer = ConversionScorer(model_path, scaler_path, scale_features, n_jobs=1)
+
+
+def _score_in_worker(chunk, threshold):
+    return _worker_scorer.score(chunk, threshold)
+
+
+def peak_memory_mb():
+    """
+    Pic de mémoire résidente (Mo) du processus et de ses workers terminés.
+
+    Returns:
+        tuple: (principal, workers), (None, None) si indisponible (Windows)
+    """
+    if resource is None:
+        return None, None
+    # ru_maxrss est en Ko sous Linux, en octets sous macOS
+    unit = 1024 * 1024 if sys.platform == 'darwin' else 1024
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / unit
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / unit
+    return round(own, 1), round(children, 1)
+
+
+def score_file(input_path, output_path=None, workers=1, chunk_size=CHUNK_SIZE, threshold=THRESHOLD,
+               model_path=MODEL_PATH, scaler_path=SCALER_PATH, scale_features=False):
+    """
+    Score un fichier user_behavior bloc par bloc.
+
+    Args:
+        input_path: CSV ou répertoire de parts
+        output_path: CSV des scores (None = pas d'écriture)
+        workers: Processus de scoring (1 = dans le processus courant)
+        chunk_size: Lignes par bloc
+        threshold: Seuil de la colonne predicted
+        model_path, scaler_path: Artefacts du notebook
+        scale_features: Voir ConversionScorer
+
+    Returns:
+        dict: rows, positives, duration_s, throughput, peak_memory_mb, workers
+    """
+    start = time.perf_counter()
+    rows = 0
+    positives = 0
+    output = open(output_path, 'w', encoding='utf-8', newline='') if output_path else None
+    header = True
+
+    def consume(result):
+        nonlocal rows, positives, header
+        rows += len(result)
+        positives += int(result['predicted'].sum())
+        if output is not None:
+            result.to_csv(output, header=header, index=False, lineterminator='\n')
+            header = False
+
+    try:
+        chunks = iter_input_chunks(input_path, chunk_size)
+        if workers <= 1:
+            scorer = ConversionScorer(model_path, scaler_path, scale_features)
+            for chunk in chunks:
+                consume(scorer.score(chunk, threshold))
+        else:
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                     initargs=(model_path, scaler_path, scale_features)) as pool:
+                # Fenêtre bornée de blocs en vol: la mémoire ne dépend pas de la taille du fichier
+                pending = []
+                for chunk in chunks:
+                    pending.append(pool.submit(_score_in_worker, chunk, threshold))
+                    if len(pending) >= workers * 2:
+                        consume(pending.pop(0).result())
+                for future in pending:
+                    consume(future.result())
+    finally:
+        if output is not None:
+            output.close()
+
+    duration = time.perf_counter() - start
+    main_mb, workers_mb = peak_memory_mb()
+    return {
+        'rows': rows,
+        'positives': positives,
+        'duration_s': round(duration, 3),
+        'throughput': round(rows / duration, 1) if duration > 0 else 0.0,
+        'workers': workers,
+        'chunk_size': chunk_size,
+        'peak_memory_mb': {'main': main_mb, 'workers': workers_mb}
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Scoring de conversion par lots")
+    parser.add_argument('input', help="CSV user_behavior ou répertoire de parts")
+    parser.add_argument('--output', default=None, help="CSV des scores (user_id, conversion_proba, predicted)")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help="Processus de scoring (défaut: nombre de coeurs)")
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+    parser.add_argument('--threshold', type=float, default=THRESHOLD)
+    parser.add_argument('--model', default=MODEL_PATH,
+                        help="Modèle picklé ou fichier .forest (compact_forest.py)")
+    parser.add_argument('--scaler', default=SCALER_PATH)
+    parser.add_argument('--scale-features', action='store_true',
+                        help="Standardiser avant prédiction (modèle entraîné sur données scalées)")
+    args = parser.parse_args()
+
+    print("=" * 70)
+    print("SCORING DE CONVERSION")
+    print("=" * 70)
+    print(f"Entrée: {args.input} - workers: {args.workers} - blocs de {args.chunk_size}")
+
+    report = score_file(args.input, args.output, max(1, args.workers), max(1, args.chunk_size),
+                        args.threshold, args.model, args.scaler, args.scale_features)
+
+    memory = report['peak_memory_mb']
+    print(f"\nLignes scorées: {report['rows']:,} en {report['duration_s']:.2f}s "
+          f"({report['throughput']:,.0f} lignes/s)")
+    if report['rows']:
+        print(f"Conversions prédites: {report['positives']:,} "
+              f"({report['positives'] / report['rows'] * 100:.1f}%, seuil {args.threshold})")
+    if memory['main'] is not None:
+        print(f"Pic mémoire: {memory['main']:.1f} Mo (principal), {memory['workers']:.1f} Mo (workers)")
+    if args.output:
+        print(f"Scores enregistrés: {args.output}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -12,15 +12,31 @@ Ce script:
 - Peut être schedulé avec cron/Task Scheduler
 """
 
+import numpy as np
+import pandas as pd
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import psycopg2
 from psycopg2 import sql
+from psycopg2.extras import execute_values
+from psycopg2.pool import ThreadedConnectionPool
+from contextlib import contextmanager
 from datetime import datetime, timedelta
+import argparse
+import io
+import csv
+import itertools
 import json
 import logging
-from typing import Dict, List, Optional
+import threading
+import time
+from typing import Dict, Iterable, List, Optional
 import os
 
+from etl_stages import PipelineError, Stage, StagedPipeline
+from matomo_cache import CacheMissError, MatomoCache
+
 # ============================================================================
 # CONFIGURATION
 # ============================================================================
@@ -34,16 +50,40 @@ DB_CONFIG = {
     'password': os.getenv('DB_PASSWORD', '0000')
 }
 
+# Taille du pool de connexions partagé entre les runs et les sites
+DB_POOL_MIN = int(os.getenv('DB_POOL_MIN', '1'))
+DB_POOL_MAX = int(os.getenv('DB_POOL_MAX', '8'))
+
+_connection_pool = None
+_pool_lock = threading.Lock()
+
+# Bases dont le schéma a déjà été vérifié dans ce processus
+_schema_checked = set()
+
 # Configuration Matomo API (simulée pour le TP)
 MATOMO_CONFIG = {
-    'url': 'https://demo.matomo.cloud',
+    'url': os.getenv('MATOMO_URL', 'https://demo.matomo.cloud'),
     'site_id': '1',
-    'token_auth': 'anonymous',  # À remplacer par votre token
+    'token_auth': os.getenv('MATOMO_TOKEN', 'anonymous'),  # À remplacer par votre token
     'method': 'VisitsSummary.get',
     'period': 'day',
     'date': 'today'
 }
 
+# Backfill: requêtes Matomo en parallèle et jours par requête (date=début,fin)
+BACKFILL_WORKERS = int(os.getenv('ETL_BACKFILL_WORKERS', '8'))
+BACKFILL_CHUNK_DAYS = int(os.getenv('ETL_BACKFILL_CHUNK_DAYS', '31'))
+
+# Cache disque des réponses Matomo (périodes closes conservées, jour en
+# cours gardé MATOMO_CACHE_OPEN_TTL secondes)
+MATOMO_CACHE_DIR = os.getenv('MATOMO_CACHE_DIR', '.matomo_cache')
+MATOMO_CACHE_MAX_MB = int(os.getenv('MATOMO_CACHE_MAX_MB', '256'))
+MATOMO_CACHE_OPEN_TTL = float(os.getenv('MATOMO_CACHE_OPEN_TTL', '300'))
+
+# Workers des étapes transform et load (extract: BACKFILL_WORKERS)
+TRANSFORM_WORKERS = int(os.getenv('ETL_TRANSFORM_WORKERS', '1'))
+LOAD_WORKERS = int(os.getenv('ETL_LOAD_WORKERS', '2'))
+
 # Configuration du logging
 logging.basicConfig(
     level=logging.INFO,
@@ -59,10 +99,13 @@ logger = logging.getLogger(__name__)
 # FONCTIONS EXTRACT
 # ============================================================================
 
-def extract_from_matomo_api() -> Optional[Dict]:
+def extract_from_matomo_api(site_id: Optional[int] = None) -> Optional[Dict]:
     """
     Extrait les données depuis l'API Matomo
     
+    Args:
+        site_id: Site Matomo (par défaut celui de MATOMO_CONFIG)
+    
     Returns:
         Dict contenant les métriques ou None en cas d'erreur
     """
@@ -72,7 +115,7 @@ def extract_from_matomo_api() -> Optional[Dict]:
         params = {
             'module': 'API',
             'method': MATOMO_CONFIG['method'],
-            'idSite': MATOMO_CONFIG['site_id'],
+            'idSite': site_id or MATOMO_CONFIG['site_id'],
             'period': MATOMO_CONFIG['period'],
             'date': MATOMO_CONFIG['date'],
             'format': 'json',
@@ -87,20 +130,27 @@ def extract_from_matomo_api() -> Optional[Dict]:
         
         if response.status_code == 200:
             data = response.json()
+            if not isinstance(data, dict) or data.get('result') == 'error':
+                logger.error(f"Réponse Matomo inattendue: {str(data)[:200]}")
+                return None
             logger.info(f"Données extraites: {len(data)} métriques")
             return data
         else:
             logger.error(f"Erreur API: {response.status_code}")
             return None
             
-    except requests.RequestException as e:
+    except (requests.RequestException, ValueError) as e:
+        # ValueError: corps non JSON
         logger.error(f"Erreur de connexion: {e}")
         return None
 
-def extract_simulated_data() -> Dict:
+def extract_simulated_data(date: Optional[datetime] = None) -> Dict:
     """
     Génère des données simulées pour le TP (si pas d'accès à l'API)
     
+    Args:
+        date: Jour simulé (par défaut aujourd'hui)
+    
     Returns:
         Dict contenant des métriques simulées
     """
@@ -109,7 +159,7 @@ def extract_simulated_data() -> Dict:
     import random
     
     data = {
-        'date': datetime.now().strftime('%Y-%m-%d'),
+        'date': (date or datetime.now()).strftime('%Y-%m-%d'),
         'nb_visits': random.randint(1000, 5000),
         'nb_actions': random.randint(3000, 15000),
         'nb_visits_converted': random.randint(50, 500),
@@ -124,16 +174,105 @@ def extract_simulated_data() -> Dict:
     logger.info(f"Données simulées générées: {data['nb_visits']} visites")
     return data
 
+def create_matomo_session(pool_size: int = BACKFILL_WORKERS) -> requests.Session:
+    """
+    Session HTTP partagée par les workers du backfill (connexions keep-alive
+    réutilisées, relances automatiques sur 429/5xx)
+    """
+    retry = Retry(total=3, backoff_factor=0.5,
+                  status_forcelist=(429, 500, 502, 503, 504),
+                  allowed_methods=('GET',), respect_retry_after_header=True)
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+    session = requests.Session()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+def split_date_range(start: datetime, end: datetime, chunk_days: int) -> List[tuple]:
+    """Découpe [start, end] (bornes incluses) en périodes de `chunk_days` jours"""
+    chunks = []
+    chunk_start = start
+    while chunk_start <= end:
+        chunk_end = min(end, chunk_start + timedelta(days=chunk_days - 1))
+        chunks.append((chunk_start, chunk_end))
+        chunk_start = chunk_end + timedelta(days=1)
+    return chunks
+
+def extract_matomo_range(session: Optional[requests.Session], site_id: int,
+                         start: datetime, end: datetime,
+                         cache: Optional[MatomoCache] = None) -> List[tuple]:
+    """
+    Extrait les métriques journalières d'un site sur une période, en une seule
+    requête Matomo (period=day, date=début,fin)
+    
+    Args:
+        session: Session HTTP partagée (None en mode replay)
+        site_id: Site Matomo
+        start: Premier jour (inclus)
+        end: Dernier jour (inclus)
+        cache: Cache des réponses brutes (optionnel)
+    
+    Returns:
+        Liste de (jour, données brutes); les jours sans visite sont inclus
+        avec des données vides
+        
+    Raises:
+        requests.RequestException ou ValueError si l'API répond une erreur
+        ou un corps qui n'est pas un objet JSON (liste, null),
+        CacheMissError si la réponse manque au cache en mode replay
+    """
+    params = {
+        'module': 'API',
+        'method': MATOMO_CONFIG['method'],
+        'idSite': site_id,
+        'period': 'day',
+        'date': f"{start:%Y-%m-%d},{end:%Y-%m-%d}",
+        'format': 'json',
+        'token_auth': MATOMO_CONFIG['token_auth']
+    }
+    data = cache.get(params, MATOMO_CONFIG['url']) if cache is not None else None
+    if data is None:
+        if cache is not None and cache.replay:
+            raise CacheMissError(f"site {params['idSite']}, date={params['date']}")
+        response = session.get(f"{MATOMO_CONFIG['url']}/index.php", params=params, timeout=30)
+        response.raise_for_status()
+        data = response.json()
+        if isinstance(data, dict) and data.get('result') == 'error':
+            raise ValueError(f"Erreur API Matomo: {data.get('message')}")
+        if not isinstance(data, dict):
+            # Liste d'erreurs, null...: jamais mis en cache
+            raise ValueError(f"Réponse Matomo inattendue ({type(data).__name__}, objet JSON attendu)")
+        if cache is not None:
+            today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+            cache.put(params, data, closed=end < today, base_url=MATOMO_CONFIG['url'])
+    
+    # Matomo renvoie [] au lieu d'un objet pour un jour sans visite
+    return [
+        (datetime.strptime(day, '%Y-%m-%d'), metrics if isinstance(metrics, dict) else {})
+        for day, metrics in sorted(data.items())
+    ]
+
+def extract_simulated_range(site_id: int, start: datetime, end: datetime) -> List[tuple]:
+    """Équivalent simulé de extract_matomo_range"""
+    days = (end - start).days + 1
+    return [
+        (day, extract_simulated_data(day))
+        for day in (start + timedelta(days=offset) for offset in range(days))
+    ]
+
 # ============================================================================
 # FONCTIONS TRANSFORM
 # ============================================================================
 
-def transform_data(raw_data: Dict) -> Dict:
+def transform_data(raw_data: Dict, date: Optional[datetime] = None,
+                   site_id: Optional[int] = None) -> Dict:
     """
     Transforme et nettoie les données brutes
     
     Args:
         raw_data: Données brutes de l'API
+        date: Date de la période (par défaut l'heure actuelle)
+        site_id: Site Matomo (par défaut celui de MATOMO_CONFIG)
         
     Returns:
         Dict avec données nettoyées et enrichies
@@ -143,7 +282,8 @@ def transform_data(raw_data: Dict) -> Dict:
     try:
         # Nettoyage et normalisation
         transformed = {
-            'date': datetime.now(),
+            'site_id': int(site_id or MATOMO_CONFIG['site_id']),
+            'date': date or datetime.now(),
             'visits': int(raw_data.get('nb_visits', 0)),
             'conversions': int(raw_data.get('nb_visits_converted', 0)),
             'actions': int(raw_data.get('nb_actions', 0)),
@@ -183,6 +323,119 @@ def transform_data(raw_data: Dict) -> Dict:
         logger.error(f"Erreur transformation: {e}")
         raise
 
+# Colonnes brutes Matomo lues par la transformation
+RAW_COUNT_COLUMNS = {
+    'visits': 'nb_visits',
+    'conversions': 'nb_visits_converted',
+    'actions': 'nb_actions',
+    'bounce_count': 'bounce_count',
+    'total_time': 'sum_visit_length'
+}
+
+def raw_frame(records: List[Dict]) -> pd.DataFrame:
+    """
+    Bloc de données brutes en colonnes pour transform_batch, une ligne par
+    période. Les jours sans visite ({}) donnent des valeurs manquantes; sans
+    index ni colonnes explicites, un bloc n'ayant que de tels jours
+    deviendrait un cadre 0x0.
+    """
+    return pd.DataFrame.from_records(records, index=range(len(records)),
+                                     columns=list(RAW_COUNT_COLUMNS.values()))
+
+def round_half_even_2(values: np.ndarray) -> np.ndarray:
+    """
+    Arrondi à 2 décimales identique à round(x, 2) de Python, en vectorisé.
+    
+    np.round multiplie par 100 avant d'arrondir: pour une valeur dont la
+    3e décimale est (presque) un 5, l'erreur de la multiplication peut faire
+    basculer l'arrondi. Ces cas, rares, sont recalculés avec round().
+    """
+    scaled = values * 100
+    rounded = np.round(scaled) / 100
+    near_tie = np.abs(scaled - np.floor(scaled) - 0.5) < 1e-6
+    if near_tie.any():
+        index = np.flatnonzero(near_tie)
+        rounded[index] = [round(float(value), 2) for value in values[index]]
+    return rounded
+
+def transform_batch(raw: pd.DataFrame, dates=None, site_id=None) -> pd.DataFrame:
+    """
+    Version vectorisée de transform_data pour un bloc d'enregistrements
+    bruts (une ligne par période). Chaque ligne du résultat est égale à
+    transform_data(ligne brute, date, site_id) pour la ligne correspondante.
+    
+    Args:
+        raw: Données brutes Matomo en colonnes (nb_visits, ...)
+        dates: Date de chaque ligne (par défaut l'heure actuelle)
+        site_id: Site Matomo, unique ou un par ligne (par défaut celui de
+            MATOMO_CONFIG)
+        
+    Returns:
+        DataFrame aux colonnes LOAD_COLUMNS
+    """
+    logger.info(f"TRANSFORM: Transformation vectorisée de {len(raw)} enregistrements...")
+    
+    size = len(raw)
+    counts = {}
+    for column, raw_column in RAW_COUNT_COLUMNS.items():
+        if raw_column in raw:
+            # Même troncature que int(): NaN (jour sans donnée) -> 0
+            values = pd.to_numeric(raw[raw_column]).fillna(0).to_numpy(dtype=np.float64)
+            counts[column] = np.trunc(values).astype(np.int64)
+        else:
+            counts[column] = np.zeros(size, dtype=np.int64)
+    
+    visits = counts['visits']
+    has_visits = visits > 0
+    safe_visits = np.where(has_visits, visits, 1)
+    
+    def rate(numerator, factor=None):
+        ratio = numerator / safe_visits
+        if factor is not None:
+            ratio = ratio * factor
+        return np.where(has_visits, round_half_even_2(ratio), 0.0)
+    
+    # Calculs de métriques dérivées (avant le plafonnement des conversions,
+    # comme dans transform_data)
+    transformed = pd.DataFrame({
+        'site_id': (np.asarray(site_id, dtype=np.int64) if np.ndim(site_id)
+                    else np.full(size, int(site_id or MATOMO_CONFIG['site_id']), dtype=np.int64)),
+        'date': dates if dates is not None else datetime.now(),
+        'visits': visits,
+        'conversions': counts['conversions'],
+        'conversion_rate': rate(counts['conversions'], 100),
+        'actions': counts['actions'],
+        'actions_per_visit': rate(counts['actions']),
+        'bounce_count': counts['bounce_count'],
+        'bounce_rate': rate(counts['bounce_count'], 100),
+        'total_time': counts['total_time'],
+        'avg_time_per_visit': rate(counts['total_time'])
+    }, index=raw.index)
+    
+    # Validation des données
+    anomalies = transformed['conversions'] > transformed['visits']
+    if anomalies.any():
+        logger.warning(f"ATTENTION: Anomalie: conversions > visites sur {int(anomalies.sum())} "
+                       f"enregistrement(s), ajustement...")
+        transformed['conversions'] = np.minimum(transformed['conversions'], transformed['visits'])
+    
+    logger.info(f"Transformation terminée: {len(transformed)} enregistrements")
+    return transformed[list(LOAD_COLUMNS)]
+
+def _native_values(column: pd.Series) -> list:
+    # datetime64 -> datetime bien plus vite que tolist() (qui crée des Timestamp)
+    if pd.api.types.is_datetime64_dtype(column):
+        return column.to_numpy(dtype='datetime64[us]').tolist()
+    return column.tolist()
+
+def frame_rows(transformed: pd.DataFrame) -> Iterable[tuple]:
+    """Lignes du résultat de transform_batch dans l'ordre de LOAD_COLUMNS (types Python natifs)"""
+    return zip(*(_native_values(transformed[column]) for column in LOAD_COLUMNS))
+
+def frame_to_records(transformed: pd.DataFrame) -> List[Dict]:
+    """Convertit le résultat de transform_batch en dicts, comme ceux de transform_data"""
+    return [dict(zip(LOAD_COLUMNS, row)) for row in frame_rows(transformed)]
+
 # ============================================================================
 # FONCTIONS LOAD
 # ============================================================================
@@ -196,9 +449,53 @@ def get_db_connection():
         logger.error(f"Erreur connexion PostgreSQL: {e}")
         raise
 
-def create_table_if_not_exists(conn):
-    """Crée la table daily_metrics si elle n'existe pas"""
-    create_table_query = """
+def get_connection_pool() -> ThreadedConnectionPool:
+    """
+    Pool de connexions partagé par tous les runs et sites du processus
+    (créé au premier appel)
+    """
+    global _connection_pool
+    with _pool_lock:
+        if _connection_pool is None or _connection_pool.closed:
+            try:
+                _connection_pool = ThreadedConnectionPool(DB_POOL_MIN, DB_POOL_MAX, **DB_CONFIG)
+            except psycopg2.Error as e:
+                logger.error(f"Erreur connexion PostgreSQL: {e}")
+                raise
+            logger.info(f"Pool PostgreSQL créé ({DB_POOL_MIN}-{DB_POOL_MAX} connexions)")
+        return _connection_pool
+
+@contextmanager
+def db_connection():
+    """
+    Emprunte une connexion au pool et la rend à la sortie du bloc
+    (transaction en cours annulée, connexion cassée écartée)
+    """
+    pool = get_connection_pool()
+    conn = pool.getconn()
+    try:
+        yield conn
+    finally:
+        broken = bool(conn.closed)
+        if not broken:
+            try:
+                conn.rollback()
+            except psycopg2.Error:
+                broken = True
+        pool.putconn(conn, close=broken)
+
+def close_connection_pool():
+    """Ferme toutes les connexions du pool"""
+    global _connection_pool
+    with _pool_lock:
+        if _connection_pool is not None and not _connection_pool.closed:
+            _connection_pool.closeall()
+        _connection_pool = None
+
+# Migrations du schéma, appliquées une seule fois par base et dans l'ordre.
+# Ne jamais modifier une migration publiée: en ajouter une nouvelle.
+SCHEMA_MIGRATIONS = [
+    (1, "Table daily_metrics", """
     CREATE TABLE IF NOT EXISTS daily_metrics (
         id SERIAL PRIMARY KEY,
         date TIMESTAMP NOT NULL,
@@ -216,19 +513,114 @@ def create_table_if_not_exists(conn):
     );
     
     CREATE INDEX IF NOT EXISTS idx_daily_metrics_date ON daily_metrics(date);
+    """),
+    (2, "Colonne site_id et unicité (site_id, date)", """
+    ALTER TABLE daily_metrics ADD COLUMN IF NOT EXISTS site_id INTEGER NOT NULL DEFAULT 1;
+    ALTER TABLE daily_metrics DROP CONSTRAINT IF EXISTS daily_metrics_date_key;
+    ALTER TABLE daily_metrics ADD CONSTRAINT daily_metrics_site_date_key UNIQUE (site_id, date);
+    """),
+    (3, "Table etl_watermarks (dernière période close chargée)", """
+    CREATE TABLE IF NOT EXISTS etl_watermarks (
+        source TEXT NOT NULL,
+        site_id INTEGER NOT NULL,
+        last_period DATE NOT NULL,
+        updated_at TIMESTAMP DEFAULT NOW(),
+        PRIMARY KEY (source, site_id)
+    );
+    """),
+]
+
+SCHEMA_VERSION = SCHEMA_MIGRATIONS[-1][0]
+
+def get_schema_version(conn) -> int:
+    """Version du schéma de la base (0 si jamais initialisée)"""
+    cursor = conn.cursor()
+    cursor.execute("SELECT to_regclass('schema_version') IS NOT NULL")
+    if not cursor.fetchone()[0]:
+        cursor.close()
+        return 0
+    cursor.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version")
+    version = cursor.fetchone()[0]
+    cursor.close()
+    return version
+
+def ensure_schema(conn):
+    """
+    Met le schéma à jour si besoin. Le DDL n'est exécuté qu'une fois par
+    base: les appels suivants se limitent à une lecture de version (et à
+    rien du tout une fois la base vérifiée dans ce processus).
     """
+    database_key = (DB_CONFIG['host'], DB_CONFIG['port'], DB_CONFIG['database'])
+    if database_key in _schema_checked:
+        return
     
     try:
-        cursor = conn.cursor()
-        cursor.execute(create_table_query)
-        conn.commit()
-        cursor.close()
-        logger.info("Table daily_metrics vérifiée/créée")
+        if get_schema_version(conn) < SCHEMA_VERSION:
+            cursor = conn.cursor()
+            # Verrou pour que deux processus ne migrent pas en même temps
+            cursor.execute("SELECT pg_advisory_xact_lock(hashtext('etl_schema_migration'))")
+            cursor.execute("""
+            CREATE TABLE IF NOT EXISTS schema_version (
+                version INTEGER PRIMARY KEY,
+                description TEXT,
+                applied_at TIMESTAMP DEFAULT NOW()
+            );
+            """)
+            cursor.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version")
+            current = cursor.fetchone()[0]
+            for version, description, migration_sql in SCHEMA_MIGRATIONS:
+                if version <= current:
+                    continue
+                cursor.execute(migration_sql)
+                cursor.execute(
+                    "INSERT INTO schema_version (version, description) VALUES (%s, %s)",
+                    (version, description)
+                )
+                logger.info(f"Migration {version} appliquée: {description}")
+            conn.commit()
+            cursor.close()
+        _schema_checked.add(database_key)
     except psycopg2.Error as e:
-        logger.error(f"Erreur création table: {e}")
+        logger.error(f"Erreur migration du schéma: {e}")
         conn.rollback()
         raise
 
+def create_table_if_not_exists(conn):
+    """Crée la table daily_metrics si elle n'existe pas"""
+    ensure_schema(conn)
+    logger.info("Table daily_metrics vérifiée/créée")
+
+# Colonnes chargées dans daily_metrics, dans l'ordre des requêtes d'insertion
+LOAD_COLUMNS = (
+    'site_id', 'date', 'visits', 'conversions', 'conversion_rate', 'actions',
+    'actions_per_visit', 'bounce_count', 'bounce_rate',
+    'total_time', 'avg_time_per_visit'
+)
+
+# Clause d'upsert commune aux chargements unitaire et en masse
+UPSERT_CLAUSE = """
+    ON CONFLICT (site_id, date) DO UPDATE SET
+        visits = EXCLUDED.visits,
+        conversions = EXCLUDED.conversions,
+        conversion_rate = EXCLUDED.conversion_rate,
+        actions = EXCLUDED.actions,
+        actions_per_visit = EXCLUDED.actions_per_visit,
+        bounce_count = EXCLUDED.bounce_count,
+        bounce_rate = EXCLUDED.bounce_rate,
+        total_time = EXCLUDED.total_time,
+        avg_time_per_visit = EXCLUDED.avg_time_per_visit,
+        created_at = NOW()
+"""
+
+# Nombre de lignes par envoi COPY / par page execute_values
+BULK_CHUNK_SIZE = 10000
+
+
+def record_values(data: Dict) -> tuple:
+    """Valeurs d'un enregistrement transformé, dans l'ordre de LOAD_COLUMNS"""
+    return tuple(data[column] for column in LOAD_COLUMNS)
+
+
 def load_to_database(conn, data: Dict) -> bool:
     """
     Charge les données transformées dans PostgreSQL
@@ -242,41 +634,15 @@ def load_to_database(conn, data: Dict) -> bool:
     """
     logger.info("LOAD: Chargement dans PostgreSQL...")
     
-    insert_query = """
-    INSERT INTO daily_metrics (
-        date, visits, conversions, conversion_rate, actions, 
-        actions_per_visit, bounce_count, bounce_rate, 
-        total_time, avg_time_per_visit
-    ) VALUES (
-        %s, %s, %s, %s, %s, %s, %s, %s, %s, %s
-    )
-    ON CONFLICT (date) DO UPDATE SET
-        visits = EXCLUDED.visits,
-        conversions = EXCLUDED.conversions,
-        conversion_rate = EXCLUDED.conversion_rate,
-        actions = EXCLUDED.actions,
-        actions_per_visit = EXCLUDED.actions_per_visit,
-        bounce_count = EXCLUDED.bounce_count,
-        bounce_rate = EXCLUDED.bounce_rate,
-        total_time = EXCLUDED.total_time,
-        avg_time_per_visit = EXCLUDED.avg_time_per_visit,
-        created_at = NOW();
+    insert_query = f"""
+    INSERT INTO daily_metrics ({', '.join(LOAD_COLUMNS)})
+    VALUES ({', '.join(['%s'] * len(LOAD_COLUMNS))})
+    {UPSERT_CLAUSE};
     """
     
     try:
         cursor = conn.cursor()
-        cursor.execute(insert_query, (
-            data['date'],
-            data['visits'],
-            data['conversions'],
-            data['conversion_rate'],
-            data['actions'],
-            data['actions_per_visit'],
-            data['bounce_count'],
-            data['bounce_rate'],
-            data['total_time'],
-            data['avg_time_per_visit']
-        ))
+        cursor.execute(insert_query, record_values(data))
         conn.commit()
         cursor.close()
         
@@ -288,88 +654,569 @@ def load_to_database(conn, data: Dict) -> bool:
         conn.rollback()
         return False
 
+def get_watermark(conn, source: str, site_id: int) -> Optional[datetime]:
+    """
+    Dernière période close chargée pour (source, site), None si jamais chargé
+    """
+    cursor = conn.cursor()
+    cursor.execute(
+        "SELECT last_period FROM etl_watermarks WHERE source = %s AND site_id = %s",
+        (source, site_id)
+    )
+    row = cursor.fetchone()
+    cursor.close()
+    if row is None:
+        return None
+    return datetime.combine(row[0], datetime.min.time())
+
+def _advance_watermark(cursor, source: str, site_id: int, period: datetime):
+    """Avance le watermark (jamais en arrière), dans la transaction en cours"""
+    cursor.execute("""
+    INSERT INTO etl_watermarks (source, site_id, last_period)
+    VALUES (%s, %s, %s)
+    ON CONFLICT (source, site_id) DO UPDATE SET
+        last_period = GREATEST(etl_watermarks.last_period, EXCLUDED.last_period),
+        updated_at = NOW();
+    """, (source, site_id, period.date()))
+
+def _copy_chunks(cursor, rows: Iterable[tuple], chunk_size: int) -> int:
+    """Envoie les lignes dans la table de staging par COPY, bloc par bloc"""
+    copy_query = (f"COPY daily_metrics_staging ({', '.join(LOAD_COLUMNS)}) "
+                  f"FROM STDIN WITH (FORMAT csv)")
+    total = 0
+    iterator = iter(rows)
+    while True:
+        chunk = list(itertools.islice(iterator, chunk_size))
+        if not chunk:
+            return total
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerows(chunk)
+        buffer.seek(0)
+        cursor.copy_expert(copy_query, buffer)
+        total += len(chunk)
+
+def load_many_to_database(conn, records, method: str = 'copy',
+                          chunk_size: int = BULK_CHUNK_SIZE,
+                          watermark: Optional[tuple] = None) -> int:
+    """
+    Charge un flux d'enregistrements transformés en une seule transaction
+    (backfills: plusieurs mois de données horaires/journalières)
+    
+    - 'copy': COPY vers une table de staging temporaire, puis un seul
+      INSERT ... SELECT ... ON CONFLICT ensembliste
+    - 'values': INSERT multi-lignes par pages via execute_values
+    
+    Si un même (site, date) apparaît plusieurs fois, le dernier enregistrement gagne
+    (comme avec des appels successifs à load_to_database).
+    
+    Args:
+        conn: Connexion PostgreSQL
+        records: Enregistrements issus de transform_data, ou DataFrame issu
+            de transform_batch
+        method: 'copy' ou 'values'
+        chunk_size: Lignes par envoi COPY / par page execute_values
+        watermark: (source, site_id, période) à enregistrer dans la même
+            transaction que les données
+        
+    Returns:
+        Nombre de (site, date) chargés (après dédoublonnage)
+    """
+    if method not in ('copy', 'values'):
+        raise ValueError(f"Méthode de chargement inconnue: {method}")
+    
+    logger.info(f"LOAD: Chargement en masse dans PostgreSQL ({method})...")
+    start_time = time.perf_counter()
+    if isinstance(records, pd.DataFrame):
+        rows = frame_rows(records)
+    else:
+        rows = (record_values(record) for record in records)
+    
+    try:
+        cursor = conn.cursor()
+        if method == 'copy':
+            cursor.execute("""
+            CREATE TEMP TABLE IF NOT EXISTS daily_metrics_staging (
+                seq BIGSERIAL,
+                site_id INTEGER NOT NULL,
+                date TIMESTAMP NOT NULL,
+                visits INTEGER,
+                conversions INTEGER,
+                conversion_rate DECIMAL(5,2),
+                actions INTEGER,
+                actions_per_visit DECIMAL(5,2),
+                bounce_count INTEGER,
+                bounce_rate DECIMAL(5,2),
+                total_time INTEGER,
+                avg_time_per_visit DECIMAL(10,2)
+            ) ON COMMIT DELETE ROWS;
+            """)
+            staged = _copy_chunks(cursor, rows, chunk_size)
+            cursor.execute(f"""
+            INSERT INTO daily_metrics ({', '.join(LOAD_COLUMNS)})
+            SELECT DISTINCT ON (site_id, date) {', '.join(LOAD_COLUMNS)}
+            FROM daily_metrics_staging
+            ORDER BY site_id, date, seq DESC
+            {UPSERT_CLAUSE};
+            """)
+            count = cursor.rowcount
+            logger.info(f"{staged} lignes en staging, {count} (site, date) distincts")
+        else:
+            # Dédoublonnage côté client: un INSERT ne peut pas mettre à jour
+            # deux fois la même ligne
+            latest = {}
+            for row in rows:
+                # site_id et date sont les deux premières colonnes
+                latest[row[:2]] = row
+            count = len(latest)
+            execute_values(
+                cursor,
+                f"INSERT INTO daily_metrics ({', '.join(LOAD_COLUMNS)}) VALUES %s {UPSERT_CLAUSE}",
+                list(latest.values()),
+                page_size=chunk_size
+            )
+        if watermark is not None:
+            _advance_watermark(cursor, *watermark)
+        conn.commit()
+        cursor.close()
+    except psycopg2.Error as e:
+        logger.error(f"Erreur chargement en masse: {e}")
+        conn.rollback()
+        raise
+    
+    duration = time.perf_counter() - start_time
+    rate = count / duration if duration > 0 else 0.0
+    logger.info(f"Chargement en masse terminé: {count} lignes en {duration:.2f}s ({rate:,.0f} lignes/s)")
+    return count
+
 # ============================================================================
 # PIPELINE PRINCIPAL
 # ============================================================================
 
-def run_etl_pipeline(use_simulated=True):
+def run_etl_pipeline(use_simulated=True, site_ids: Optional[List[int]] = None):
     """
     Exécute le pipeline ETL complet
     
+    Extract, transform et load tournent en étapes parallèles reliées par des
+    files bornées (un élément par site): l'extraction d'un site chevauche le
+    chargement du précédent.
+    
     Args:
         use_simulated: Si True, utilise des données simulées
+        site_ids: Sites Matomo (par défaut celui de MATOMO_CONFIG)
     """
     logger.info("=" * 70)
     logger.info("DÉMARRAGE DU PIPELINE ETL")
     logger.info("=" * 70)
     
-    start_time = datetime.now()
+    site_ids = site_ids or [int(MATOMO_CONFIG['site_id'])]
+    failed = []
+    totals = {'visits': 0, 'conversions': 0}
+    totals_lock = threading.Lock()
     
-    try:
-        # 1. EXTRACT
-        if use_simulated:
-            raw_data = extract_simulated_data()
-        else:
-            raw_data = extract_from_matomo_api()
-        
+    def extract(site_id):
+        raw_data = extract_simulated_data() if use_simulated else extract_from_matomo_api(site_id)
         if not raw_data:
-            logger.error("Échec de l'extraction, arrêt du pipeline")
-            return False
-        
-        # 2. TRANSFORM
-        transformed_data = transform_data(raw_data)
-        
-        # 3. LOAD
-        try:
-            conn = get_db_connection()
-            create_table_if_not_exists(conn)
-            success = load_to_database(conn, transformed_data)
-            conn.close()
-            
-            if not success:
-                return False
-                
-        except Exception as e:
-            logger.error(f"Erreur database: {e}")
+            logger.error(f"Échec de l'extraction du site {site_id}")
+            failed.append(site_id)
+            return None
+        return site_id, raw_data
+    
+    def transform(item):
+        site_id, raw_data = item
+        return site_id, transform_data(raw_data, site_id=site_id)
+    
+    def load(item):
+        site_id, transformed_data = item
+        with db_connection() as conn:
+            ensure_schema(conn)
+            if not load_to_database(conn, transformed_data):
+                failed.append(site_id)
+                return None
+        with totals_lock:
+            totals['visits'] += transformed_data['visits']
+            totals['conversions'] += transformed_data['conversions']
+        return site_id
+    
+    pipeline = StagedPipeline([
+        Stage('extract', extract, workers=min(BACKFILL_WORKERS, len(site_ids))),
+        Stage('transform', transform, workers=TRANSFORM_WORKERS),
+        Stage('load', load, workers=LOAD_WORKERS)
+    ])
+    try:
+        pipeline.run(site_ids)
+    except PipelineError as e:
+        logger.error(f"Erreur pipeline: {e}")
+        logger.exception("Détails de l'erreur:")
+        if isinstance(e.__cause__, psycopg2.Error):
             logger.info("NOTE: Assurez-vous que PostgreSQL est installé et configuré")
-            return False
-        
-        # Statistiques
-        duration = (datetime.now() - start_time).total_seconds()
-        
-        logger.info("=" * 70)
-        logger.info("PIPELINE ETL TERMINÉ AVEC SUCCÈS")
-        logger.info(f"Durée d'exécution: {duration:.2f}s")
-        logger.info(f"Métriques traitées:")
-        logger.info(f"   - Visites: {transformed_data['visits']}")
-        logger.info(f"   - Conversions: {transformed_data['conversions']} ({transformed_data['conversion_rate']}%)")
-        logger.info(f"   - Taux de rebond: {transformed_data['bounce_rate']}%")
-        logger.info("=" * 70)
-        
+        return False
+    
+    if failed:
+        logger.error(f"Pipeline en échec pour {len(failed)} site(s): {sorted(failed)}")
+        return False
+    
+    # Statistiques par étape
+    logger.info("=" * 70)
+    logger.info("PIPELINE ETL TERMINÉ AVEC SUCCÈS")
+    for line in pipeline.summary_lines():
+        logger.info(line)
+    logger.info(f"Métriques traitées ({len(site_ids)} site(s), {pipeline.wall_seconds:.2f}s):")
+    logger.info(f"   - Visites: {totals['visits']}")
+    logger.info(f"   - Conversions: {totals['conversions']}")
+    logger.info("=" * 70)
+    
+    return True
+
+_quiet_lock = threading.Lock()
+_quiet_state = {'depth': 0, 'level': logging.NOTSET}
+
+@contextmanager
+def quiet_logs():
+    """
+    Masque les logs INFO par enregistrement (backfills, chargements en masse).
+    Réentrant: des runs simultanés (démon) ne restaurent le niveau qu'à la
+    sortie du dernier.
+    """
+    with _quiet_lock:
+        if _quiet_state['depth'] == 0:
+            _quiet_state['level'] = logger.level
+            logger.setLevel(logging.WARNING)
+        _quiet_state['depth'] += 1
+    try:
+        yield
+    finally:
+        with _quiet_lock:
+            _quiet_state['depth'] -= 1
+            if _quiet_state['depth'] == 0:
+                logger.setLevel(_quiet_state['level'])
+
+def run_bulk_load(days: int, method: str = 'copy') -> bool:
+    """
+    Charge en masse `days` jours de données simulées (jusqu'à aujourd'hui),
+    pour tester load_many_to_database sur un PostgreSQL local
+    
+    Args:
+        days: Nombre de jours à générer
+        method: 'copy' ou 'values'
+    """
+    today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    # Les logs par jour noieraient la mesure de débit
+    with quiet_logs():
+        records = [
+            transform_data(extract_simulated_data(day), date=day)
+            for day in (today - timedelta(days=offset) for offset in range(days - 1, -1, -1))
+        ]
+    
+    try:
+        with db_connection() as conn:
+            ensure_schema(conn)
+            load_many_to_database(conn, records, method=method)
         return True
+    except Exception as e:
+        logger.error(f"Erreur database: {e}")
+        return False
+
+def _run_site_ranges(site_ranges: Dict[int, tuple], use_simulated: bool, workers: int,
+                     chunk_days: int, method: str, label: str,
+                     watermark_source: Optional[str] = None,
+                     cache: Optional[MatomoCache] = None,
+                     session: Optional[requests.Session] = None) -> bool:
+    """
+    Extrait, transforme et charge une plage de dates par site.
+    
+    Le travail est découpé en (site, période de `chunk_days` jours), chaque
+    période étant extraite en une requête Matomo. Les trois étapes tournent
+    en parallèle (StagedPipeline): `workers` extractions sur une session HTTP
+    partagée, TRANSFORM_WORKERS transformations vectorisées et LOAD_WORKERS
+    chargements sur des connexions du pool. Une période en échec est notée
+    et n'arrête pas les autres. Avec `cache`, les réponses Matomo sont lues
+    et enregistrées dans le cache disque (seulement lues en mode replay).
+    Une `session` fournie par l'appelant (démon) est réutilisée et n'est
+    pas fermée.
+    
+    Avec `watermark_source`, le watermark du site avance dans la transaction
+    de chargement, jusqu'à la fin de la suite continue de périodes chargées
+    depuis le début de sa plage (une période en échec bloque l'avancée) et
+    jamais au-delà d'hier: le jour en cours reste ouvert.
+    
+    Returns:
+        True si toutes les périodes ont été chargées
+    """
+    chunks_by_site = {
+        site_id: split_date_range(start, end, chunk_days)
+        for site_id, (start, end) in site_ranges.items()
+    }
+    tasks = [
+        (site_id, index)
+        for site_id, chunks in chunks_by_site.items()
+        for index in range(len(chunks))
+    ]
+    logger.info("=" * 70)
+    logger.info(f"{label}: {len(site_ranges)} site(s), {len(tasks)} requêtes, {workers} workers")
+    for site_id, (start, end) in site_ranges.items():
+        logger.info(f"   - site {site_id}: {start:%Y-%m-%d} -> {end:%Y-%m-%d}")
+    logger.info("=" * 70)
+    
+    replay = cache is not None and cache.replay
+    own_session = session is None and not (use_simulated or replay or not tasks)
+    if own_session:
+        session = create_matomo_session(workers)
+    last_closed = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=1)
+    # Périodes chargées et première période non chargée, par site
+    state_lock = threading.Lock()
+    done = {site_id: set() for site_id in chunks_by_site}
+    next_index = dict.fromkeys(chunks_by_site, 0)
+    failed = []
+    loaded = [0]
+    
+    def fail(site_id, index, error):
+        chunk_start, chunk_end = chunks_by_site[site_id][index]
+        logger.error(f"Période {chunk_start:%Y-%m-%d}..{chunk_end:%Y-%m-%d} "
+                     f"du site {site_id} en échec: {error}")
+        with state_lock:
+            failed.append((site_id, chunk_start, chunk_end))
+    
+    def extract(task):
+        site_id, index = task
+        chunk_start, chunk_end = chunks_by_site[site_id][index]
+        try:
+            if use_simulated:
+                return site_id, index, extract_simulated_range(site_id, chunk_start, chunk_end)
+            return site_id, index, extract_matomo_range(session, site_id, chunk_start, chunk_end,
+                                                        cache=cache)
+        except (requests.RequestException, ValueError, CacheMissError) as e:
+            fail(site_id, index, e)
+            return None
+    
+    def transform(item):
+        site_id, index, periods = item
+        try:
+            return site_id, index, transform_batch(
+                raw_frame([raw for _, raw in periods]),
+                dates=[day for day, _ in periods], site_id=site_id
+            )
+        except (ValueError, KeyError, TypeError) as e:
+            fail(site_id, index, e)
+            return None
+    
+    def load(item):
+        site_id, index, records = item
+        chunk_start = chunks_by_site[site_id][index][0]
+        watermark = None
+        with state_lock:
+            if watermark_source and index == next_index[site_id]:
+                # Fin de la suite continue de périodes une fois celle-ci chargée
+                last = index
+                while last + 1 in done[site_id]:
+                    last += 1
+                period_end = min(chunks_by_site[site_id][last][1], last_closed)
+                if period_end >= chunk_start:
+                    watermark = (watermark_source, site_id, period_end)
+        try:
+            with db_connection() as conn:
+                count = load_many_to_database(conn, records, method=method, watermark=watermark)
+        except psycopg2.Error as e:
+            fail(site_id, index, e)
+            return None
+        with state_lock:
+            loaded[0] += count
+            done[site_id].add(index)
+            while next_index[site_id] in done[site_id]:
+                next_index[site_id] += 1
+        return count
+    
+    pipeline = StagedPipeline([
+        Stage('extract', extract, workers=workers),
+        Stage('transform', transform, workers=TRANSFORM_WORKERS),
+        Stage('load', load, workers=LOAD_WORKERS)
+    ])
+    try:
+        with db_connection() as conn:
+            ensure_schema(conn)
+        with quiet_logs():
+            pipeline.run(tasks)
+    except (PipelineError, psycopg2.Error) as e:
+        logger.error(f"Erreur {label.lower()}: {e}")
+        return False
+    finally:
+        if own_session:
+            session.close()
+    
+    duration = pipeline.wall_seconds
+    logger.info("=" * 70)
+    logger.info(f"{label} TERMINÉ: {loaded[0]} jours chargés en {duration:.2f}s "
+                f"({loaded[0] / duration if duration > 0 else 0:,.0f} jours/s)")
+    for line in pipeline.summary_lines():
+        logger.info(line)
+    if cache is not None:
+        logger.info(f"Cache Matomo{' (replay)' if replay else ''}: {cache.stats()}")
+    if failed:
+        logger.error(f"{len(failed)} période(s) en échec, à relancer:")
+        for site_id, chunk_start, chunk_end in failed:
+            logger.error(f"   - site {site_id}: {chunk_start:%Y-%m-%d} -> {chunk_end:%Y-%m-%d}")
+    logger.info("=" * 70)
+    return not failed
+
+def run_backfill(start: datetime, end: datetime, site_ids: List[int],
+                 use_simulated: bool = False, workers: int = BACKFILL_WORKERS,
+                 chunk_days: int = BACKFILL_CHUNK_DAYS, method: str = 'copy',
+                 cache: Optional[MatomoCache] = None) -> bool:
+    """
+    Reconstruit l'historique de plusieurs sites sur une plage de dates
+    (les watermarks ne sont pas modifiés)
+    
+    Args:
+        start: Premier jour (inclus)
+        end: Dernier jour (inclus)
+        site_ids: Sites Matomo à reconstruire
+        use_simulated: Si True, utilise des données simulées
+        workers: Requêtes Matomo en parallèle
+        chunk_days: Jours par requête
+        method: Méthode de load_many_to_database ('copy' ou 'values')
+        cache: Cache des réponses Matomo (optionnel)
+        
+    Returns:
+        True si toutes les périodes ont été chargées
+    """
+    return _run_site_ranges(
+        {site_id: (start, end) for site_id in site_ids},
+        use_simulated, workers, chunk_days, method, label='BACKFILL', cache=cache
+    )
+
+def run_incremental(site_ids: List[int], use_simulated: bool = False,
+                    since: Optional[datetime] = None, workers: int = BACKFILL_WORKERS,
+                    chunk_days: int = BACKFILL_CHUNK_DAYS, method: str = 'copy',
+                    cache: Optional[MatomoCache] = None,
+                    session: Optional[requests.Session] = None) -> bool:
+    """
+    Run incrémental: pour chaque site, extrait les jours qui suivent son
+    watermark (dernier jour clos chargé) jusqu'à aujourd'hui inclus. Le jour
+    en cours est rechargé à chaque run tant qu'il n'est pas clos.
+    
+    Args:
+        site_ids: Sites Matomo
+        use_simulated: Si True, utilise des données simulées
+        since: Premier jour pour un site sans watermark (par défaut aujourd'hui)
+        workers: Requêtes Matomo en parallèle (rattrapage après une interruption)
+        chunk_days: Jours par requête
+        method: Méthode de load_many_to_database ('copy' ou 'values')
+        cache: Cache des réponses Matomo (optionnel)
+        session: Session HTTP à réutiliser (optionnel)
         
+    Returns:
+        True si toutes les périodes ont été chargées
+    """
+    source = 'simulated' if use_simulated else 'matomo'
+    today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    
+    try:
+        with db_connection() as conn:
+            ensure_schema(conn)
+            watermarks = {site_id: get_watermark(conn, source, site_id) for site_id in site_ids}
     except Exception as e:
-        logger.error(f"Erreur pipeline: {e}")
-        logger.exception("Détails de l'erreur:")
+        logger.error(f"Erreur database: {e}")
         return False
+    
+    site_ranges = {}
+    for site_id, last_period in watermarks.items():
+        start = last_period + timedelta(days=1) if last_period else (since or today)
+        site_ranges[site_id] = (min(start, today), today)
+    
+    return _run_site_ranges(site_ranges, use_simulated, workers, chunk_days, method,
+                            label='RUN INCRÉMENTAL', watermark_source=source, cache=cache,
+                            session=session)
 
 # ============================================================================
 # POINT D'ENTRÉE
 # ============================================================================
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Pipeline ETL Matomo -> PostgreSQL")
+    parser.add_argument('--bulk-days', type=int, default=0,
+                        help="Charge N jours simulés en masse au lieu du run horaire")
+    parser.add_argument('--bulk-method', choices=('copy', 'values'), default='copy',
+                        help="COPY + staging ou INSERT multi-lignes (execute_values)")
+    parser.add_argument('--backfill', nargs=2, metavar=('DEBUT', 'FIN'),
+                        help="Reconstruit l'historique entre deux dates AAAA-MM-JJ")
+    parser.add_argument('--sites', default=MATOMO_CONFIG['site_id'],
+                        help="Sites Matomo, séparés par des virgules")
+    parser.add_argument('--workers', type=int, default=BACKFILL_WORKERS,
+                        help="Requêtes Matomo en parallèle pendant le backfill")
+    parser.add_argument('--chunk-days', type=int, default=BACKFILL_CHUNK_DAYS,
+                        help="Jours par requête Matomo pendant le backfill")
+    parser.add_argument('--incremental', action='store_true',
+                        help="Charge les jours qui suivent le watermark de chaque site, jour en cours compris")
+    parser.add_argument('--since', default=None,
+                        help="Premier jour (AAAA-MM-JJ) d'un site sans watermark en mode incrémental")
+    parser.add_argument('--transform-workers', type=int, default=TRANSFORM_WORKERS,
+                        help="Workers de l'étape transform")
+    parser.add_argument('--load-workers', type=int, default=LOAD_WORKERS,
+                        help="Workers de l'étape load (connexions du pool)")
+    parser.add_argument('--cache-dir', default=MATOMO_CACHE_DIR,
+                        help="Répertoire du cache des réponses Matomo")
+    parser.add_argument('--no-cache', action='store_true',
+                        help="Désactive le cache des réponses Matomo")
+    parser.add_argument('--replay', action='store_true',
+                        help="Rejoue transform + load depuis le cache seul (aucun appel réseau)")
+    parser.add_argument('--api', action='store_true',
+                        help="Backfill / run incrémental depuis l'API Matomo (sinon données simulées)")
+    args = parser.parse_args()
+    TRANSFORM_WORKERS = max(1, args.transform_workers)
+    LOAD_WORKERS = max(1, args.load_workers)
+    if args.replay:
+        # Le replay relit des réponses de l'API
+        args.api = True
+    cache = None
+    if args.api and (args.replay or not args.no_cache):
+        cache = MatomoCache(args.cache_dir, max_bytes=MATOMO_CACHE_MAX_MB * 1024 * 1024,
+                            open_ttl=MATOMO_CACHE_OPEN_TTL, replay=args.replay)
+    
     print("\nConfiguration:")
-    print(f"   - Mode: Données simulées (pas d'API réelle)")
+    if (args.backfill or args.incremental) and args.replay:
+        print(f"   - Mode: Replay du cache Matomo ({args.cache_dir})")
+    elif (args.backfill or args.incremental) and args.api:
+        print(f"   - Mode: API Matomo ({MATOMO_CONFIG['url']})")
+    else:
+        print(f"   - Mode: Données simulées (pas d'API réelle)")
     print(f"   - Database: {DB_CONFIG['database']}@{DB_CONFIG['host']}")
     print()
     
     # Exécuter le pipeline
-    success = run_etl_pipeline(use_simulated=True)
+    if args.backfill:
+        success = run_backfill(
+            datetime.strptime(args.backfill[0], '%Y-%m-%d'),
+            datetime.strptime(args.backfill[1], '%Y-%m-%d'),
+            [int(site_id) for site_id in args.sites.split(',') if site_id.strip()],
+            use_simulated=not args.api,
+            workers=max(1, args.workers),
+            chunk_days=max(1, args.chunk_days),
+            method=args.bulk_method,
+            cache=cache
+        )
+    elif args.incremental:
+        success = run_incremental(
+            [int(site_id) for site_id in args.sites.split(',') if site_id.strip()],
+            use_simulated=not args.api,
+            since=datetime.strptime(args.since, '%Y-%m-%d') if args.since else None,
+            workers=max(1, args.workers),
+            chunk_days=max(1, args.chunk_days),
+            method=args.bulk_method,
+            cache=cache
+        )
+    elif args.bulk_days > 0:
+        success = run_bulk_load(args.bulk_days, method=args.bulk_method)
+    else:
+        success = run_etl_pipeline(
+            use_simulated=True,
+            site_ids=[int(site_id) for site_id in args.sites.split(',') if site_id.strip()]
+        )
     
     if success:
         print("\nPipeline exécuté avec succès!")
         print("NOTE: Pour automatiser:")
-        print("   Linux/Mac: Ajouter à crontab: 0 * * * * python etl_pipeline.py")
+        print("   Démon résident (recommandé): python etl_scheduler.py --job 1:60 --api")
+        print("   Linux/Mac: Ajouter à crontab: 0 * * * * python etl_pipeline.py --incremental")
         print("   Windows: Créer une tâche dans Task Scheduler")
     else:
         print("\nLe pipeline a échoué. Vérifiez les logs.")
@@ -0,0 +1,373 @@
+"""
+TP03 - Partie 2: Démon de planification du pipeline ETL
+Auteur: - Soukaina El Hadifi
+        - Mohamed-Saber El guelta
+
+Remplace le lancement par cron (un interpréteur, des imports et des
+connexions neufs à chaque exécution) par un processus résident:
+- pool PostgreSQL, session HTTP Matomo et cache restent chauds entre deux runs
+- un job incrémental par site, chacun avec sa propre période
+- jamais deux exécutions simultanées d'un même job: une échéance qui tombe
+  pendant un run en cours est sautée (et comptée)
+- rattrapage: l'état (dernier run de chaque job) est persisté; au
+  redémarrage, un job en retard est exécuté immédiatement, une seule fois,
+  les intervalles manqués étant couverts par le watermark du run incrémental
+- statut de chaque job (dernier statut, durée, erreur, compteurs) dans le
+  fichier d'état, via --status ou en JSON sur GET /status
+
+Usage:
+    python etl_scheduler.py --job 1:60 --job 2:15 --api --status-port 8090
+    python etl_scheduler.py --status
+"""
+
+import argparse
+import json
+import logging
+import os
+import signal
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+STATE_FILE = os.getenv('ETL_SCHEDULER_STATE', 'etl_scheduler_state.json')
+MAX_CONCURRENT_JOBS = 4
+
+
+def _timestamp(value):
+    return datetime.fromtimestamp(value).strftime('%Y-%m-%d %H:%M:%S') if value else None
+
+
+class ScheduledJob:
+    """
+    Job exécuté toutes les `interval` secondes.
+
+    Args:
+        name (str): Identifiant du job (clé du fichier d'état)
+        interval (float): Période (s)
+        func (callable): Exécution du job, renvoie True si succès
+    """
+
+    def __init__(self, name, interval, func):
+        self.name = name
+        self.interval = max(1.0, interval)
+        self.func = func
+        self.next_run = 0.0
+        self.running = False
+        self.last_started = None
+        self.last_finished = None
+        self.last_duration = None
+        self.last_status = None
+        self.last_error = None
+        self.last_success = None
+        self.runs = 0
+        self.failures = 0
+        self.skipped_overlaps = 0
+        self.missed_intervals = 0
+
+    def as_dict(self):
+        return {
+            'interval_s': self.interval,
+            'running': self.running,
+            'next_run': _timestamp(self.next_run),
+            'last_started': _timestamp(self.last_started),
+            'last_finished': _timestamp(self.last_finished),
+            'last_duration_s': round(self.last_duration, 3) if self.last_duration is not None else None,
+            'last_status': self.last_status,
+            'last_error': self.last_error,
+            'last_success': _timestamp(self.last_success),
+            'runs': self.runs,
+            'failures': self.failures,
+            'skipped_overlaps': self.skipped_overlaps,
+            'missed_intervals': self.missed_intervals,
+            # Valeurs brutes relues au redémarrage
+            '_last_started_ts': self.last_started,
+            '_last_success_ts': self.last_success
+        }
+
+
+class EtlScheduler:
+    """
+    Planificateur résident.
+
+    Args:
+        jobs (list): Jobs (ScheduledJob)
+        state_file (str): Fichier JSON d'état (rattrapage et statut)
+        max_concurrent (int): Jobs exécutés en même temps au plus
+        logger: Logger du pipeline
+    """
+
+    def __init__(self, jobs, state_file=STATE_FILE, max_concurrent=MAX_CONCURRENT_JOBS, logger=None):
+        self.jobs = {job.name: job for job in jobs}
+        self.state_file = state_file
+        self.logger = logger
+        self.started = time.time()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._wakeup = threading.Event()
+        self._executor = ThreadPoolExecutor(max_workers=max(1, max_concurrent),
+                                            thread_name_prefix='etl-job')
+        self._restore_state()
+
+    def _log(self, level, message):
+        if self.logger is not None:
+            getattr(self.logger, level)(message)
+
+    def _restore_state(self):
+        """Planifie chaque job d'après son dernier run (rattrapage après un arrêt)."""
+        previous = {}
+        if self.state_file and os.path.exists(self.state_file):
+            try:
+                with open(self.state_file, 'r', encoding='utf-8') as f:
+                    previous = json.load(f).get('jobs', {})
+            except (OSError, ValueError) as e:
+                self._log('warning', f"État du planificateur illisible ({e}), redémarrage à zéro")
+
+        now = time.time()
+        for name, job in self.jobs.items():
+            state = previous.get(name, {})
+            job.last_started = state.get('_last_started_ts')
+            job.last_success = state.get('_last_success_ts')
+            job.last_status = state.get('last_status')
+            job.last_duration = state.get('last_duration_s')
+            job.runs = state.get('runs', 0)
+            job.failures = state.get('failures', 0)
+            if job.last_started is None:
+                job.next_run = now
+                continue
+            due = job.last_started + job.interval
+            if due <= now:
+                missed = int((now - due) // job.interval) + 1
+                job.missed_intervals += missed
+                self._log('info', f"Job {name}: {missed} échéance(s) manquée(s) pendant l'arrêt, "
+                                  f"rattrapage immédiat")
+                job.next_run = now
+            else:
+                job.next_run = due
+
+    def save_state(self):
+        """Écrit l'état de tous les jobs (écriture atomique)."""
+        if not self.state_file:
+            return
+        with self._lock:
+            state = {
+                'updated_at': _timestamp(time.time()),
+                'started_at': _timestamp(self.started),
+                'jobs': {name: job.as_dict() for name, job in self.jobs.items()}
+            }
+        tmp_file = f'{self.state_file}.tmp'
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(state, f, indent=2, ensure_ascii=False)
+        os.replace(tmp_file, self.state_file)
+
+    def status(self):
+        """Statut de chaque job (sans les champs internes)."""
+        with self._lock:
+            return {
+                name: {key: value for key, value in job.as_dict().items() if not key.startswith('_')}
+                for name, job in self.jobs.items()
+            }
+
+    def _execute(self, job):
+        start = time.time()
+        status, error = 'error', None
+        try:
+            status = 'success' if job.func() else 'failed'
+        except Exception as e:
+            error = f'{type(e).__name__}: {e}'
+            self._log('error', f"Job {job.name} en erreur: {error}")
+        duration = time.time() - start
+
+        with self._lock:
+            job.running = False
+            job.runs += 1
+            job.last_finished = time.time()
+            job.last_duration = duration
+            job.last_status = status
+            job.last_error = error
+            if status == 'success':
+                job.last_success = start
+            else:
+                job.failures += 1
+        self._log('info', f"Job {job.name}: {status} en {duration:.2f}s")
+        self.save_state()
+        self._wakeup.set()
+
+    def _dispatch(self, now):
+        """Lance les jobs arrivés à échéance et calcule leur prochaine échéance."""
+        for job in self.jobs.values():
+            if job.next_run > now:
+                continue
+            # Prochaine échéance alignée sur la grille du job; les échéances
+            # déjà dépassées (machine en veille, run trop long) sont regroupées
+            late = int((now - job.next_run) // job.interval)
+            if late:
+                job.missed_intervals += late
+            job.next_run += (late + 1) * job.interval
+
+            with self._lock:
+                if job.running:
+                    job.skipped_overlaps += 1
+                    skip = True
+                else:
+                    job.running = True
+                    job.last_started = now
+                    skip = False
+            if skip:
+                self._log('warning', f"Job {job.name} encore en cours, échéance sautée")
+                continue
+            self._executor.submit(self._execute, job)
+
+    def run_forever(self):
+        """Boucle principale, jusqu'à stop(); attend la fin des jobs en cours."""
+        self._log('info', f"Planificateur démarré: {len(self.jobs)} job(s)")
+        self.save_state()
+        while not self._stop.is_set():
+            now = time.time()
+            self._dispatch(now)
+            next_due = min(job.next_run for job in self.jobs.values())
+            # Réveil au plus tard à la prochaine échéance (ou à la fin d'un job)
+            self._wakeup.wait(max(0.0, min(next_due - time.time(), 60.0)))
+            self._wakeup.clear()
+        self._log('info', "Arrêt du planificateur: attente des jobs en cours...")
+        self._executor.shutdown(wait=True)
+        self.save_state()
+
+    def stop(self):
+        self._stop.set()
+        self._wakeup.set()
+
+
+class StatusHandler(BaseHTTPRequestHandler):
+    """GET /status: statut des jobs en JSON."""
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.rstrip('/') != '/status':
+            self.send_error(404)
+            return
+        body = json.dumps(self.server.scheduler.status(), indent=2, ensure_ascii=False).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def start_status_server(scheduler, port, host='127.0.0.1'):
+    """Expose le statut des jobs sur http://host:port/status (thread dédié)."""
+    server = ThreadingHTTPServer((host, port), StatusHandler)
+    server.daemon_threads = True
+    server.scheduler = scheduler
+    threading.Thread(target=server.serve_forever, name='etl-status', daemon=True).start()
+    return server
+
+
+def parse_job(value):
+    """'SITE:MINUTES' -> (site_id, intervalle en secondes)."""
+    try:
+        site_id, minutes = value.split(':')
+        return int(site_id), float(minutes) * 60
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Job invalide '{value}' (attendu SITE:MINUTES)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Démon de planification du pipeline ETL")
+    parser.add_argument('--job', action='append', type=parse_job, default=[],
+                        help="Job incrémental SITE:MINUTES (répétable), par défaut le site configuré toutes les 60 min")
+    parser.add_argument('--api', action='store_true', help="API Matomo (sinon données simulées)")
+    parser.add_argument('--state-file', default=STATE_FILE, help="Fichier d'état des jobs")
+    parser.add_argument('--max-concurrent', type=int, default=MAX_CONCURRENT_JOBS,
+                        help="Runs simultanés au plus; chacun utilise ETL_LOAD_WORKERS + 1 connexions "
+                             "du pool (DB_POOL_MAX)")
+    parser.add_argument('--status-port', type=int, default=0,
+                        help="Port HTTP du statut (GET /status), 0 = désactivé")
+    parser.add_argument('--no-cache', action='store_true', help="Désactive le cache Matomo")
+    parser.add_argument('--status', action='store_true',
+                        help="Affiche le statut enregistré des jobs et quitte")
+    args = parser.parse_args()
+
+    if args.status:
+        if not os.path.exists(args.state_file):
+            print(f"Aucun état enregistré ({args.state_file})")
+            return 1
+        with open(args.state_file, 'r', encoding='utf-8') as f:
+            state = json.load(f)
+        print(f"État au {state.get('updated_at')} (démarré le {state.get('started_at')})")
+        for name, job in state.get('jobs', {}).items():
+            print(f"  {name:<12} {job['last_status'] or '-':<8} durée={job['last_duration_s']}s "
+                  f"dernier={job['last_started']} prochain={job['next_run']} "
+                  f"runs={job['runs']} échecs={job['failures']} sautés={job['skipped_overlaps']}")
+        return 0
+
+    # Imports lourds (pandas, psycopg2, requests) faits une seule fois
+    import etl_pipeline
+    from matomo_cache import MatomoCache
+
+    job_specs = args.job or [(int(etl_pipeline.MATOMO_CONFIG['site_id']), 3600.0)]
+    # Un job par site: deux entrées partageraient le même nom dans l'état
+    site_ids = [site_id for site_id, _ in job_specs]
+    duplicates = sorted({site_id for site_id in site_ids if site_ids.count(site_id) > 1})
+    if duplicates:
+        parser.error(f"--job répété pour le(s) site(s) {', '.join(map(str, duplicates))}")
+    # Chaque run emprunte jusqu'à LOAD_WORKERS + 1 connexions (chargements +
+    # watermark/migration), et getconn échoue au lieu d'attendre si le pool
+    # est vide. Un job ne tournant jamais deux fois en même temps, au plus
+    # min(--max-concurrent, nombre de jobs) runs sont simultanés.
+    concurrent_runs = min(max(1, args.max_concurrent), len(job_specs))
+    connections = concurrent_runs * (etl_pipeline.LOAD_WORKERS + 1)
+    if connections > etl_pipeline.DB_POOL_MAX:
+        parser.error(f"{concurrent_runs} run(s) simultané(s) x (ETL_LOAD_WORKERS={etl_pipeline.LOAD_WORKERS} + 1) "
+                     f"= {connections} connexions > DB_POOL_MAX={etl_pipeline.DB_POOL_MAX}: "
+                     f"réduire --max-concurrent ou augmenter DB_POOL_MAX")
+
+    cache = None
+    session = None
+    if args.api:
+        session = etl_pipeline.create_matomo_session()
+        if not args.no_cache:
+            cache = MatomoCache(etl_pipeline.MATOMO_CACHE_DIR,
+                                max_bytes=etl_pipeline.MATOMO_CACHE_MAX_MB * 1024 * 1024,
+                                open_ttl=etl_pipeline.MATOMO_CACHE_OPEN_TTL)
+
+    def make_job(site_id, interval):
+        def run():
+            return etl_pipeline.run_incremental(
+                [site_id], use_simulated=not args.api, cache=cache, session=session
+            )
+        return ScheduledJob(f'site-{site_id}', interval, run)
+
+    # Logger dédié, à niveau fixe: les logs du planificateur restent visibles
+    # pendant qu'un run masque les logs INFO du pipeline (quiet_logs)
+    logger = etl_pipeline.logger.getChild('scheduler')
+    logger.setLevel(logging.INFO)
+
+    scheduler = EtlScheduler([make_job(site_id, interval) for site_id, interval in job_specs],
+                             state_file=args.state_file, max_concurrent=args.max_concurrent,
+                             logger=logger)
+
+    status_server = None
+    if args.status_port:
+        status_server = start_status_server(scheduler, args.status_port)
+        logger.info(f"Statut des jobs: http://127.0.0.1:{args.status_port}/status")
+
+    signal.signal(signal.SIGINT, lambda *_: scheduler.stop())
+    signal.signal(signal.SIGTERM, lambda *_: scheduler.stop())
+    try:
+        scheduler.run_forever()
+    finally:
+        if status_server is not None:
+            status_server.shutdown()
+        if session is not None:
+            session.close()
+        etl_pipeline.close_connection_pool()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
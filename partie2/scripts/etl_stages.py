@@ -0,0 +1,247 @@
+"""
+TP03 - Partie 2: Exécuteur de pipeline par étapes
+Auteur: - Soukaina El Hadifi
+        - Mohamed-Saber El guelta
+
+Enchaîne des étapes (extract -> transform -> load) reliées par des files
+bornées, chaque étape ayant son propre nombre de workers:
+- les étapes se chevauchent: le réseau et la base travaillent en même temps
+- contre-pression: une étape lente remplit sa file d'entrée, ce qui bloque
+  l'étape précédente au lieu de faire grossir la mémoire
+- une exception dans n'importe quel worker arrête proprement tout le
+  pipeline (threads terminés) et remonte à l'appelant en PipelineError
+- métriques par étape: éléments traités, temps occupé, débit et profondeur
+  de la file d'entrée (échantillonnée)
+"""
+
+import queue
+import threading
+import time
+
+QUEUE_SIZE = 16
+
+# Marqueur de fin de flux
+_END = object()
+
+
+class PipelineError(RuntimeError):
+    """Une étape a échoué; l'exception d'origine est dans __cause__."""
+
+    def __init__(self, stage, error):
+        super().__init__(f"Étape '{stage}' en échec: {error}")
+        self.stage = stage
+
+
+class Stage:
+    """
+    Étape du pipeline.
+
+    Args:
+        name (str): Nom (logs et métriques)
+        func (callable): Traite un élément et renvoie le résultat transmis à
+            l'étape suivante (None = rien à transmettre)
+        workers (int): Threads de l'étape
+        queue_size (int): Taille de la file d'entrée de l'étape
+    """
+
+    def __init__(self, name, func, workers=1, queue_size=QUEUE_SIZE):
+        self.name = name
+        self.func = func
+        self.workers = max(1, workers)
+        self.queue_size = max(1, queue_size)
+
+
+class StageMetrics:
+    """Compteurs d'une étape (thread-safe)."""
+
+    def __init__(self, stage):
+        self.stage = stage
+        self._lock = threading.Lock()
+        self.processed = 0
+        self.emitted = 0
+        self.busy_seconds = 0.0
+        self.depth_max = 0
+        self._depth_sum = 0
+        self._depth_samples = 0
+
+    def add(self, seconds, emitted):
+        with self._lock:
+            self.processed += 1
+            self.busy_seconds += seconds
+            if emitted:
+                self.emitted += 1
+
+    def sample_depth(self, depth):
+        self.depth_max = max(self.depth_max, depth)
+        self._depth_sum += depth
+        self._depth_samples += 1
+
+    def summary(self, wall_seconds):
+        """Résumé sérialisable en JSON."""
+        depth_avg = self._depth_sum / self._depth_samples if self._depth_samples else 0.0
+        return {
+            'workers': self.stage.workers,
+            'processed': self.processed,
+            'emitted': self.emitted,
+            'busy_s': round(self.busy_seconds, 3),
+            'throughput': round(self.processed / wall_seconds, 1) if wall_seconds > 0 else 0.0,
+            # Part du temps où les workers de l'étape étaient occupés
+            'utilization': round(self.busy_seconds / (wall_seconds * self.stage.workers), 3)
+            if wall_seconds > 0 else 0.0,
+            'queue_size': self.stage.queue_size,
+            'queue_depth_max': self.depth_max,
+            'queue_depth_avg': round(depth_avg, 2)
+        }
+
+
+class StagedPipeline:
+    """
+    Exécute une suite d'étapes sur un flux d'éléments.
+
+    Args:
+        stages (list): Étapes (Stage), dans l'ordre
+        sample_interval (float): Période d'échantillonnage des files (s)
+
+    Attributes:
+        results (list): Résultats non nuls de la dernière étape
+        wall_seconds (float): Durée du dernier run
+    """
+
+    def __init__(self, stages, sample_interval=0.05):
+        if not stages:
+            raise ValueError("Le pipeline doit contenir au moins une étape")
+        self.stages = stages
+        self.sample_interval = sample_interval
+        self.metrics = [StageMetrics(stage) for stage in stages]
+        self.results = []
+        self.wall_seconds = 0.0
+        self._queues = [queue.Queue(maxsize=stage.queue_size) for stage in stages]
+        self._stop = threading.Event()
+        self._error = None
+        self._error_lock = threading.Lock()
+        self._results_lock = threading.Lock()
+        self._remaining_workers = [stage.workers for stage in stages]
+
+    def _put(self, target, item):
+        # put() interruptible si une autre étape a échoué
+        while not self._stop.is_set():
+            try:
+                target.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _get(self, source):
+        # get() interruptible: renvoie _END si le pipeline est arrêté
+        while not self._stop.is_set():
+            try:
+                return source.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        return _END
+
+    def _fail(self, stage, error):
+        with self._error_lock:
+            if self._error is None:
+                self._error = (stage.name, error)
+        self._stop.set()
+
+    def _feed(self, items):
+        try:
+            for item in items:
+                if not self._put(self._queues[0], item):
+                    return
+        except Exception as e:
+            self._fail(Stage('source', None), e)
+        finally:
+            self._put(self._queues[0], _END)
+
+    def _work(self, index):
+        stage = self.stages[index]
+        metrics = self.metrics[index]
+        source = self._queues[index]
+        target = self._queues[index + 1] if index + 1 < len(self.stages) else None
+        try:
+            while True:
+                item = self._get(source)
+                if item is _END:
+                    # Le marqueur est remis pour les autres workers de l'étape
+                    self._put(source, _END)
+                    break
+                start = time.perf_counter()
+                result = stage.func(item)
+                metrics.add(time.perf_counter() - start, result is not None)
+                if result is None:
+                    continue
+                if target is None:
+                    with self._results_lock:
+                        self.results.append(result)
+                elif not self._put(target, result):
+                    break
+        except Exception as e:
+            self._fail(stage, e)
+        finally:
+            with self._error_lock:
+                self._remaining_workers[index] -= 1
+                last_worker = self._remaining_workers[index] == 0
+            # Le dernier worker de l'étape signale la fin à l'étape suivante
+            if last_worker and target is not None:
+                self._put(target, _END)
+
+    def run(self, items):
+        """
+        Fait passer `items` dans toutes les étapes.
+
+        Returns:
+            list: Résultats non nuls de la dernière étape
+
+        Raises:
+            PipelineError: Si une étape (ou la source) a levé une exception
+        """
+        start = time.perf_counter()
+        threads = [threading.Thread(target=self._feed, args=(items,), name='pipeline-source', daemon=True)]
+        for index, stage in enumerate(self.stages):
+            threads += [
+                threading.Thread(target=self._work, args=(index,),
+                                 name=f'pipeline-{stage.name}-{n}', daemon=True)
+                for n in range(stage.workers)
+            ]
+        for thread in threads:
+            thread.start()
+
+        workers = threads[1:]
+        while any(thread.is_alive() for thread in workers):
+            for metrics, stage_queue in zip(self.metrics, self._queues):
+                metrics.sample_depth(stage_queue.qsize())
+            time.sleep(self.sample_interval)
+        # La source peut être bloquée sur une file pleine si le pipeline s'est arrêté
+        self._stop.set()
+        threads[0].join()
+        self.wall_seconds = time.perf_counter() - start
+
+        if self._error is not None:
+            stage_name, error = self._error
+            raise PipelineError(stage_name, error) from error
+        return self.results
+
+    def summary(self):
+        """Métriques par étape du dernier run."""
+        return {
+            'wall_s': round(self.wall_seconds, 3),
+            'stages': {
+                metrics.stage.name: metrics.summary(self.wall_seconds) for metrics in self.metrics
+            }
+        }
+
+    def summary_lines(self):
+        """Tableau des métriques par étape, une ligne par étape (pour les logs)."""
+        lines = [f"{'Étape':<12} {'Workers':>7} {'Traités':>8} {'Débit/s':>9} "
+                 f"{'Occup.':>7} {'File max':>8} {'File moy':>8}"]
+        for name, stats in self.summary()['stages'].items():
+            lines.append(
+                f"{name:<12} {stats['workers']:>7} {stats['processed']:>8} {stats['throughput']:>9.1f} "
+                f"{stats['utilization'] * 100:>6.0f}% {stats['queue_depth_max']:>8} "
+                f"{stats['queue_depth_avg']:>8.2f}"
+            )
+        return lines
@@ -0,0 +1,340 @@
+"""
+TP03 - Partie 2: Encodeur de features persisté du modèle de conversion
+Auteur: - Soukaina El Hadifi
+        - Mohamed-Saber El guelta
+
+Remplace pd.get_dummies(X, columns=['source', 'device', 'browser'],
+drop_first=True) + StandardScaler du notebook ml_conversion_prediction:
+- les modalités sont apprises une fois (fit) puis enregistrées en JSON: la
+  disposition des colonnes ne dépend plus des modalités présentes dans le
+  lot à encoder (get_dummies sur un petit lot sans 'direct' décale toutes
+  les indicatrices 'source_*')
+- une modalité inconnue à l'entraînement est encodée comme la référence
+  (toutes les indicatrices à 0), ou rejetée avec handle_unknown='error'
+- transform écrit directement dans une matrice NumPy (préallouée par
+  l'appelant si besoin, ordre Fortran par défaut), colonne par colonne, sans
+  DataFrame intermédiaire
+- la standardisation (moyenne / écart-type du scaler du notebook) est
+  optionnelle et faite en place: le Random Forest utilise les features
+  brutes, seule la régression logistique les veut standardisées
+
+Usage:
+    python feature_encoder.py ../data/user_behavior.csv
+    python feature_encoder.py ../data/user_behavior.csv --scaler ../data/scaler.pkl --output encoder.json
+"""
+
+import argparse
+import json
+import math
+import os
+import pickle
+
+import numpy as np
+import pandas as pd
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.path.join(SCRIPT_DIR, '..', 'data')
+ENCODER_PATH = os.path.join(DATA_DIR, 'feature_encoder.json')
+SCALER_PATH = os.path.join(DATA_DIR, 'scaler.pkl')
+MODEL_PATH = os.path.join(DATA_DIR, 'rf_conversion_model.pkl')
+
+# Colonnes du notebook, dans l'ordre de X (après suppression de user_id et converted)
+NUMERIC_COLUMNS = ['time_on_site', 'pages_viewed', 'day_of_week', 'hour_of_day',
+                   'previous_visits', 'added_to_cart']
+CATEGORICAL_COLUMNS = ['source', 'device', 'browser']
+
+FORMAT_VERSION = 1
+HANDLE_UNKNOWN = ('ignore', 'error')
+
+
+class FeatureEncoder:
+    """
+    Encodage one-hot + standardisation optionnelle, dans l'ordre d'entraînement.
+
+    Args:
+        numeric_columns (list): Colonnes reprises telles quelles
+        categories (dict): Variable -> modalités ayant une colonne indicatrice
+        references (dict): Variable -> modalité de référence (supprimée par
+            drop_first), None si inconnue
+        handle_unknown (str): 'ignore' (modalité inconnue = référence) ou 'error'
+
+    Attributes:
+        feature_names (list): Colonnes de sortie (même ordre que get_dummies)
+        scaled_columns (list): Colonnes standardisées si scale=True
+    """
+
+    def __init__(self, numeric_columns, categories, references=None, handle_unknown='ignore'):
+        if handle_unknown not in HANDLE_UNKNOWN:
+            raise ValueError(f"handle_unknown doit valoir {' ou '.join(HANDLE_UNKNOWN)}")
+        self.numeric_columns = list(numeric_columns)
+        self.categories = {column: list(values) for column, values in categories.items()}
+        self.references = dict(references or {})
+        self.handle_unknown = handle_unknown
+
+        self.feature_names = self.numeric_columns + [
+            f'{column}_{category}' for column, values in self.categories.items() for category in values
+        ]
+        self.input_columns = self.numeric_columns + list(self.categories)
+        self.scaled_columns = []
+        self.mean = np.empty(0)
+        self.scale = np.empty(0)
+
+        # Tables précalculées: modalités connues (indicatrices + référence) ->
+        # position de colonne (-1 = référence, pas de colonne)
+        self._positions = {name: i for i, name in enumerate(self.feature_names)}
+        self._known = {}
+        self._lookup = {}
+        self._record_positions = {}
+        for column, values in self.categories.items():
+            known = list(values)
+            positions = [self._positions[f'{column}_{category}'] for category in values]
+            reference = self.references.get(column)
+            if reference is not None:
+                known.append(reference)
+                positions.append(-1)
+            self._known[column] = pd.Index(known)
+            self._lookup[column] = np.array(positions, dtype=np.intp)
+            self._record_positions[column] = dict(zip(known, positions))
+        self._scaled_positions = np.empty(0, dtype=np.intp)
+
+    @classmethod
+    def fit(cls, df, numeric_columns=NUMERIC_COLUMNS, categorical_columns=CATEGORICAL_COLUMNS,
+            drop_first=True, handle_unknown='ignore'):
+        """
+        Apprend les modalités de chaque variable (triées, comme get_dummies).
+
+        Args:
+            df (DataFrame): Données d'entraînement
+            drop_first (bool): Supprimer la première modalité (référence)
+
+        Returns:
+            FeatureEncoder
+        """
+        categories = {}
+        references = {}
+        for column in categorical_columns:
+            values = sorted(str(value) for value in df[column].dropna().unique())
+            if drop_first and values:
+                references[column] = values[0]
+                values = values[1:]
+            categories[column] = values
+        return cls(numeric_columns, categories, references, handle_unknown)
+
+    @classmethod
+    def from_feature_names(cls, feature_names, categorical_columns=CATEGORICAL_COLUMNS):
+        """
+        Reconstruit l'encodeur d'un modèle déjà entraîné (feature_names_in_).
+
+        La modalité de référence n'est pas connue: elle est traitée comme
+        une modalité inconnue (même encodage, toutes les indicatrices à 0).
+        """
+        numeric_columns = []
+        categories = {}
+        for name in feature_names:
+            prefix = next((c for c in categorical_columns if name.startswith(f'{c}_')), None)
+            if prefix is None:
+                numeric_columns.append(name)
+            else:
+                categories.setdefault(prefix, []).append(name[len(prefix) + 1:])
+        encoder = cls(numeric_columns, categories)
+        if encoder.feature_names != list(feature_names):
+            raise ValueError("Ordre de colonnes non reproductible: indicatrices non groupées par variable")
+        return encoder
+
+    def set_scaling(self, columns, mean, scale):
+        """
+        Paramètres de standardisation (x - mean) / scale des colonnes `columns`.
+
+        Raises:
+            ValueError: Colonne inconnue de l'encodeur
+        """
+        unknown = [c for c in columns if c not in self._positions]
+        if unknown:
+            raise ValueError(f"Colonnes à standardiser inconnues: {', '.join(unknown)}")
+        self.scaled_columns = list(columns)
+        self.mean = np.asarray(mean, dtype=np.float64)
+        self.scale = np.asarray(scale, dtype=np.float64)
+        self._scaled_positions = np.array([self._positions[c] for c in self.scaled_columns], dtype=np.intp)
+
+    def set_scaling_from_scaler(self, scaler):
+        """Reprend la moyenne et l'écart-type d'un StandardScaler entraîné."""
+        columns = list(getattr(scaler, 'feature_names_in_', self.numeric_columns[:len(scaler.mean_)]))
+        scale = scaler.scale_ if scaler.scale_ is not None else np.ones(len(columns))
+        mean = scaler.mean_ if scaler.with_mean else np.zeros(len(columns))
+        self.set_scaling(columns, mean, scale)
+
+    def _check_columns(self, df):
+        missing = [c for c in self.input_columns if c not in df.columns]
+        if missing:
+            raise ValueError(f"Colonnes manquantes: {', '.join(missing)}")
+
+    def transform(self, df, scale=False, out=None, dtype=np.float64):
+        """
+        Encode un DataFrame au format user_behavior.
+
+        Args:
+            df (DataFrame): Lignes à encoder (colonnes en trop ignorées)
+            scale (bool): Standardiser les colonnes du scaler
+            out (ndarray): Matrice (len(df), n_features) à remplir (réutilisable
+                d'un lot à l'autre), allouée si None
+            dtype: Type de la matrice allouée
+
+        Returns:
+            ndarray: Matrice de features, colonnes = feature_names. Allouée en
+            ordre Fortran: chaque colonne est écrite d'un bloc contigu
+
+        Raises:
+            ValueError: Colonne manquante, ou modalité inconnue avec handle_unknown='error'
+        """
+        self._check_columns(df)
+        shape = (len(df), len(self.feature_names))
+        if out is None:
+            out = np.empty(shape, dtype=dtype, order='F')
+        elif out.shape != shape:
+            raise ValueError(f"Matrice de sortie de forme {out.shape}, attendu {shape}")
+
+        for position, column in enumerate(self.numeric_columns):
+            out[:, position] = df[column].to_numpy()
+
+        for column, known in self._known.items():
+            values = df[column]
+            if isinstance(values.dtype, pd.CategoricalDtype):
+                # Recherche sur les seules modalités du type, puis report par code
+                value_codes = values.cat.codes.to_numpy()
+                category_codes = known.get_indexer(values.cat.categories.astype(str))
+                codes = np.where(value_codes >= 0, category_codes[value_codes], -1)
+            else:
+                codes = known.get_indexer(values)
+            if self.handle_unknown == 'error' and (codes < 0).any():
+                unseen = sorted(set(values[codes < 0].astype(str)))
+                raise ValueError(f"Modalités inconnues pour {column}: {', '.join(unseen)}")
+            # Une colonne par indicatrice; référence et modalités inconnues
+            # (code -1) n'en allument aucune
+            for code, position in enumerate(self._lookup[column]):
+                if position >= 0:
+                    out[:, position] = codes == code
+
+        if scale and self.scaled_columns:
+            # Même ordre d'opérations que StandardScaler.transform (résultat identique)
+            for position, mean, scale_value in zip(self._scaled_positions, self.mean, self.scale):
+                column = out[:, position]
+                column -= mean
+                column /= scale_value
+        return out
+
+    def transform_record(self, record, scale=False):
+        """
+        Encode un seul visiteur (dict), sans DataFrame (serveur de scoring).
+
+        Returns:
+            ndarray: Vecteur float64, ordre feature_names
+
+        Raises:
+            ValueError: Champ manquant, valeur numérique invalide (non numérique,
+                booléenne, NaN ou infinie), ou modalité inconnue avec
+                handle_unknown='error'
+        """
+        vector = np.zeros(len(self.feature_names), dtype=np.float64)
+        for position, name in enumerate(self.numeric_columns):
+            value = record.get(name)
+            if value is None:
+                raise ValueError(f"Champ manquant: {name}")
+            try:
+                # Booléens et chaînes 'nan'/'inf' passent float(): refusés ici,
+                # le score dépendrait sinon du backend (NaN) ou du type JSON
+                if isinstance(value, (bool, np.bool_)):
+                    raise TypeError
+                number = float(value)
+                if not math.isfinite(number):
+                    raise ValueError
+            except (TypeError, ValueError):
+                raise ValueError(f"Valeur numérique invalide pour {name}: {value!r}") from None
+            vector[position] = number
+        for column, positions in self._record_positions.items():
+            if column not in record:
+                raise ValueError(f"Champ manquant: {column}")
+            position = positions.get(str(record[column]))
+            if position is None and self.handle_unknown == 'error':
+                raise ValueError(f"Modalité inconnue pour {column}: {record[column]}")
+            if position is not None and position >= 0:
+                vector[position] = 1.0
+        if scale and self.scaled_columns:
+            scaled = self._scaled_positions
+            vector[scaled] = (vector[scaled] - self.mean) / self.scale
+        return vector
+
+    def to_dict(self):
+        return {
+            'version': FORMAT_VERSION,
+            'numeric_columns': self.numeric_columns,
+            'categories': self.categories,
+            'references': self.references,
+            'handle_unknown': self.handle_unknown,
+            'feature_names': self.feature_names,
+            'scaling': {
+                'columns': self.scaled_columns,
+                'mean': self.mean.tolist(),
+                'scale': self.scale.tolist()
+            }
+        }
+
+    def save(self, path=ENCODER_PATH):
+        """Enregistre l'encodeur en JSON (lisible, sans pickle)."""
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, indent=2, ensure_ascii=False)
+
+    @classmethod
+    def load(cls, path=ENCODER_PATH):
+        """
+        Charge un encodeur enregistré par save().
+
+        Raises:
+            ValueError: Version de format inconnue ou fichier incohérent
+        """
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        if data.get('version') != FORMAT_VERSION:
+            raise ValueError(f"{path}: version d'encodeur non supportée ({data.get('version')})")
+        encoder = cls(data['numeric_columns'], data['categories'], data.get('references'),
+                      data.get('handle_unknown', 'ignore'))
+        if encoder.feature_names != data['feature_names']:
+            raise ValueError(f"{path}: feature_names incohérentes avec les modalités")
+        scaling = data.get('scaling') or {}
+        if scaling.get('columns'):
+            encoder.set_scaling(scaling['columns'], scaling['mean'], scaling['scale'])
+        return encoder
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Apprentissage et enregistrement de l'encodeur de features")
+    parser.add_argument('data', help="CSV user_behavior d'entraînement")
+    parser.add_argument('--scaler', default=SCALER_PATH, help="StandardScaler picklé du notebook")
+    parser.add_argument('--model', default=MODEL_PATH,
+                        help="Modèle dont feature_names_in_ doit être reproduit (vérification)")
+    parser.add_argument('--output', default=ENCODER_PATH)
+    args = parser.parse_args()
+
+    encoder = FeatureEncoder.fit(pd.read_csv(args.data))
+    if args.scaler and os.path.exists(args.scaler):
+        with open(args.scaler, 'rb') as f:
+            encoder.set_scaling_from_scaler(pickle.load(f))
+
+    if args.model and os.path.exists(args.model):
+        with open(args.model, 'rb') as f:
+            expected = list(getattr(pickle.load(f), 'feature_names_in_', []))
+        if expected and expected != encoder.feature_names:
+            print(f"Colonnes différentes de celles du modèle {args.model}:")
+            print(f"  - modèle:    {expected}")
+            print(f"  - encodeur:  {encoder.feature_names}")
+            return 1
+
+    encoder.save(args.output)
+    print(f"Encodeur enregistré: {args.output}")
+    for column, values in encoder.categories.items():
+        print(f"  - {column}: référence '{encoder.references.get(column)}', indicatrices {values}")
+    print(f"  - {len(encoder.feature_names)} features, {len(encoder.scaled_columns)} standardisées")
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
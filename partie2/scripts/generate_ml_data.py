@@ -3,24 +3,52 @@ TP03 - Partie 2 - Exercice 2.2.1
 Script de génération de données pour le modèle ML de prédiction de conversion
 Auteur: [Votre Nom]
 Date: Décembre 2025
+
+Génération vectorisée: chaque colonne est tirée d'un bloc sous forme de
+tableau NumPy (mêmes distributions et mêmes règles de probabilité de
+conversion que la version ligne par ligne), et le CSV est écrit par blocs
+de taille fixe pour que la mémoire reste bornée quel que soit --rows.
+
+Chaque bloc a son propre générateur, dérivé de la graine maître par
+SeedSequence: pour une même graine et une même taille de bloc, le fichier
+produit est identique.
+
+Mode partitionné (--shards): les blocs sont répartis en parts contiguës
+générées en parallèle par un pool de processus, chacune dans son propre
+fichier (part-00000.csv, ...) décrit par un manifest.json. Les graines
+dépendant de l'index global du bloc et non du worker, les parts sont les
+mêmes quel que soit --workers, et leur concaténation est identique au
+fichier unique.
+
+Usage:
+    python generate_ml_data.py
+    python generate_ml_data.py --rows 50000000 --chunk-size 1000000 --seed 42 --output big.csv
+    python generate_ml_data.py --rows 50000000 --shards 32 --workers 8 --output big_parts
 """
 
+import argparse
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
 import pandas as pd
 import numpy as np
-from datetime import datetime, timedelta
-import random
 
-# Configuration
-np.random.seed(42)
-random.seed(42)
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+OUTPUT_PATH = os.path.join(SCRIPT_DIR, '..', 'data', 'user_behavior.csv')
+PARTS_DIR = os.path.join(SCRIPT_DIR, '..', 'data', 'user_behavior_parts')
+MANIFEST_NAME = 'manifest.json'
 
 # Nombre d'utilisateurs à générer
 N_USERS = 1000
+CHUNK_SIZE = 100_000
+SEED = 42
 
-print("=" * 70)
-print("GÉNÉRATION DU DATASET ML - USER BEHAVIOR")
-print("=" * 70)
-print(f"\nGénération de {N_USERS} utilisateurs...")
+# Premier identifiant numérique (user_10000, user_10001, ...): un par ligne,
+# donc uniques sur tout le fichier
+USER_ID_OFFSET = 10000
 
 # Listes pour la génération aléatoire
 sources = ['organic', 'paid', 'email', 'social', 'direct', 'referral']
@@ -33,160 +61,366 @@ source_weights = [0.35, 0.25, 0.15, 0.15, 0.07, 0.03]
 # Pondérations pour les appareils
 device_weights = [0.45, 0.45, 0.10]
 
-def generate_user_behavior():
-    """Génère les données de comportement d'un utilisateur"""
-    
-    # Source de trafic (influence la conversion)
-    source = random.choices(sources, weights=source_weights)[0]
-    
-    # Appareil (influence la conversion)
-    device = random.choices(devices, weights=device_weights)[0]
-    
-    # Navigateur
-    browser = random.choice(browsers)
-    
-    # Temps sur le site (secondes) - varie selon la source
-    if source == 'paid':
-        time_on_site = np.random.gamma(shape=2, scale=60)  # Plus court pour paid
-    elif source == 'organic':
-        time_on_site = np.random.gamma(shape=3, scale=80)  # Plus long pour organic
-    elif source == 'email':
-        time_on_site = np.random.gamma(shape=2.5, scale=70)
-    else:
-        time_on_site = np.random.gamma(shape=2, scale=50)
-    
-    time_on_site = max(10, min(600, time_on_site))  # Entre 10s et 10min
-    
-    # Pages vues - corrélé avec le temps sur le site
-    base_pages = time_on_site / 60  # ~1 page par minute
-    pages_viewed = int(np.random.poisson(base_pages) + 1)
-    pages_viewed = max(1, min(20, pages_viewed))
-    
-    # Jour de la semaine (0 = Lundi, 6 = Dimanche)
-    day_of_week = random.randint(0, 6)
-    
-    # Heure de la journée (influence la conversion)
-    hour_of_day = random.choices(
-        range(24),
-        weights=[2, 1, 1, 1, 1, 2, 4, 6, 8, 10, 12, 12, 10, 9, 10, 12, 14, 15, 13, 10, 8, 6, 4, 3]
-    )[0]
-    
+# Pondérations des heures de la journée
+hour_weights = [2, 1, 1, 1, 1, 2, 4, 6, 8, 10, 12, 12, 10, 9, 10, 12, 14, 15, 13, 10, 8, 6, 4, 3]
+
+# Temps sur le site (gamma) par source: (shape, scale)
+TIME_GAMMA = {
+    'paid': (2, 60),        # Plus court pour paid
+    'organic': (3, 80),     # Plus long pour organic
+    'email': (2.5, 70),
+}
+DEFAULT_TIME_GAMMA = (2, 50)
+
+# Bonus de probabilité de conversion par source et par appareil
+SOURCE_BONUS = {'email': 0.15, 'organic': 0.12, 'paid': 0.08, 'social': 0.06}
+DEVICE_BONUS = {'desktop': 0.10, 'mobile': 0.05}
+
+COLUMNS = [
+    'user_id', 'time_on_site', 'pages_viewed', 'source', 'device', 'browser',
+    'day_of_week', 'hour_of_day', 'previous_visits', 'added_to_cart', 'converted'
+]
+
+# Tables indexées par catégorie, pour remplacer les chaînes de if
+_SOURCE_P = np.array(source_weights) / np.sum(source_weights)
+_DEVICE_P = np.array(device_weights) / np.sum(device_weights)
+_HOUR_P = np.array(hour_weights) / np.sum(hour_weights)
+_GAMMA_SHAPE = np.array([TIME_GAMMA.get(s, DEFAULT_TIME_GAMMA)[0] for s in sources], dtype=float)
+_GAMMA_SCALE = np.array([TIME_GAMMA.get(s, DEFAULT_TIME_GAMMA)[1] for s in sources], dtype=float)
+_SOURCE_BONUS = np.array([SOURCE_BONUS.get(s, 0.0) for s in sources])
+_DEVICE_BONUS = np.array([DEVICE_BONUS.get(d, 0.0) for d in devices])
+
+
+def chunk_rng(seed, chunk_index):
+    """Générateur indépendant du bloc `chunk_index`, dérivé de la graine maître."""
+    return np.random.default_rng(np.random.SeedSequence(seed, spawn_key=(chunk_index,)))
+
+
+def generate_chunk(rng, size, first_row=0):
+    """
+    Génère un bloc d'utilisateurs en vectorisé.
+
+    Args:
+        rng: Générateur NumPy du bloc
+        size: Nombre de lignes
+        first_row: Index global de la première ligne (pour les user_id)
+
+    Returns:
+        DataFrame aux colonnes COLUMNS
+    """
+    # Source de trafic et appareil (influencent la conversion), navigateur
+    source = rng.choice(len(sources), size=size, p=_SOURCE_P)
+    device = rng.choice(len(devices), size=size, p=_DEVICE_P)
+    browser = rng.integers(0, len(browsers), size=size)
+
+    # Temps sur le site (secondes) - varie selon la source, entre 10s et 10min
+    time_on_site = rng.gamma(_GAMMA_SHAPE[source], _GAMMA_SCALE[source])
+    np.clip(time_on_site, 10, 600, out=time_on_site)
+
+    # Pages vues - corrélé avec le temps sur le site (~1 page par minute)
+    pages_viewed = np.clip(rng.poisson(time_on_site / 60) + 1, 1, 20)
+
+    # Jour de la semaine (0 = Lundi, 6 = Dimanche) et heure de la journée
+    day_of_week = rng.integers(0, 7, size=size)
+    hour_of_day = rng.choice(24, size=size, p=_HOUR_P)
+
     # Nombre de visites précédentes
-    previous_visits = np.random.poisson(2)
-    previous_visits = min(previous_visits, 10)
-    
-    # Ajout au panier (indicateur fort de conversion)
-    added_to_cart = random.random() < 0.3  # 30% ajoutent au panier
-    
-    # Calcul de la probabilité de conversion basée sur les features
-    conversion_prob = 0.05  # Base
-    
-    # Source (l'email et organic convertissent mieux)
-    if source == 'email':
-        conversion_prob += 0.15
-    elif source == 'organic':
-        conversion_prob += 0.12
-    elif source == 'paid':
-        conversion_prob += 0.08
-    elif source == 'social':
-        conversion_prob += 0.06
-    
-    # Appareil (desktop converti mieux)
-    if device == 'desktop':
-        conversion_prob += 0.10
-    elif device == 'mobile':
-        conversion_prob += 0.05
-    
-    # Temps sur le site (plus de temps = plus de conversion)
-    if time_on_site > 180:
-        conversion_prob += 0.15
-    elif time_on_site > 120:
-        conversion_prob += 0.10
-    elif time_on_site > 60:
-        conversion_prob += 0.05
-    
-    # Pages vues
-    if pages_viewed >= 5:
-        conversion_prob += 0.12
-    elif pages_viewed >= 3:
-        conversion_prob += 0.08
-    
-    # Heure (les heures de bureau convertissent mieux)
-    if 9 <= hour_of_day <= 17:
-        conversion_prob += 0.08
-    
-    # Visites précédentes (fidélité)
-    if previous_visits >= 3:
-        conversion_prob += 0.10
-    elif previous_visits >= 1:
-        conversion_prob += 0.05
-    
-    # Ajout au panier (fort indicateur)
-    if added_to_cart:
-        conversion_prob += 0.25
-    
-    # Jour de la semaine (semaine > weekend)
-    if day_of_week < 5:  # Lundi à Vendredi
-        conversion_prob += 0.05
-    
-    # Limiter la probabilité entre 0 et 1
-    conversion_prob = min(0.95, max(0.01, conversion_prob))
-    
-    # Déterminer la conversion
-    converted = 1 if random.random() < conversion_prob else 0
-    
-    return {
-        'user_id': f'user_{random.randint(10000, 99999)}',
-        'time_on_site': round(time_on_site, 2),
+    previous_visits = np.minimum(rng.poisson(2, size=size), 10)
+
+    # Ajout au panier (indicateur fort de conversion): 30% des visiteurs
+    added_to_cart = rng.random(size) < 0.3
+
+    # Probabilité de conversion: mêmes règles que la version ligne par ligne
+    conversion_prob = 0.05 + _SOURCE_BONUS[source] + _DEVICE_BONUS[device]
+    conversion_prob += np.select(
+        [time_on_site > 180, time_on_site > 120, time_on_site > 60], [0.15, 0.10, 0.05], 0.0
+    )
+    conversion_prob += np.select([pages_viewed >= 5, pages_viewed >= 3], [0.12, 0.08], 0.0)
+    conversion_prob += np.where((hour_of_day >= 9) & (hour_of_day <= 17), 0.08, 0.0)
+    conversion_prob += np.select([previous_visits >= 3, previous_visits >= 1], [0.10, 0.05], 0.0)
+    conversion_prob += np.where(added_to_cart, 0.25, 0.0)
+    conversion_prob += np.where(day_of_week < 5, 0.05, 0.0)
+    np.clip(conversion_prob, 0.01, 0.95, out=conversion_prob)
+
+    converted = (rng.random(size) < conversion_prob).astype(np.int8)
+
+    user_ids = np.arange(USER_ID_OFFSET + first_row, USER_ID_OFFSET + first_row + size)
+    return pd.DataFrame({
+        'user_id': pd.Series(user_ids.astype(str)).radd('user_'),
+        'time_on_site': np.round(time_on_site, 2),
         'pages_viewed': pages_viewed,
-        'source': source,
-        'device': device,
-        'browser': browser,
+        'source': pd.Categorical.from_codes(source, sources),
+        'device': pd.Categorical.from_codes(device, devices),
+        'browser': pd.Categorical.from_codes(browser, browsers),
         'day_of_week': day_of_week,
         'hour_of_day': hour_of_day,
         'previous_visits': previous_visits,
-        'added_to_cart': int(added_to_cart),
+        'added_to_cart': added_to_cart.astype(np.int8),
         'converted': converted
+    }, columns=COLUMNS)
+
+
+def iter_chunks(rows, chunk_size, seed, first_chunk=0):
+    """
+    Itère sur les blocs d'un dataset de `rows` lignes.
+
+    Args:
+        rows: Nombre total de lignes (à partir du bloc `first_chunk`)
+        chunk_size: Lignes par bloc
+        seed: Graine maître
+        first_chunk: Index global du premier bloc
+
+    Yields:
+        DataFrame d'au plus `chunk_size` lignes
+    """
+    chunk_index = first_chunk
+    produced = 0
+    while produced < rows:
+        size = min(chunk_size, rows - produced)
+        yield generate_chunk(chunk_rng(seed, chunk_index), size,
+                             first_row=chunk_index * chunk_size)
+        produced += size
+        chunk_index += 1
+
+
+class DatasetStats:
+    """Statistiques cumulées bloc par bloc (le dataset complet n'est jamais en mémoire)."""
+
+    def __init__(self):
+        self.rows = 0
+        self.conversions = 0
+        self.by_source = pd.DataFrame(0, index=sources, columns=['users', 'conversions'])
+        self.by_device = pd.DataFrame(0, index=devices, columns=['users', 'conversions'])
+
+    def add(self, chunk):
+        self.rows += len(chunk)
+        self.conversions += int(chunk['converted'].sum())
+        for column, table in (('source', self.by_source), ('device', self.by_device)):
+            grouped = chunk.groupby(column, observed=False)['converted'].agg(['size', 'sum'])
+            table['users'] += grouped['size']
+            table['conversions'] += grouped['sum']
+
+    def merge(self, other):
+        """Ajoute les statistiques d'une autre part."""
+        self.rows += other.rows
+        self.conversions += other.conversions
+        self.by_source += other.by_source
+        self.by_device += other.by_device
+
+    def print_report(self):
+        rate = self.conversions / self.rows * 100 if self.rows else 0.0
+        print(f"\nStatistiques du dataset:")
+        print(f"  - Total utilisateurs: {self.rows}")
+        print(f"  - Conversions: {self.conversions} ({rate:.1f}%)")
+        print(f"  - Non-conversions: {self.rows - self.conversions} ({100 - rate:.1f}%)")
+
+        print(f"\nDistribution par source:")
+        print(self.by_source['users'].sort_values(ascending=False).to_string())
+
+        print(f"\nDistribution par appareil:")
+        print(self.by_device['users'].sort_values(ascending=False).to_string())
+
+        for label, table in (('source', self.by_source), ('appareil', self.by_device)):
+            print(f"\nTaux de conversion par {label}:")
+            for name, row in table.sort_index().iterrows():
+                if row['users']:
+                    print(f"  - {name}: {row['conversions'] / row['users'] * 100:.1f}%")
+
+
+def write_dataset(output_path, rows, chunk_size=CHUNK_SIZE, seed=SEED, stats=None):
+    """
+    Génère et écrit le dataset bloc par bloc.
+
+    Returns:
+        DataFrame: Premières lignes (aperçu)
+    """
+    preview = None
+    with open(output_path, 'w', encoding='utf-8', newline='') as f:
+        for index, chunk in enumerate(iter_chunks(rows, chunk_size, seed)):
+            chunk.to_csv(f, header=(index == 0), index=False, lineterminator='\n')
+            if stats is not None:
+                stats.add(chunk)
+            if preview is None:
+                preview = chunk.head(10)
+    return preview
+
+
+def plan_shards(rows, chunk_size, shards):
+    """
+    Répartit les blocs du dataset en parts contiguës de blocs entiers.
+
+    Le découpage ne dépend que de (rows, chunk_size, shards), jamais du
+    nombre de workers.
+
+    Returns:
+        list: Une entrée par part (index, first_chunk, chunks, first_row, rows)
+    """
+    n_chunks = -(-rows // chunk_size)
+    shards = max(1, min(shards, n_chunks))
+    base, extra = divmod(n_chunks, shards)
+    plan = []
+    first_chunk = 0
+    for index in range(shards):
+        chunks = base + (1 if index < extra else 0)
+        first_row = first_chunk * chunk_size
+        plan.append({
+            'index': index,
+            'first_chunk': first_chunk,
+            'chunks': chunks,
+            'first_row': first_row,
+            'rows': max(0, min(chunks * chunk_size, rows - first_row))
+        })
+        first_chunk += chunks
+    return plan
+
+
+def write_shard(output_dir, shard, chunk_size, seed):
+    """
+    Génère et écrit une part (exécuté dans un processus du pool).
+
+    Returns:
+        tuple: (entrée du manifest, DatasetStats de la part)
+    """
+    name = f"part-{shard['index']:05d}.csv"
+    stats = DatasetStats()
+    digest = hashlib.sha256()
+    # Chaque part a son en-tête pour être lisible seule
+    header = (','.join(COLUMNS) + '\n').encode('utf-8')
+    digest.update(header)
+    size = len(header)
+    with open(os.path.join(output_dir, name), 'wb') as f:
+        f.write(header)
+        for chunk in iter_chunks(shard['rows'], chunk_size, seed, shard['first_chunk']):
+            data = chunk.to_csv(header=False, index=False, lineterminator='\n').encode('utf-8')
+            digest.update(data)
+            f.write(data)
+            size += len(data)
+            stats.add(chunk)
+    entry = dict(shard, file=name, bytes=size, sha256=digest.hexdigest())
+    return entry, stats
+
+
+def write_sharded_dataset(output_dir, rows, shards, workers=None, chunk_size=CHUNK_SIZE, seed=SEED,
+                          stats=None):
+    """
+    Génère le dataset en parts parallèles et écrit le manifest.
+
+    Args:
+        output_dir: Répertoire des parts (créé si besoin)
+        rows: Nombre total de lignes
+        shards: Nombre de parts
+        workers: Processus du pool (défaut: nombre de coeurs)
+        chunk_size: Lignes par bloc
+        seed: Graine maître
+        stats: DatasetStats à compléter (optionnel)
+
+    Returns:
+        dict: Manifest écrit dans output_dir/manifest.json
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    plan = plan_shards(rows, chunk_size, shards)
+    workers = max(1, min(workers or os.cpu_count() or 1, len(plan)))
+
+    if workers == 1:
+        results = [write_shard(output_dir, shard, chunk_size, seed) for shard in plan]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(write_shard, output_dir, shard, chunk_size, seed) for shard in plan]
+            results = [future.result() for future in futures]
+
+    if stats is not None:
+        for _, shard_stats in results:
+            stats.merge(shard_stats)
+
+    manifest = {
+        'dataset': 'user_behavior',
+        'format': 'csv',
+        'columns': COLUMNS,
+        'rows': rows,
+        'seed': seed,
+        'chunk_size': chunk_size,
+        'shards': len(plan),
+        'created_at': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'parts': [entry for entry, _ in results]
     }
+    # Écrit en dernier: un manifest présent signifie que toutes les parts sont complètes
+    manifest_path = os.path.join(output_dir, MANIFEST_NAME)
+    with open(manifest_path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, ensure_ascii=False)
+    os.replace(manifest_path + '.tmp', manifest_path)
+    return manifest
+
+
+def load_dataset(path):
+    """
+    Charge le dataset, qu'il soit un CSV unique ou un répertoire de parts.
 
-# Génération des données
-data = [generate_user_behavior() for _ in range(N_USERS)]
+    Args:
+        path: Fichier CSV, répertoire de parts ou chemin du manifest
 
-# Création du DataFrame
-df = pd.DataFrame(data)
+    Returns:
+        DataFrame
+    """
+    if os.path.isdir(path):
+        path = os.path.join(path, MANIFEST_NAME)
+    if os.path.basename(path) != MANIFEST_NAME:
+        return pd.read_csv(path)
+    with open(path, 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+    directory = os.path.dirname(path)
+    return pd.concat(
+        [pd.read_csv(os.path.join(directory, part['file'])) for part in manifest['parts']],
+        ignore_index=True
+    )
 
-# Statistiques
-print(f"\nDonnées générées avec succès!")
-print(f"\nStatistiques du dataset:")
-print(f"  - Total utilisateurs: {len(df)}")
-print(f"  - Conversions: {df['converted'].sum()} ({df['converted'].mean()*100:.1f}%)")
-print(f"  - Non-conversions: {(1-df['converted']).sum()} ({(1-df['converted'].mean())*100:.1f}%)")
 
-print(f"\nDistribution par source:")
-print(df['source'].value_counts())
+def main():
+    parser = argparse.ArgumentParser(description="Génération du dataset ML user_behavior")
+    parser.add_argument('--rows', type=int, default=N_USERS, help="Nombre d'utilisateurs")
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE,
+                        help="Lignes générées et écrites par bloc (borne la mémoire)")
+    parser.add_argument('--seed', type=int, default=SEED, help="Graine maître")
+    parser.add_argument('--output', default=None,
+                        help="Fichier CSV de sortie (répertoire des parts avec --shards)")
+    parser.add_argument('--shards', type=int, default=0,
+                        help="Nombre de parts générées en parallèle (0 = fichier unique)")
+    parser.add_argument('--workers', type=int, default=None,
+                        help="Processus du pool en mode partitionné (défaut: nombre de coeurs)")
+    args = parser.parse_args()
+    chunk_size = max(1, args.chunk_size)
 
-print(f"\nDistribution par appareil:")
-print(df['device'].value_counts())
+    print("=" * 70)
+    print("GÉNÉRATION DU DATASET ML - USER BEHAVIOR")
+    print("=" * 70)
+    print(f"\nGénération de {args.rows} utilisateurs (blocs de {chunk_size}, graine {args.seed})...")
 
-print(f"\nTaux de conversion par source:")
-conversion_by_source = df.groupby('source')['converted'].mean() * 100
-for source, rate in conversion_by_source.items():
-    print(f"  - {source}: {rate:.1f}%")
+    stats = DatasetStats()
+    start = time.perf_counter()
+    if args.shards > 0:
+        output = args.output or PARTS_DIR
+        manifest = write_sharded_dataset(output, args.rows, args.shards, args.workers,
+                                         chunk_size, args.seed, stats)
+        preview = load_dataset(os.path.join(output, manifest['parts'][0]['file'])).head(10)
+    else:
+        output = args.output or OUTPUT_PATH
+        preview = write_dataset(output, args.rows, chunk_size, args.seed, stats)
+    duration = time.perf_counter() - start
+
+    print(f"\nDonnées générées avec succès! ({duration:.2f}s, {args.rows / duration:,.0f} lignes/s)")
+    stats.print_report()
+    if args.shards > 0:
+        print(f"\nDataset sauvegardé: {output} ({manifest['shards']} parts + {MANIFEST_NAME})")
+    else:
+        print(f"\nDataset sauvegardé: {output}")
 
-print(f"\nTaux de conversion par appareil:")
-conversion_by_device = df.groupby('device')['converted'].mean() * 100
-for device, rate in conversion_by_device.items():
-    print(f"  - {device}: {rate:.1f}%")
+    # Aperçu des données
+    print(f"\nAperçu des données:")
+    print(preview)
 
-# Sauvegarde
-output_path = '../data/user_behavior.csv'
-df.to_csv(output_path, index=False)
-print(f"\nDataset sauvegardé: {output_path}")
+    print(f"\n" + "=" * 70)
+    print("GÉNÉRATION TERMINÉE")
+    print("=" * 70)
 
-# Aperçu des données
-print(f"\nAperçu des données:")
-print(df.head(10))
 
-print(f"\n" + "=" * 70)
-print("GÉNÉRATION TERMINÉE")
-print("=" * 70)
+if __name__ == '__main__':
+    main()
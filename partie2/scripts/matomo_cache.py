@@ -0,0 +1,225 @@
+"""
+TP03 - Partie 2: Cache disque des réponses brutes de l'API Matomo
+Auteur: - Soukaina El Hadifi
+        - Mohamed-Saber El guelta
+
+Chaque réponse est stockée dans un fichier dont le nom est le hash SHA-256
+de la requête: instance Matomo (URL de base), empreinte du token (jamais le
+token lui-même), méthode, site, période et date. Deux instances (staging et
+production) ou deux comptes ne partagent donc jamais une entrée.
+
+Conservation:
+- période close (terminée avant aujourd'hui): conservée sans limite de durée,
+  Matomo ne la modifiera plus
+- période ouverte (contenant aujourd'hui): TTL court, pour qu'un run suivant
+  récupère les nouvelles visites
+- taille totale bornée: les entrées les moins récemment lues sont évincées
+
+En mode replay, le cache est la seule source: aucune requête réseau n'est
+faite, les entrées expirées sont servies et une absence lève CacheMissError.
+Cela permet de rejouer transform + load hors ligne après un échec.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from urllib.parse import urlsplit, urlunsplit
+
+# Paramètres de requête qui identifient une réponse
+KEY_PARAMS = ('method', 'idSite', 'period', 'date')
+
+CACHE_DIR = '.matomo_cache'
+MAX_BYTES = 256 * 1024 * 1024
+OPEN_PERIOD_TTL = 300.0
+
+
+class CacheMissError(KeyError):
+    """Réponse absente du cache en mode replay."""
+
+    def __str__(self):
+        return f"Réponse absente du cache (replay): {self.args[0]}"
+
+
+def normalize_url(base_url):
+    """URL de base d'une instance, sous une forme stable (schéma et hôte en minuscules, sans / final)."""
+    parts = urlsplit(str(base_url or '').strip())
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path.rstrip('/'), '', ''))
+
+
+def token_fingerprint(token):
+    """Empreinte courte du token: distingue les comptes sans stocker le secret."""
+    return hashlib.sha256(str(token or '').encode('utf-8')).hexdigest()[:16]
+
+
+def cache_identity(params, base_url):
+    """Éléments qui identifient une réponse (stockés dans l'entrée pour diagnostic)."""
+    identity = {name: str(params.get(name, '')) for name in KEY_PARAMS}
+    identity['url'] = normalize_url(base_url)
+    identity['token'] = token_fingerprint(params.get('token_auth'))
+    return identity
+
+
+def cache_key(params, base_url):
+    """
+    Clé d'une requête Matomo: SHA-256 de l'instance, de l'empreinte du token
+    et des paramètres identifiants, sérialisés de façon canonique.
+    """
+    identity = cache_identity(params, base_url)
+    canonical = json.dumps(identity, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+class MatomoCache:
+    """
+    Cache disque des réponses Matomo (thread-safe).
+
+    Args:
+        directory (str): Répertoire du cache (créé si besoin)
+        max_bytes (int): Taille totale maximale des entrées
+        open_ttl (float): Durée de vie (s) d'une période encore ouverte
+        replay (bool): Si True, sert les entrées même expirées et ne
+            doit jamais être complété par le réseau
+
+    Attributes:
+        hits, misses, evictions (int): Compteurs depuis la création
+    """
+
+    def __init__(self, directory=CACHE_DIR, max_bytes=MAX_BYTES, open_ttl=OPEN_PERIOD_TTL,
+                 replay=False):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.open_ttl = open_ttl
+        self.replay = replay
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+        # Index en mémoire: clé -> [taille, dernier accès]
+        self._entries = {}
+        for root, _, files in os.walk(directory):
+            for name in files:
+                if name.endswith('.json'):
+                    stat = os.stat(os.path.join(root, name))
+                    self._entries[name[:-5]] = [stat.st_size, stat.st_mtime]
+        self.total_bytes = sum(size for size, _ in self._entries.values())
+
+    def _path(self, key):
+        # Deux niveaux pour ne pas mettre des milliers de fichiers dans un répertoire
+        return os.path.join(self.directory, key[:2], f'{key}.json')
+
+    def get(self, params, base_url):
+        """
+        Réponse en cache pour une requête.
+
+        Args:
+            params (dict): Paramètres de la requête
+            base_url (str): URL de l'instance Matomo interrogée
+
+        Returns:
+            Données JSON décodées, ou None si absente ou expirée
+        """
+        key = cache_key(params, base_url)
+        path = self._path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            with self._lock:
+                self.misses += 1
+            return None
+
+        expires_at = entry.get('expires_at')
+        if expires_at is not None and expires_at < time.time() and not self.replay:
+            self._remove(key)
+            with self._lock:
+                self.misses += 1
+            return None
+
+        now = time.time()
+        with self._lock:
+            self.hits += 1
+            if key in self._entries:
+                self._entries[key][1] = now
+        try:
+            os.utime(path, (now, now))
+        except OSError:
+            pass
+        return entry['data']
+
+    def put(self, params, data, closed, base_url):
+        """
+        Enregistre une réponse.
+
+        Args:
+            params (dict): Paramètres de la requête
+            base_url (str): URL de l'instance Matomo interrogée
+            data: Réponse JSON décodée
+            closed (bool): True si la période est close (pas d'expiration)
+        """
+        key = cache_key(params, base_url)
+        now = time.time()
+        entry = {
+            'params': cache_identity(params, base_url),
+            'fetched_at': now,
+            'expires_at': None if closed else now + self.open_ttl,
+            'data': data
+        }
+        payload = json.dumps(entry, separators=(',', ':')).encode('utf-8')
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Écriture atomique: un lecteur ne voit jamais un fichier partiel
+        tmp_path = f'{path}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(payload)
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            previous = self._entries.get(key)
+            if previous is not None:
+                self.total_bytes -= previous[0]
+            self._entries[key] = [len(payload), now]
+            self.total_bytes += len(payload)
+            victims = self._select_victims(keep=key)
+        for victim in victims:
+            self._remove(victim)
+
+    def _select_victims(self, keep):
+        # Entrées les moins récemment utilisées, jusqu'à repasser sous la limite
+        victims = []
+        excess = self.total_bytes - self.max_bytes
+        if excess <= 0:
+            return victims
+        for key, (size, _) in sorted(self._entries.items(), key=lambda item: item[1][1]):
+            if excess <= 0:
+                break
+            if key == keep:
+                continue
+            victims.append(key)
+            excess -= size
+        return victims
+
+    def _remove(self, key):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self.total_bytes -= entry[0]
+                self.evictions += 1
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+    def stats(self):
+        """Compteurs et taille du cache."""
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'size_mb': round(self.total_bytes / 1024 / 1024, 2),
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions
+            }
@@ -0,0 +1,422 @@
+"""
+TP03 - Partie 2: Serveur de scoring en ligne du modèle de conversion
+Auteur: - Soukaina El Hadifi
+        - Mohamed-Saber El guelta
+
+Serveur HTTP local qui garde le Random Forest et le scaler en mémoire et
+renvoie la probabilité de conversion d'un visiteur:
+- les requêtes concurrentes sont regroupées en micro-lots: un seul appel à
+  predict_proba par lot (son coût fixe domine pour une ligne), avec une
+  attente maximale (--max-wait-ms) comptée depuis la plus ancienne requête
+  du lot, et une taille maximale (--max-batch)
+- cache LRU borné (--cache-size) indexé par le vecteur de features encodé:
+  deux visiteurs aux features identiques partagent la même entrée, quels que
+  soient leur user_id ou l'ordre des champs JSON
+
+Endpoints:
+    POST /score    {"time_on_site": 120.5, "pages_viewed": 4, "source": "email", ...}
+                   ou {"visitors": [{...}, {...}]}
+    GET  /stats    compteurs (requêtes, lots, cache); POST /stats/reset les remet à zéro
+    GET  /health
+
+Usage:
+    python scoring_server.py --port 8090 --max-batch 64 --max-wait-ms 2 --cache-size 100000
+    curl -X POST localhost:8090/score -d '{"time_on_site": 200, "pages_viewed": 5, ...}'
+"""
+
+import argparse
+import json
+import queue
+import threading
+import time
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+from conversion_scoring import MODEL_PATH, SCALER_PATH, THRESHOLD, ConversionScorer
+
+MAX_BATCH = 64
+MAX_WAIT_MS = 2.0
+CACHE_SIZE = 100_000
+# Attente maximale d'un résultat par une requête HTTP
+REQUEST_TIMEOUT = 10.0
+
+
+class LruCache:
+    """
+    Cache LRU borné et thread-safe.
+
+    Args:
+        capacity (int): Nombre maximal d'entrées (0 = cache désactivé)
+    """
+
+    def __init__(self, capacity=CACHE_SIZE):
+        self.capacity = capacity
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Valeur en cache (et marquée récente), ou None."""
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        if self.capacity <= 0:
+            return
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+
+    def reset_stats(self):
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'capacity': self.capacity,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
+
+class _Pending:
+    """Vecteurs d'une requête en attente de leur lot."""
+
+    __slots__ = ('matrix', 'enqueued', 'done', 'result', 'error')
+
+    def __init__(self, matrix):
+        self.matrix = matrix
+        self.enqueued = time.monotonic()
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class MicroBatcher:
+    """
+    Regroupe les demandes concurrentes en lots traités par un thread unique.
+
+    Args:
+        predict (callable): Matrice (n, features) -> n probabilités
+        max_batch (int): Lignes maximales par lot
+        max_wait_ms (float): Attente maximale de la plus ancienne demande
+            avant que le lot parte incomplet
+    """
+
+    def __init__(self, predict, max_batch=MAX_BATCH, max_wait_ms=MAX_WAIT_MS):
+        self.predict = predict
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max(0.0, max_wait_ms) / 1000
+        self._queue = queue.Queue()
+        self._stop = threading.Event()
+        self._stats_lock = threading.Lock()
+        self.batches = 0
+        self.rows = 0
+        self.largest_batch = 0
+        self.predict_seconds = 0.0
+        self._thread = threading.Thread(target=self._run, name='scoring-batcher', daemon=True)
+        self._thread.start()
+
+    def submit(self, matrix, timeout=REQUEST_TIMEOUT):
+        """
+        Ajoute des lignes au prochain lot et attend leurs probabilités.
+
+        Raises:
+            TimeoutError: Pas de réponse dans le délai
+            Exception: Erreur levée par predict pour ce lot
+        """
+        pending = _Pending(matrix)
+        self._queue.put(pending)
+        if not pending.done.wait(timeout):
+            raise TimeoutError("Pas de réponse du lot de scoring")
+        if pending.error is not None:
+            raise pending.error
+        return pending.result
+
+    def _collect(self, first):
+        batch = [first]
+        rows = len(first.matrix)
+        deadline = first.enqueued + self.max_wait
+        while rows < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                # Après l'échéance, on prend encore ce qui est déjà en file
+                pending = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            batch.append(pending)
+            rows += len(pending.matrix)
+        return batch, rows
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                first = self._queue.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            batch, rows = self._collect(first)
+            matrix = np.vstack([pending.matrix for pending in batch])
+            start = time.perf_counter()
+            try:
+                probabilities = self.predict(matrix)
+            except Exception as e:
+                for pending in batch:
+                    pending.error = e
+                    pending.done.set()
+                continue
+            elapsed = time.perf_counter() - start
+
+            offset = 0
+            for pending in batch:
+                pending.result = probabilities[offset:offset + len(pending.matrix)]
+                offset += len(pending.matrix)
+                pending.done.set()
+            with self._stats_lock:
+                self.batches += 1
+                self.rows += rows
+                self.largest_batch = max(self.largest_batch, rows)
+                self.predict_seconds += elapsed
+
+    def reset_stats(self):
+        with self._stats_lock:
+            self.batches = 0
+            self.rows = 0
+            self.largest_batch = 0
+            self.predict_seconds = 0.0
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def stats(self):
+        with self._stats_lock:
+            return {
+                'batches': self.batches,
+                'rows': self.rows,
+                'avg_batch': round(self.rows / self.batches, 2) if self.batches else 0.0,
+                'largest_batch': self.largest_batch,
+                'avg_predict_ms': round(self.predict_seconds / self.batches * 1000, 3)
+                if self.batches else 0.0,
+                'max_batch': self.max_batch,
+                'max_wait_ms': self.max_wait * 1000
+            }
+
+
+class ScoringHandler(BaseHTTPRequestHandler):
+    """Gestionnaire HTTP du serveur de scoring (keep-alive HTTP/1.1)."""
+
+    protocol_version = 'HTTP/1.1'
+    # En-têtes et corps partent en deux écritures: avec Nagle, l'ACK retardé
+    # du client ajouterait ~40 ms à chaque réponse en keep-alive
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        # Pas de log par requête: il fausserait les latences
+        pass
+
+    def _reply(self, status, body):
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path == '/stats':
+            self._reply(200, self.server.stats())
+        elif self.path == '/health':
+            self._reply(200, {'status': 'ok'})
+        else:
+            self._reply(404, {'error': 'Chemin inconnu'})
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        raw_body = self.rfile.read(length)
+        if self.path == '/stats/reset':
+            self.server.reset_stats()
+            self._reply(200, {'reset': True})
+            return
+        if self.path.rstrip('/') != '/score':
+            self._reply(404, {'error': 'Chemin inconnu'})
+            return
+
+        try:
+            payload = json.loads(raw_body)
+            visitors = payload.get('visitors') if isinstance(payload, dict) else None
+            if visitors is None:
+                results = self.server.score([payload])
+                body = results[0]
+            else:
+                if not isinstance(visitors, list):
+                    raise ValueError("'visitors' doit être une liste")
+                body = {'results': self.server.score(visitors)}
+        except (ValueError, AttributeError) as e:
+            self.server.count('errors')
+            self._reply(400, {'error': str(e)})
+            return
+        except Exception as e:
+            self.server.count('errors')
+            self._reply(500, {'error': str(e)})
+            return
+        self._reply(200, body)
+
+
+class ScoringServer(ThreadingHTTPServer):
+    """
+    Serveur HTTP multi-threads portant le modèle, le cache et le micro-batcher.
+
+    Args:
+        address (tuple): (hôte, port)
+        scorer (ConversionScorer): Modèle chargé
+        max_batch, max_wait_ms: Voir MicroBatcher
+        cache_size (int): Entrées du cache LRU (0 = désactivé)
+        threshold (float): Seuil de la prédiction binaire
+    """
+
+    daemon_threads = True
+    request_queue_size = 1024
+
+    def __init__(self, address, scorer, max_batch=MAX_BATCH, max_wait_ms=MAX_WAIT_MS,
+                 cache_size=CACHE_SIZE, threshold=THRESHOLD):
+        super().__init__(address, ScoringHandler)
+        self.scorer = scorer
+        self.threshold = threshold
+        self.cache = LruCache(cache_size)
+        self.batcher = MicroBatcher(scorer.predict_proba_matrix, max_batch, max_wait_ms)
+        self.started_at = time.time()
+        self._counters = {'requests': 0, 'visitors': 0, 'errors': 0}
+        self._counters_lock = threading.Lock()
+        # Premier appel hors mesure (allocations, imports paresseux de sklearn)
+        scorer.predict_proba_matrix(np.zeros((1, len(scorer.feature_names))))
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def count(self, name, value=1):
+        with self._counters_lock:
+            self._counters[name] += value
+
+    def score(self, visitors):
+        """
+        Score une liste de visiteurs (cache, puis un passage par le micro-batcher
+        pour les absents).
+
+        Returns:
+            list: Un dict par visiteur (conversion_proba, predicted, cached)
+
+        Raises:
+            ValueError: Visiteur invalide
+        """
+        self.count('requests')
+        self.count('visitors', len(visitors))
+        if not visitors:
+            return []
+        vectors = []
+        for visitor in visitors:
+            if not isinstance(visitor, dict):
+                raise ValueError("Chaque visiteur doit être un objet JSON")
+            vectors.append(self.scorer.encode_record(visitor))
+
+        keys = [vector.tobytes() for vector in vectors]
+        probabilities = [self.cache.get(key) for key in keys]
+        missing = [i for i, proba in enumerate(probabilities) if proba is None]
+        if missing:
+            computed = self.batcher.submit(np.vstack([vectors[i] for i in missing]))
+            for i, proba in zip(missing, computed):
+                probabilities[i] = float(proba)
+                self.cache.put(keys[i], probabilities[i])
+
+        missing = set(missing)
+        results = []
+        for i, (visitor, proba) in enumerate(zip(visitors, probabilities)):
+            result = {
+                'conversion_proba': proba,
+                'predicted': int(proba >= self.threshold),
+                'cached': i not in missing
+            }
+            if 'user_id' in visitor:
+                result['user_id'] = visitor['user_id']
+            results.append(result)
+        return results
+
+    def stats(self):
+        with self._counters_lock:
+            counters = dict(self._counters)
+        return dict(counters, uptime_s=round(time.time() - self.started_at, 1),
+                    cache=self.cache.stats(), batcher=self.batcher.stats())
+
+    def reset_stats(self):
+        """Remet les compteurs à zéro (le contenu du cache est conservé)."""
+        with self._counters_lock:
+            self._counters = dict.fromkeys(self._counters, 0)
+        self.cache.reset_stats()
+        self.batcher.reset_stats()
+
+    def server_close(self):
+        self.batcher.stop()
+        super().server_close()
+
+
+def start_scoring_server(host='127.0.0.1', port=0, scorer=None, **options):
+    """
+    Démarre le serveur de scoring dans un thread (port 0 = port libre choisi par l'OS).
+
+    Returns:
+        ScoringServer: Serveur démarré (url dans server.url, arrêt via shutdown())
+    """
+    server = ScoringServer((host, port), scorer or ConversionScorer(), **options)
+    threading.Thread(target=server.serve_forever, name='scoring-server', daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serveur de scoring de conversion")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8090, help="Port d'écoute (0 = port libre)")
+    parser.add_argument('--max-batch', type=int, default=MAX_BATCH, help="Lignes maximales par lot")
+    parser.add_argument('--max-wait-ms', type=float, default=MAX_WAIT_MS,
+                        help="Attente maximale avant envoi d'un lot incomplet (ms)")
+    parser.add_argument('--cache-size', type=int, default=CACHE_SIZE,
+                        help="Entrées du cache LRU (0 = désactivé)")
+    parser.add_argument('--threshold', type=float, default=THRESHOLD)
+    parser.add_argument('--model', default=MODEL_PATH,
+                        help="Modèle picklé ou fichier .forest (compact_forest.py)")
+    parser.add_argument('--scaler', default=SCALER_PATH)
+    parser.add_argument('--scale-features', action='store_true',
+                        help="Standardiser avant prédiction (modèle entraîné sur données scalées)")
+    args = parser.parse_args()
+
+    scorer = ConversionScorer(args.model, args.scaler, args.scale_features)
+    server = ScoringServer((args.host, args.port), scorer, args.max_batch, args.max_wait_ms,
+                           args.cache_size, args.threshold)
+    # Première ligne lue par bench_scoring_server.py pour connaître l'URL
+    print(f"Serveur de scoring prêt: {server.url}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
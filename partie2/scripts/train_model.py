@@ -0,0 +1,558 @@
+"""
+TP03 - Partie 2: Pipeline d'entraînement du modèle de conversion
+Auteur: - Soukaina El Hadifi
+        - Mohamed-Saber El guelta
+
+Reprend en script les étapes du notebook ml_conversion_prediction.ipynb:
+- encodage des features (FeatureEncoder, mêmes colonnes que get_dummies)
+- split train/test stratifié 80/20 (random_state=42)
+- recherche d'hyperparamètres par validation croisée stratifiée (AUC-ROC)
+- réentraînement du meilleur candidat sur tout le train, évaluation sur le
+  test et sauvegarde des artefacts (modèle, scaler, encodeur, .forest)
+  dans data/models/: les artefacts livrés dans data/, chargés par
+  ConversionScorer et le serveur de scoring, ne sont remplacés qu'avec
+  --output-dir ../data
+
+Recherche:
+- grid: chaque candidat est évalué sur tout le train
+- halving (successive halving): tous les candidats sont évalués sur un
+  petit échantillon stratifié, seul le meilleur tiers (--factor) passe au
+  tour suivant, avec un échantillon --factor fois plus grand, jusqu'au
+  train complet
+
+Chaque fit de fold est une tâche indépendante, exécutée sur --n-jobs
+processus. Son résultat (score, temps de fit et de prédiction) est mis en
+cache sur disque, avec pour clé le hash des données, le modèle, les
+paramètres, la taille d'échantillon et le fold: relancer le script sans
+rien changer ne refait aucun fit, et modifier la grille ne recalcule que
+les nouveaux candidats.
+
+Un rapport JSON donne, pour chaque candidat et chaque tour, le score
+moyen, les temps de fit et de prédiction et le nombre de folds servis par
+le cache.
+
+Usage:
+    python train_model.py
+    python train_model.py --output-dir ../data
+    python train_model.py --model lr --search grid --n-jobs 4
+    python train_model.py --data ../data/user_behavior_parts --search halving --factor 3 --no-save
+"""
+
+import argparse
+import hashlib
+import itertools
+import json
+import math
+import os
+import pickle
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+import sklearn
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.linear_model import LogisticRegression
+from sklearn.metrics import accuracy_score, f1_score, precision_score, recall_score, roc_auc_score
+from sklearn.model_selection import StratifiedKFold, train_test_split
+from sklearn.preprocessing import StandardScaler
+
+from compact_forest import export_forest
+from feature_encoder import FeatureEncoder
+from generate_ml_data import load_dataset
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.path.join(SCRIPT_DIR, '..', 'data')
+DATA_PATH = os.path.join(DATA_DIR, 'user_behavior.csv')
+CACHE_DIR = os.path.join(DATA_DIR, 'train_cache')
+REPORT_PATH = os.path.join(DATA_DIR, 'training_report.json')
+# Artefacts d'un entraînement, à part des artefacts livrés dans DATA_DIR
+MODELS_DIR = os.path.join(DATA_DIR, 'models')
+
+TARGET = 'converted'
+
+# Split et validation croisée du notebook
+TEST_SIZE = 0.2
+SEED = 42
+N_SPLITS = 5
+
+# Successive halving
+FACTOR = 3
+MIN_SAMPLES = 50
+
+# Incrémenté si le calcul d'un fold change (invalide le cache)
+CACHE_VERSION = 1
+
+# Modèles du notebook: paramètres fixes, grille de recherche, besoin de
+# standardisation et nom de l'artefact sauvegardé
+MODELS = {
+    'rf': {
+        'estimator': RandomForestClassifier,
+        'base': {'random_state': SEED},
+        'grid': {
+            'n_estimators': [100, 300],
+            'max_depth': [6, 10, None],
+            'min_samples_split': [2, 5, 10]
+        },
+        'scaled': False,
+        'parallel': True,
+        'artifact': 'rf_conversion_model.pkl'
+    },
+    'lr': {
+        'estimator': LogisticRegression,
+        'base': {'random_state': SEED, 'max_iter': 1000},
+        'grid': {'C': [0.01, 0.1, 1.0, 10.0, 100.0]},
+        'scaled': True,
+        'parallel': False,
+        'artifact': 'lr_conversion_model.pkl'
+    }
+}
+
+
+def expand_grid(grid):
+    """Liste des combinaisons de paramètres d'une grille (ordre stable)."""
+    names = list(grid)
+    return [dict(zip(names, values)) for values in itertools.product(*(grid[name] for name in names))]
+
+
+def make_estimator(model_name, params, n_jobs=1):
+    """Estimateur sklearn non entraîné pour un candidat."""
+    spec = MODELS[model_name]
+    options = {**spec['base'], **params}
+    if spec['parallel']:
+        options['n_jobs'] = n_jobs
+    return spec['estimator'](**options)
+
+
+def data_hash(X, y, feature_names):
+    """SHA-256 des données d'entraînement (valeurs, cible et noms de colonnes)."""
+    digest = hashlib.sha256()
+    digest.update(json.dumps(feature_names).encode('utf-8'))
+    digest.update(np.ascontiguousarray(X, dtype=np.float64).tobytes())
+    digest.update(np.ascontiguousarray(y, dtype=np.int64).tobytes())
+    return digest.hexdigest()
+
+
+def fold_key(data_digest, model_name, params, n_samples, fold, n_splits, seed):
+    """
+    Clé d'un fit de fold: SHA-256 de tout ce qui détermine son résultat,
+    sérialisé de façon canonique.
+    """
+    identity = {
+        'version': CACHE_VERSION,
+        'sklearn': sklearn.__version__,
+        'data': data_digest,
+        'model': model_name,
+        'params': {**MODELS[model_name]['base'], **params},
+        'n_samples': n_samples,
+        'fold': fold,
+        'n_splits': n_splits,
+        'seed': seed
+    }
+    canonical = json.dumps(identity, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+class FoldCache:
+    """
+    Cache disque des résultats de fit par fold (un fichier JSON par clé).
+
+    Les écritures ne se font que depuis le processus principal.
+
+    Args:
+        directory (str): Répertoire du cache, ou None pour le désactiver
+
+    Attributes:
+        hits, misses (int): Compteurs depuis la création
+    """
+
+    def __init__(self, directory=CACHE_DIR):
+        self.directory = directory
+        self.hits = 0
+        self.misses = 0
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], f'{key}.json')
+
+    def get(self, key):
+        """Résultat en cache, ou None."""
+        if self.directory is None:
+            self.misses += 1
+            return None
+        try:
+            with open(self._path(key), 'r', encoding='utf-8') as f:
+                result = json.load(f)
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return result
+
+    def put(self, key, result):
+        """Enregistre le résultat d'un fit (écriture atomique)."""
+        if self.directory is None:
+            return
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(result, f)
+        os.replace(path + '.tmp', path)
+
+
+def subsample_indices(y, n_samples, seed):
+    """
+    Indices d'un échantillon stratifié de taille n_samples (déterministe,
+    donc identique d'un run à l'autre pour un même jeu de données).
+    """
+    if n_samples >= len(y):
+        return np.arange(len(y))
+    indices, _ = train_test_split(np.arange(len(y)), train_size=n_samples, stratify=y,
+                                  random_state=seed)
+    return np.sort(indices)
+
+
+def scale_numeric(X, numeric_idx, scaler):
+    """Copie de X avec les colonnes numériques standardisées."""
+    X = X.copy()
+    X[:, numeric_idx] = scaler.transform(X[:, numeric_idx])
+    return X
+
+
+def evaluate_fold(X, y, numeric_idx, model_name, params, n_samples, fold, n_splits, seed):
+    """
+    Entraîne un candidat sur un fold et le score sur la partie validation.
+
+    Args:
+        X (ndarray): Features encodées du train
+        y (ndarray): Cible du train
+        numeric_idx (list): Positions des colonnes numériques (standardisation)
+        model_name (str): Clé de MODELS
+        params (dict): Paramètres du candidat
+        n_samples (int): Taille de l'échantillon (tour de successive halving)
+        fold (int): Numéro du fold
+        n_splits (int): Nombre de folds
+        seed (int): Graine de l'échantillonnage et des folds
+
+    Returns:
+        dict: score (AUC-ROC), fit_time et score_time en secondes
+    """
+    rows = subsample_indices(y, n_samples, seed)
+    X, y = X[rows], y[rows]
+    splitter = StratifiedKFold(n_splits=n_splits, shuffle=True, random_state=seed)
+    train_idx, valid_idx = next(itertools.islice(splitter.split(X, y), fold, None))
+    X_train, X_valid = X[train_idx], X[valid_idx]
+
+    start = time.perf_counter()
+    if MODELS[model_name]['scaled']:
+        scaler = StandardScaler().fit(X_train[:, numeric_idx])
+        X_train = scale_numeric(X_train, numeric_idx, scaler)
+        X_valid = scale_numeric(X_valid, numeric_idx, scaler)
+    model = make_estimator(model_name, params).fit(X_train, y[train_idx])
+    fit_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    proba = model.predict_proba(X_valid)[:, 1]
+    score = roc_auc_score(y[valid_idx], proba)
+    return {'score': float(score), 'fit_time': fit_time, 'score_time': time.perf_counter() - start}
+
+
+# Données partagées par les workers (envoyées une fois par processus)
+_worker_data = None
+
+
+def _init_worker(X, y, numeric_idx):
+    global _worker_data
+    _worker_data = (X, y, numeric_idx)
+
+
+def _evaluate_in_worker(task):
+    return evaluate_fold(*_worker_data, *task)
+
+
+def halving_schedule(n_candidates, n_train, factor, min_samples, n_splits):
+    """
+    Tours de successive halving: (candidats conservés, taille d'échantillon).
+
+    Le nombre de tours est celui qui ramène les candidats à moins de
+    `factor`; le dernier tour utilise tout le train.
+    """
+    n_rounds = 1 + int(math.floor(math.log(n_candidates, factor) + 1e-9)) if n_candidates > 1 else 1
+    first = max(n_train // factor ** (n_rounds - 1), min_samples, n_splits * 2)
+    schedule = []
+    kept = n_candidates
+    for round_index in range(n_rounds):
+        n_samples = n_train if round_index == n_rounds - 1 else min(first * factor ** round_index, n_train)
+        schedule.append((kept, n_samples))
+        kept = max(1, math.ceil(kept / factor))
+    return schedule
+
+
+class SearchRunner:
+    """
+    Évalue des candidats fold par fold, en parallèle et via le cache.
+
+    Args:
+        X (ndarray), y (ndarray): Train encodé
+        feature_names (list): Colonnes de X (entrent dans le hash des données)
+        numeric_idx (list): Positions des colonnes numériques
+        model_name (str): Clé de MODELS
+        cache (FoldCache): Cache des fits
+        n_jobs (int): Processus de calcul
+        n_splits (int): Folds de validation croisée
+        seed (int): Graine des échantillons et des folds
+    """
+
+    def __init__(self, X, y, feature_names, numeric_idx, model_name, cache, n_jobs=1, n_splits=N_SPLITS,
+                 seed=SEED):
+        self.X = X
+        self.y = y
+        self.numeric_idx = numeric_idx
+        self.model_name = model_name
+        self.cache = cache
+        self.n_jobs = n_jobs
+        self.n_splits = n_splits
+        self.seed = seed
+        self.digest = data_hash(X, y, list(feature_names))
+        self._executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        if self._executor is not None:
+            self._executor.shutdown()
+        return False
+
+    def _run(self, tasks):
+        if self.n_jobs <= 1 or len(tasks) <= 1:
+            return [evaluate_fold(self.X, self.y, self.numeric_idx, *task) for task in tasks]
+        if self._executor is None:
+            # Créé une seule fois: les workers gardent les données entre les tours
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.n_jobs, initializer=_init_worker,
+                initargs=(self.X, self.y, self.numeric_idx)
+            )
+        return list(self._executor.map(_evaluate_in_worker, tasks))
+
+    def evaluate(self, candidates, n_samples):
+        """
+        Score de validation croisée de chaque candidat sur n_samples lignes.
+
+        Returns:
+            list[dict]: Par candidat: mean_score, std_score, fit_time,
+            score_time (sommes sur les folds) et cached_folds
+        """
+        folds = {}
+        tasks = []
+        keys = []
+        for index, params in enumerate(candidates):
+            for fold in range(self.n_splits):
+                key = fold_key(self.digest, self.model_name, params, n_samples, fold, self.n_splits, self.seed)
+                result = self.cache.get(key)
+                if result is not None:
+                    folds[index, fold] = dict(result, cached=True)
+                else:
+                    tasks.append((self.model_name, params, n_samples, fold, self.n_splits, self.seed))
+                    keys.append((index, fold, key))
+
+        for (index, fold, key), result in zip(keys, self._run(tasks)):
+            self.cache.put(key, result)
+            folds[index, fold] = dict(result, cached=False)
+
+        summaries = []
+        for index in range(len(candidates)):
+            results = [folds[index, fold] for fold in range(self.n_splits)]
+            scores = np.array([result['score'] for result in results])
+            summaries.append({
+                'n_samples': n_samples,
+                'mean_score': float(scores.mean()),
+                'std_score': float(scores.std()),
+                'fit_time': sum(result['fit_time'] for result in results),
+                'score_time': sum(result['score_time'] for result in results),
+                'cached_folds': sum(result['cached'] for result in results)
+            })
+        return summaries
+
+
+def run_search(runner, candidates, search, factor=FACTOR, min_samples=MIN_SAMPLES):
+    """
+    Recherche grid ou successive halving.
+
+    Returns:
+        tuple: (index du meilleur candidat, rapport par candidat)
+    """
+    n_train = len(runner.y)
+    if search == 'grid':
+        schedule = [(len(candidates), n_train)]
+    else:
+        schedule = halving_schedule(len(candidates), n_train, factor, min_samples, runner.n_splits)
+
+    report = [{'params': params, 'rounds': [], 'eliminated_at': None} for params in candidates]
+    alive = list(range(len(candidates)))
+    for round_index, (n_kept, n_samples) in enumerate(schedule):
+        alive = alive[:n_kept]
+        start = time.perf_counter()
+        summaries = runner.evaluate([candidates[index] for index in alive], n_samples)
+        for index, summary in zip(alive, summaries):
+            report[index]['rounds'].append(dict(summary, round=round_index))
+        print(f"Tour {round_index + 1}/{len(schedule)}: {len(alive)} candidats sur {n_samples:,} lignes "
+              f"({time.perf_counter() - start:.2f}s)")
+        # Tri stable: à score égal, l'ordre de la grille départage
+        alive.sort(key=lambda index: -report[index]['rounds'][-1]['mean_score'])
+        if round_index + 1 < len(schedule):
+            for index in alive[schedule[round_index + 1][0]:]:
+                report[index]['eliminated_at'] = round_index
+    return alive[0], report
+
+
+def print_report(report, best_index, n_splits=N_SPLITS):
+    """Tableau des candidats, du meilleur au moins bon."""
+    def rank(item):
+        last = item[1]['rounds'][-1]
+        return (-len(item[1]['rounds']), -last['mean_score'])
+
+    print(f"\n{'#':>3}  {'AUC (moy ± std)':<18} {'lignes':>7} {'fit (s)':>8} {'cache':>6}  paramètres")
+    for index, candidate in sorted(enumerate(report), key=rank):
+        last = candidate['rounds'][-1]
+        fit_time = sum(round_['fit_time'] for round_ in candidate['rounds'])
+        cached = sum(round_['cached_folds'] for round_ in candidate['rounds'])
+        folds = len(candidate['rounds']) * n_splits
+        marker = '*' if index == best_index else ' '
+        print(f"{index:>3}{marker} {last['mean_score']:.4f} ± {last['std_score']:.4f}   "
+              f"{last['n_samples']:>7,} {fit_time:>8.2f} {cached:>2}/{folds:<3}  {candidate['params']}")
+
+
+def evaluate_on_test(model, X_test, y_test):
+    """Métriques du notebook sur le jeu de test."""
+    predicted = model.predict(X_test)
+    proba = model.predict_proba(X_test)[:, 1]
+    return {
+        'accuracy': accuracy_score(y_test, predicted),
+        'precision': precision_score(y_test, predicted),
+        'recall': recall_score(y_test, predicted),
+        'f1': f1_score(y_test, predicted),
+        'roc_auc': roc_auc_score(y_test, proba)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Entraînement du modèle de conversion")
+    parser.add_argument('--data', default=DATA_PATH, help="CSV user_behavior ou répertoire de parts")
+    parser.add_argument('--model', choices=sorted(MODELS), default='rf')
+    parser.add_argument('--search', choices=['grid', 'halving'], default='grid')
+    parser.add_argument('--factor', type=int, default=FACTOR,
+                        help="Successive halving: part des candidats conservés et croissance de l'échantillon")
+    parser.add_argument('--min-samples', type=int, default=MIN_SAMPLES,
+                        help="Successive halving: taille minimale de l'échantillon du premier tour")
+    parser.add_argument('--cv', type=int, default=N_SPLITS, help="Nombre de folds")
+    parser.add_argument('--n-jobs', type=int, default=os.cpu_count() or 1,
+                        help="Processus de calcul (défaut: nombre de coeurs, -1 = tous)")
+    parser.add_argument('--cache-dir', default=CACHE_DIR)
+    parser.add_argument('--no-cache', action='store_true', help="Ne pas lire ni écrire le cache")
+    parser.add_argument('--report', default=REPORT_PATH, help="Rapport JSON des candidats")
+    parser.add_argument('--output-dir', default=MODELS_DIR,
+                        help="Répertoire des artefacts (défaut: data/models; ../data remplace "
+                             "les artefacts livrés)")
+    parser.add_argument('--no-save', action='store_true', help="Ne pas sauvegarder le modèle")
+    args = parser.parse_args()
+    if args.factor < 2:
+        parser.error("--factor doit être au moins 2")
+    n_jobs = (os.cpu_count() or 1) if args.n_jobs == -1 else max(1, args.n_jobs)
+
+    print("=" * 70)
+    print(f"ENTRAÎNEMENT - {args.model} - recherche {args.search} - {n_jobs} processus")
+    print("=" * 70)
+
+    started = time.perf_counter()
+    df = load_dataset(args.data)
+    encoder = FeatureEncoder.fit(df)
+    X = np.ascontiguousarray(encoder.transform(df))
+    y = df[TARGET].to_numpy(dtype=np.int64)
+    X_train, X_test, y_train, y_test = train_test_split(
+        X, y, test_size=TEST_SIZE, random_state=SEED, stratify=y
+    )
+    numeric_idx = [encoder.feature_names.index(column) for column in encoder.numeric_columns]
+    print(f"Données: {len(df):,} lignes ({args.data}) - train {len(y_train):,} / test {len(y_test):,} "
+          f"- {len(encoder.feature_names)} features")
+
+    candidates = expand_grid(MODELS[args.model]['grid'])
+    cache = FoldCache(None if args.no_cache else args.cache_dir)
+    with SearchRunner(X_train, y_train, encoder.feature_names, numeric_idx, args.model, cache,
+                      n_jobs, args.cv) as runner:
+        search_start = time.perf_counter()
+        best_index, report = run_search(runner, candidates, args.search, args.factor, args.min_samples)
+        search_time = time.perf_counter() - search_start
+    print_report(report, best_index, args.cv)
+    print(f"\nRecherche: {len(candidates)} candidats en {search_time:.2f}s - cache: "
+          f"{cache.hits} folds réutilisés, {cache.misses} calculés")
+
+    # Réentraînement du meilleur candidat sur tout le train (colonnes nommées,
+    # comme dans le notebook, pour feature_names_in_)
+    best_params = candidates[best_index]
+    columns = encoder.feature_names
+    numeric_cols = list(encoder.numeric_columns)
+    train_frame = pd.DataFrame(X_train, columns=columns)
+    test_frame = pd.DataFrame(X_test, columns=columns)
+    scaler = StandardScaler().fit(train_frame[numeric_cols])
+    if MODELS[args.model]['scaled']:
+        train_frame[numeric_cols] = scaler.transform(train_frame[numeric_cols])
+        test_frame[numeric_cols] = scaler.transform(test_frame[numeric_cols])
+    start = time.perf_counter()
+    model = make_estimator(args.model, best_params, n_jobs).fit(train_frame, y_train)
+    refit_time = time.perf_counter() - start
+    metrics = evaluate_on_test(model, test_frame, y_test)
+
+    print(f"\nMeilleur candidat: {best_params} (réentraîné en {refit_time:.2f}s)")
+    print("Métriques sur le test:")
+    for name, value in metrics.items():
+        print(f"  - {name:<10} {value:.4f}")
+
+    artifacts = []
+    if not args.no_save:
+        os.makedirs(args.output_dir, exist_ok=True)
+        model_path = os.path.join(args.output_dir, MODELS[args.model]['artifact'])
+        scaler_path = os.path.join(args.output_dir, 'scaler.pkl')
+        with open(model_path, 'wb') as f:
+            pickle.dump(model, f)
+        with open(scaler_path, 'wb') as f:
+            pickle.dump(scaler, f)
+        encoder.set_scaling_from_scaler(scaler)
+        encoder_path = os.path.join(args.output_dir, 'feature_encoder.json')
+        encoder.save(encoder_path)
+        artifacts = [model_path, scaler_path, encoder_path]
+        if hasattr(model, 'estimators_'):
+            forest_path = os.path.splitext(model_path)[0] + '.forest'
+            export_forest(model, forest_path, scaler)
+            artifacts.append(forest_path)
+        print("\nArtefacts sauvegardés:")
+        for path in artifacts:
+            print(f"  - {path}")
+
+    if args.report:
+        summary = {
+            'timestamp': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'config': {key: value for key, value in vars(args).items() if key != 'report'},
+            'data': {'rows': len(df), 'train': len(y_train), 'test': len(y_test), 'hash': runner.digest},
+            'search': {
+                'duration_s': round(search_time, 3),
+                'cache_hits': cache.hits,
+                'cache_misses': cache.misses,
+                'best_index': best_index,
+                'best_params': best_params
+            },
+            'candidates': report,
+            'refit_time_s': round(refit_time, 3),
+            'test_metrics': metrics,
+            'artifacts': artifacts,
+            'total_time_s': round(time.perf_counter() - started, 3)
+        }
+        with open(args.report, 'w', encoding='utf-8') as f:
+            json.dump(summary, f, indent=2, ensure_ascii=False)
+        print(f"\nRapport enregistré: {args.report}")
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())